@@ -5,4 +5,5 @@ class FarmsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "farms"
 
-
+    def ready(self):
+        from . import signals  # noqa: F401
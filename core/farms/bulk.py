@@ -0,0 +1,153 @@
+"""Bulk writes of milk records.
+
+A herd's morning milk is written with a few statements instead of a request
+and a save per cow. On PostgreSQL the rows are streamed with ``COPY`` into a
+temporary staging table and merged from there, which also serves historical
+imports. Bulk writes skip the MilkRecord signals: the records being
+overwritten are locked and their liters read first, the differences are
+applied to the rollups with ``rollups.apply_milk_changes``, and a single
+change is recorded for the whole batch, in the same transaction.
+
+Only the records written and the rollup rows they change are locked, so
+other writes, single or bulk, go on alongside. A record another transaction
+inserts while a batch is written is locked and overwritten on a second pass.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import rollups
+from .changes import record_change
+from .models import MilkRecord
+
+MILK_TABLE = MilkRecord._meta.db_table
+STAGING_TABLE = "milk_write_staging"
+
+# Lock and overwrite the staged records that exist, returning their old liters
+UPDATE_STAGED_SQL = f"""
+WITH locked AS (
+    SELECT m.cow_id, m.date, m.liters
+    FROM {MILK_TABLE} m JOIN {STAGING_TABLE} s ON s.cow_id = m.cow_id AND s.date = m.date
+    WHERE NOT s.written
+    ORDER BY m.cow_id, m.date
+    FOR UPDATE OF m
+), updated AS (
+    UPDATE {MILK_TABLE} m SET liters = s.liters, recorded_by_id = %s, updated_at = %s
+    FROM locked l JOIN {STAGING_TABLE} s ON s.cow_id = l.cow_id AND s.date = l.date
+    WHERE m.cow_id = l.cow_id AND m.date = l.date
+), marked AS (
+    UPDATE {STAGING_TABLE} s SET written = true
+    FROM locked l WHERE s.cow_id = l.cow_id AND s.date = l.date
+)
+SELECT cow_id, date, liters FROM locked
+"""
+
+# Insert the staged records that do not exist, returning the keys inserted
+INSERT_STAGED_SQL = f"""
+WITH inserted AS (
+    INSERT INTO {MILK_TABLE} (cow_id, date, liters, recorded_by_id, created_by_id, created_at, updated_at)
+    SELECT cow_id, date, liters, %s, %s, %s, %s FROM {STAGING_TABLE}
+    WHERE NOT written
+    ORDER BY cow_id, date
+    ON CONFLICT (cow_id, date) DO NOTHING
+    RETURNING cow_id, date
+), marked AS (
+    UPDATE {STAGING_TABLE} s SET written = true
+    FROM inserted i WHERE s.cow_id = i.cow_id AND s.date = i.date
+)
+SELECT cow_id, date FROM inserted
+"""
+
+
+def _write_staged(liters_by_key, user, now):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {STAGING_TABLE} "
+            "(cow_id bigint, date date, liters numeric(8, 2), written boolean NOT NULL DEFAULT false)"
+        )
+        with cursor.copy(f"COPY {STAGING_TABLE} (cow_id, date, liters) FROM STDIN") as copy:
+            for (cow_id, day), liters in liters_by_key.items():
+                copy.write_row((cow_id, day, liters))
+        previous, created = {}, set()
+        # A key left over was inserted by another transaction after the
+        # records were locked; the next pass locks and overwrites it.
+        while len(previous) + len(created) < len(liters_by_key):
+            cursor.execute(UPDATE_STAGED_SQL, [user.pk, now])
+            previous.update(((cow_id, day), liters) for cow_id, day, liters in cursor.fetchall())
+            cursor.execute(INSERT_STAGED_SQL, [user.pk, user.pk, now, now])
+            created.update(cursor.fetchall())
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+    return previous, created
+
+
+def _write(liters_by_key, user, batch_size):
+    """Write the records and return the old liters of those that existed, and the keys of those created."""
+    now = timezone.now()
+    if connection.vendor == "postgresql":
+        return _write_staged(liters_by_key, user, now)
+
+    existing = {
+        (cow_id, day): (pk, liters)
+        for cow_id, day, pk, liters in MilkRecord.objects.select_for_update()
+        .filter(cow_id__in={cow_id for cow_id, _ in liters_by_key}, date__in={day for _, day in liters_by_key})
+        .order_by("cow_id", "date")
+        .values_list("cow_id", "date", "pk", "liters")
+        .iterator()
+        if (cow_id, day) in liters_by_key
+    }
+    MilkRecord.objects.bulk_update(
+        [
+            MilkRecord(pk=pk, liters=liters_by_key[key], recorded_by=user, updated_at=now)
+            for key, (pk, _) in existing.items()
+        ],
+        ["liters", "recorded_by", "updated_at"],
+        batch_size=batch_size,
+    )
+    created = [key for key in liters_by_key if key not in existing]
+    MilkRecord.objects.bulk_create(
+        [
+            MilkRecord(cow_id=cow_id, date=day, liters=liters_by_key[cow_id, day], recorded_by=user, created_by=user)
+            for cow_id, day in created
+        ],
+        batch_size=batch_size,
+    )
+    return {key: liters for key, (_, liters) in existing.items()}, set(created)
+
+
+def _written(liters_by_key, previous):
+    rollups.apply_milk_changes(
+        (cow_id, day, previous.get((cow_id, day)), liters) for (cow_id, day), liters in liters_by_key.items()
+    )
+    record_change(MilkRecord, "update", None)
+
+
+def _record_ids(keys):
+    cow_ids = {cow_id for cow_id, _ in keys}
+    dates = {day for _, day in keys}
+    rows = MilkRecord.objects.filter(cow_id__in=cow_ids, date__in=dates).values_list("cow_id", "date", "pk")
+    return {(cow_id, day): pk for cow_id, day, pk in rows.iterator() if (cow_id, day) in keys}
+
+
+def upsert_milk_records(liters_by_key, user, batch_size=1000):
+    """Insert or update the milk records in ``liters_by_key``, which maps ``(cow_id, date)`` to liters.
+
+    Existing records keep their creator and take the new liters and
+    ``user`` as their recorder. Returns a dict mapping each key to
+    ``(record_id, created)``.
+    """
+    if not liters_by_key:
+        return {}
+    with transaction.atomic():
+        previous, created = _write(liters_by_key, user, batch_size)
+        _written(liters_by_key, previous)
+        record_ids = _record_ids(liters_by_key)
+    return {key: (record_ids[key], key in created) for key in liters_by_key}
+
+
+def merge_milk_records(liters_by_key, user, batch_size=1000):
+    """Write ``liters_by_key`` like ``upsert_milk_records``, returning ``(created, updated)`` counts."""
+    if not liters_by_key:
+        return 0, 0
+    with transaction.atomic():
+        previous, created = _write(liters_by_key, user, batch_size)
+        _written(liters_by_key, previous)
+    return len(created), len(previous)
@@ -0,0 +1,30 @@
+"""Change tracking for the tables the reporting service reads.
+
+Every write to a versioned table appends a ChangeEvent to the outbox in the
+writing transaction. On PostgreSQL a deferred trigger on the outbox then
+counts the event in TableChangeCount and queues a NOTIFY on
+``CHANGE_CHANNEL`` as the transaction commits: subscribers hear about a
+change exactly when it becomes visible, and never about one that rolled
+back.
+
+A table's version is the id of its newest event, the number of its events
+among the last ``VERSION_WINDOW`` ids, and its committed event count. Event
+ids are drawn when the event is written, not when it commits, so a write can
+become visible after one with a higher id; however far below the newest id
+it is, the count still changes. The count row is only updated at commit, so
+writers of a table do not hold it for the rest of their transaction.
+"""
+from .models import ChangeEvent
+
+CHANGE_CHANNEL = "farmhub_changes"
+
+# Must match VERSION_WINDOW in the reporting service's change feed
+VERSION_WINDOW = 1000
+
+
+def record_change(model, action, object_id=None):
+    """Log one write to ``model``'s table; it is published when the transaction commits.
+
+    ``object_id`` is ``None`` for a bulk write touching many rows.
+    """
+    ChangeEvent.objects.create(table_name=model._meta.db_table, action=action, object_id=object_id)
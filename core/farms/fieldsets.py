@@ -0,0 +1,150 @@
+"""Sparse fieldsets and opt-in expansion of nested serializers.
+
+On GET requests the ``fields`` and ``expand`` query parameters shape the
+response:
+
+- ``?fields=id,date,liters`` returns only those fields. Dotted paths select
+  fields of nested objects, e.g. ``?fields=id,cow.tag_id``.
+- ``?expand=cow,cow.farmer`` renders those relations as nested objects.
+
+Without either parameter the full nested representation is returned. With
+either, every relation that is not expanded (or selected with a dotted
+path) is returned as its primary key, so ``?fields=id,date,liters,cow``
+gives flat records with one query per page. The viewset's joins, prefetches
+and count annotations follow the fields actually rendered.
+"""
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_paths(value):
+    """Turn ``"id,cow.tag_id,cow.farmer"`` into ``{"id": {}, "cow": {"tag_id": {}, "farmer": {}}}``."""
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in path.strip().split("."):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def _is_root(serializer):
+    parent = serializer.parent
+    return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin applying ``?fields=`` and ``?expand=`` to its fields.
+
+    ``related_counts`` maps a count field to the reverse relation it counts;
+    the viewset annotates the count when the field is rendered.
+    """
+
+    related_counts = {}
+    sparse_fieldset = None
+
+    def get_fieldset(self):
+        """Return ``(fields, expand)`` trees, or ``None`` for the full representation."""
+        if self.sparse_fieldset is not None or not _is_root(self):
+            return self.sparse_fieldset
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = request.query_params
+        if "fields" not in params and "expand" not in params:
+            return None
+        return parse_field_paths(params.get("fields", "")), parse_field_paths(params.get("expand", ""))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return fields
+
+        only, expand = fieldset
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if only and name not in only:
+                del fields[name]
+                continue
+            if not isinstance(field, serializers.BaseSerializer):
+                continue
+
+            many = isinstance(field, serializers.ListSerializer)
+            if name in expand or only.get(name):
+                nested = field.child if many else field
+                nested.sparse_fieldset = (only.get(name, {}), expand.get(name, {}))
+            else:
+                source = {"source": field.source} if field.source not in (None, name) else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **source)
+        return fields
+
+
+def related_count(model, relation):
+    """Return a subquery counting ``model``'s rows in a reverse relation, e.g. a farmer's ``cows``."""
+    rel = model._meta.get_field(relation)
+    fk = rel.field.name
+    rows = (
+        rel.related_model._default_manager.filter(**{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def _prefixed(prefix, lookup):
+    if isinstance(lookup, Prefetch):
+        return Prefetch(prefix + lookup.prefetch_through, queryset=lookup.queryset)
+    return prefix + lookup
+
+
+def query_plan(serializer):
+    """Return the joins, prefetches and count annotations ``serializer`` renders.
+
+    Nested objects are joined with ``select_related`` unless they, or
+    objects nested in them, render counts; those are prefetched with their
+    own annotated queryset instead, one query per level.
+    """
+    select, prefetch = [], []
+    annotations = {
+        name: related_count(serializer.Meta.model, relation)
+        for name, relation in getattr(serializer, "related_counts", {}).items()
+        if name in serializer.fields
+    }
+
+    for field in serializer.fields.values():
+        if field.write_only or not isinstance(field, serializers.BaseSerializer):
+            continue
+        many = isinstance(field, serializers.ListSerializer)
+        nested = field.child if many else field
+        path = field.source.replace(".", "__")
+        nested_select, nested_prefetch, nested_annotations = query_plan(nested)
+
+        if many or nested_annotations:
+            queryset = nested.Meta.model._default_manager.annotate(**nested_annotations)
+            if nested_select:
+                queryset = queryset.select_related(*nested_select)
+            prefetch.append(Prefetch(path, queryset=queryset.prefetch_related(*nested_prefetch)))
+        else:
+            select.append(path)
+            select += [f"{path}__{lookup}" for lookup in nested_select]
+            prefetch += [_prefixed(f"{path}__", lookup) for lookup in nested_prefetch]
+    return select, prefetch, annotations
+
+
+class SparseFieldsViewMixin:
+    """ViewSet mixin joining, prefetching and counting exactly what the response renders."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer = self.get_serializer_class()(context={"request": self.request, "view": self})
+        select, prefetch, annotations = query_plan(serializer)
+        queryset = queryset.select_related(None).prefetch_related(None).annotate(**annotations)
+        if select:
+            queryset = queryset.select_related(*select)
+        return queryset.prefetch_related(*prefetch)
@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from farms.views import ActivityViewSet, MilkRecordViewSet
+
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render a page of milk records and of activities through their serializers and through "
+        "the values_list fast path, check both give the same JSON and compare their speed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Rows on the rendered page")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs of each path; the best is reported")
+        parser.add_argument(
+            "--min-speedup", type=float, default=5.0, help="Fail when the fast path is not this many times faster"
+        )
+        parser.add_argument("--query", default="", help="Query string of the request, e.g. fields=id,date,liters")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("Seed the database first (manage.py seed_data)")
+        factory = APIRequestFactory()
+        renderer = JSONRenderer()
+        rows, repeat = options["rows"], options["repeat"]
+
+        failures = 0
+        for name, viewset in (("milk records", MilkRecordViewSet), ("activities", ActivityViewSet)):
+            view = viewset(action="list", kwargs={}, format_kwarg=None)
+            view.request = Request(factory.get("/", QUERY_STRING=options["query"]))
+            view.request.user = user
+            queryset = view.filter_queryset(view.get_queryset())
+            serializer_class = view.get_serializer_class()
+            context = view.get_serializer_context()
+            plan = view.get_row_plan()
+            if plan is None:
+                raise CommandError(f"{serializer_class.__name__} cannot be rendered by the fast path")
+
+            def serialized():
+                return renderer.render(serializer_class(queryset[:rows], many=True, context=context).data)
+
+            def fast():
+                return renderer.render(plan.render(plan.rows(queryset)[:rows]))
+
+            expected, actual = serialized(), fast()
+            if expected != actual:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: the fast path renders different JSON"))
+                continue
+
+            count = len(queryset[:rows])
+            if count < rows:
+                self.stdout.write(self.style.WARNING(f"{name}: only {count} rows in the database"))
+            slow_time, fast_time = best_time(serialized, repeat), best_time(fast, repeat)
+            speedup = slow_time / fast_time
+            line = (
+                f"{name}: {serializer_class.__name__} {slow_time / count * 1e6:.1f} us/row, "
+                f"fast path {fast_time / count * 1e6:.1f} us/row, {speedup:.1f}x"
+            )
+            if speedup < options["min_speedup"]:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {line}"))
+            else:
+                self.stdout.write(f"ok   {line}")
+
+        if failures:
+            raise CommandError(f"{failures} list renderings failed")
@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from farms.partitions import add_months, ensure_partitions, is_partitioned, month_start
+
+
+class Command(BaseCommand):
+    help = "Create the monthly milk record partitions for the coming months"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3, help="Months after the current one to create")
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="Create partitions from this date's month instead of the current month (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Milk record partitions require PostgreSQL")
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError("farms_milkrecord is not partitioned; run migrate first")
+        if options["months_ahead"] < 0:
+            raise CommandError("--months-ahead must not be negative")
+
+        current = month_start(date.today())
+        first = month_start(options["start"]) if options["start"] else current
+        last = add_months(current, options["months_ahead"])
+        created = ensure_partitions(first, last)
+
+        for name in created:
+            self.stdout.write(f"created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created up to {last:%Y-%m}"))
@@ -0,0 +1,206 @@
+import csv
+import hashlib
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from farms.bulk import merge_milk_records
+from farms.models import Cow, MilkImport, MilkRecord
+from farms.partitions import ensure_partitions, is_partitioned, month_start
+
+COLUMNS = ("tag_id", "date", "liters")
+
+# Skipped rows listed individually; later ones are only counted
+MAX_WARNINGS = 20
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def read_xlsx(path, sheet=None):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def parse_date(value, date_format):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip(), date_format).date()
+
+
+def parse_liters(value):
+    field = MilkRecord._meta.get_field("liters")
+    try:
+        liters = field.to_python(str(value).strip()).quantize(Decimal(1).scaleb(-field.decimal_places))
+    except InvalidOperation:
+        raise ValueError(f"{value} liters is out of range")
+    field.run_validators(liters)
+    if liters < 0:
+        raise ValueError("liters must not be negative")
+    return liters
+
+
+class Command(BaseCommand):
+    help = (
+        "Import milk records from a CSV or XLSX file with tag_id, date and liters columns, in chunks. "
+        "Records that exist for a cow and date are updated. A failed import resumes after its last "
+        "committed chunk when run again on the same file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Rows merged per transaction")
+        parser.add_argument("--sheet", help="Worksheet of an XLSX file (default: the active one)")
+        parser.add_argument("--date-format", default="%Y-%m-%d", help="strptime format of text dates")
+        parser.add_argument("--user", help="Username recorded as creator of the records (default: first superuser)")
+        parser.add_argument("--restart", action="store_true", help="Start over instead of resuming an earlier run")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive")
+        user = self._user(options["user"])
+
+        digest = file_hash(path)
+        run = MilkImport.objects.filter(file_hash=digest).order_by("-started_at").first()
+        if run is not None and not options["restart"]:
+            if run.finished_at is not None:
+                raise CommandError(
+                    f"{path.name} was already imported on {run.finished_at:%Y-%m-%d %H:%M}; "
+                    "pass --restart to import it again"
+                )
+            self.stdout.write(f"Resuming the import started {run.started_at:%Y-%m-%d %H:%M} after row {run.rows_done}")
+        else:
+            run = MilkImport.objects.create(file_name=path.name, file_hash=digest)
+
+        rows = read_xlsx(path, options["sheet"]) if path.suffix.lower() in (".xlsx", ".xlsm") else read_csv(path)
+        positions = self._columns(next(rows, None))
+        rows = islice(enumerate(rows, start=2), run.rows_done, None)
+
+        partitioned = False
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                partitioned = is_partitioned(cursor)
+
+        self.warnings = 0
+        started = time.perf_counter()
+        imported = 0
+        while chunk := list(islice(rows, options["chunk_size"])):
+            liters_by_key, skipped = self._parse_chunk(chunk, positions, options["date_format"])
+            if partitioned and liters_by_key:
+                days = [day for _, day in liters_by_key]
+                ensure_partitions(month_start(min(days)), month_start(max(days)))
+
+            with transaction.atomic():
+                created, updated = merge_milk_records(liters_by_key, user)
+                MilkImport.objects.filter(pk=run.pk).update(
+                    rows_done=F("rows_done") + len(chunk),
+                    rows_created=F("rows_created") + created,
+                    rows_updated=F("rows_updated") + updated,
+                    rows_skipped=F("rows_skipped") + skipped,
+                    updated_at=timezone.now(),
+                )
+            run.rows_done += len(chunk)
+            imported += len(chunk)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"row {run.rows_done}: {created} created, {updated} updated, {skipped} skipped "
+                f"({imported / elapsed:,.0f} rows/s)"
+            )
+
+        MilkImport.objects.filter(pk=run.pk).update(finished_at=timezone.now())
+        run.refresh_from_db()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {path.name}: {run.rows_created} created, {run.rows_updated} updated, "
+                f"{run.rows_skipped} skipped; {imported} rows in {elapsed:.1f}s "
+                f"({imported / elapsed if elapsed else 0:,.0f} rows/s)"
+            )
+        )
+
+    def _user(self, username):
+        users = get_user_model().objects
+        if username:
+            try:
+                return users.get(username=username)
+            except users.model.DoesNotExist:
+                raise CommandError(f"No user named {username}")
+        user = users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("No superuser to record the import as; pass --user")
+        return user
+
+    def _columns(self, header):
+        names = [str(name).strip().lower() if name is not None else "" for name in header or ()]
+        missing = [column for column in COLUMNS if column not in names]
+        if missing:
+            raise CommandError(f"Missing columns: {', '.join(missing)}")
+        return [names.index(column) for column in COLUMNS]
+
+    def _parse_chunk(self, chunk, positions, date_format):
+        """Return the chunk's ``{(cow_id, date): liters}`` and the number of rows skipped.
+
+        Cows are looked up by tag once per chunk; a later row for the same
+        cow and date replaces an earlier one.
+        """
+        parsed = []
+        skipped = 0
+        for line, row in chunk:
+            values = [row[i] if i < len(row) else None for i in positions]
+            if all(value in (None, "") for value in values):
+                continue
+            tag_id, day, liters = values
+            try:
+                parsed.append((line, str(tag_id).strip(), parse_date(day, date_format), parse_liters(liters)))
+            except ValidationError as error:
+                skipped += 1
+                self._warn(line, "; ".join(error.messages))
+            except (TypeError, ValueError) as error:
+                skipped += 1
+                self._warn(line, str(error))
+
+        cow_ids = dict(Cow.objects.filter(tag_id__in={tag_id for _, tag_id, _, _ in parsed}).values_list("tag_id", "pk"))
+        liters_by_key = {}
+        for line, tag_id, day, liters in parsed:
+            if tag_id not in cow_ids:
+                skipped += 1
+                self._warn(line, f"no cow tagged {tag_id!r}")
+                continue
+            liters_by_key[(cow_ids[tag_id], day)] = liters
+        return liters_by_key, skipped
+
+    def _warn(self, line, message):
+        self.warnings += 1
+        if self.warnings <= MAX_WARNINGS:
+            self.stderr.write(f"row {line}: {message}, skipped")
+        elif self.warnings == MAX_WARNINGS + 1:
+            self.stderr.write("further skipped rows are counted but not listed")
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from farms.changes import VERSION_WINDOW
+from farms.models import ChangeEvent
+
+
+class Command(BaseCommand):
+    help = "Delete change events older than the retention period from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Days of change events to keep")
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be positive")
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        # A table's version is read from its newest events; keep those however old
+        newest = (
+            ChangeEvent.objects.filter(table_name=OuterRef("table_name"))
+            .values("table_name")
+            .annotate(newest=Max("id"))
+            .values("newest")
+        )
+        deleted, _ = ChangeEvent.objects.filter(
+            created_at__lt=cutoff, id__lte=Subquery(newest) - VERSION_WINDOW
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change events older than {cutoff:%Y-%m-%d %H:%M}"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from farms.models import Cow, MilkRecord
+from farms.rollups import rebuild_cow_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-cow running milk statistics from milk records, in batches of cows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cow", type=int, action="append", dest="cow_ids", help="Cow to rebuild (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Cows rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        cows = Cow.objects.order_by("pk")
+        if options["cow_ids"]:
+            cows = cows.filter(pk__in=options["cow_ids"])
+        cow_ids = list(cows.values_list("pk", flat=True))
+
+        batch_size = options["batch_size"]
+        batches = range(0, len(cow_ids), batch_size)
+        for done, start in enumerate(batches, start=1):
+            batch = cow_ids[start : start + batch_size]
+            with transaction.atomic():
+                if connection.vendor == "postgresql":
+                    # Keep incremental updates out while the batch is rebuilt
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"LOCK TABLE {MilkRecord._meta.db_table} IN SHARE MODE")
+                rebuild_cow_stats(batch)
+            self.stdout.write(f"[{done}/{len(batches)}] rebuilt cows {batch[0]} .. {batch[-1]}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt milk statistics of {len(cow_ids)} cows"))
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+
+from farms.models import MilkRecord
+from farms.rollups import rebuild_rollups_for_range
+
+
+def _rebuild_chunk(start, end):
+    try:
+        rebuild_rollups_for_range(start, end)
+    finally:
+        # Each worker thread has its own connection
+        connection.close()
+    return start, end
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily milk rollup tables from milk records, in parallel date chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=date.fromisoformat, help="First date to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last date to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--chunk-days", type=int, default=31, help="Days rebuilt per transaction")
+        parser.add_argument("--workers", type=int, default=4, help="Chunks rebuilt concurrently")
+
+    def handle(self, *args, **options):
+        bounds = MilkRecord.objects.aggregate(first=Min("date"), last=Max("date"))
+        start = options["start"] or bounds["first"]
+        end = options["end"] or bounds["last"]
+        if not start or not end:
+            self.stdout.write("No milk records to roll up.")
+            return
+        if start > end:
+            raise CommandError("--start must not be after --end")
+        if options["chunk_days"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-days and --workers must be positive")
+
+        chunks = []
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options["chunk_days"] - 1), end)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + timedelta(days=1)
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [executor.submit(_rebuild_chunk, *chunk) for chunk in chunks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                chunk_start, chunk_end = future.result()
+                self.stdout.write(f"[{done}/{len(chunks)}] rebuilt {chunk_start} .. {chunk_end}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt milk rollups from {start} to {end}"))
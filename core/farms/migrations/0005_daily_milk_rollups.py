@@ -0,0 +1,138 @@
+# Generated by Django 5.0.7 on 2026-10-17 01:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BACKFILL_SQL = [
+    """
+    INSERT INTO farms_cowdailymilk (cow_id, date, total_liters, record_count)
+    SELECT m.cow_id, m.date, SUM(m.liters), COUNT(*)
+    FROM farms_milkrecord m
+    GROUP BY m.cow_id, m.date
+    """,
+    """
+    INSERT INTO farms_farmerdailymilk (farmer_id, date, total_liters, record_count)
+    SELECT c.farmer_id, m.date, SUM(m.liters), COUNT(*)
+    FROM farms_milkrecord m JOIN farms_cow c ON c.id = m.cow_id
+    GROUP BY c.farmer_id, m.date
+    """,
+    """
+    INSERT INTO farms_farmdailymilk (farm_id, date, total_liters, record_count)
+    SELECT f.farm_id, m.date, SUM(m.liters), COUNT(*)
+    FROM farms_milkrecord m
+    JOIN farms_cow c ON c.id = m.cow_id
+    JOIN farms_farmer f ON f.id = c.farmer_id
+    GROUP BY f.farm_id, m.date
+    """,
+]
+
+CLEAR_SQL = [
+    "DELETE FROM farms_cowdailymilk",
+    "DELETE FROM farms_farmerdailymilk",
+    "DELETE FROM farms_farmdailymilk",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("farms", "0004_alter_agent_options_rename_address_agent_locations_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CowDailyMilk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "total_liters",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("record_count", models.PositiveIntegerField(default=0)),
+                (
+                    "cow",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_milk",
+                        to="farms.cow",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("cow", "date")},
+            },
+        ),
+        migrations.CreateModel(
+            name="FarmDailyMilk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "total_liters",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("record_count", models.PositiveIntegerField(default=0)),
+                (
+                    "farm",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_milk",
+                        to="farms.farm",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("farm", "date")},
+            },
+        ),
+        migrations.CreateModel(
+            name="FarmerDailyMilk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "total_liters",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("record_count", models.PositiveIntegerField(default=0)),
+                (
+                    "farmer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_milk",
+                        to="farms.farmer",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("farmer", "date")},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=CLEAR_SQL),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.7 on 2026-10-17 02:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from farms.sketches import build_sketches
+
+
+def backfill_sketches(apps, schema_editor):
+    CowDailyMilk = apps.get_model("farms", "CowDailyMilk")
+    FarmDailyMilkSketch = apps.get_model("farms", "FarmDailyMilkSketch")
+    rows = (
+        CowDailyMilk.objects.order_by("cow__farmer__farm_id", "date")
+        .values_list("cow__farmer__farm_id", "date", "cow_id", "total_liters")
+    )
+    batch = []
+    for farm_id, day, sketch in build_sketches(rows.iterator()):
+        batch.append(FarmDailyMilkSketch(farm_id=farm_id, date=day, **sketch.fields()))
+        if len(batch) >= 1000:
+            FarmDailyMilkSketch.objects.bulk_create(batch)
+            batch = []
+    FarmDailyMilkSketch.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("farms", "0006_tableversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FarmDailyMilkSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("cow_days", models.PositiveIntegerField(default=0)),
+                ("zero_count", models.PositiveIntegerField(default=0)),
+                ("buckets", models.JSONField(default=dict)),
+                ("cow_registers", models.BinaryField()),
+                (
+                    "farm",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_milk_sketches",
+                        to="farms.farm",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("farm", "date")},
+            },
+        ),
+        migrations.RunPython(backfill_sketches, migrations.RunPython.noop),
+    ]
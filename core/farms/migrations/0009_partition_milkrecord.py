@@ -0,0 +1,146 @@
+# Converts farms_milkrecord into a table range-partitioned by month on date.
+#
+# Runs online: the new table is filled in id chunks, each in its own short
+# transaction, while a trigger mirrors concurrent writes to the old table.
+# Only the final swap takes an exclusive lock, and only for the time it takes
+# to rename the tables. On databases other than PostgreSQL this is a no-op.
+
+from datetime import date
+
+from django.db import connection, migrations, transaction
+
+from farms.partitions import DEFAULT_PARTITION, add_months, create_month_partition, is_partitioned, month_start
+
+OLD_TABLE = "farms_milkrecord"
+NEW_TABLE = "farms_milkrecord_part"
+SEQUENCE = "farms_milkrecord_part_id_seq"
+CHUNK_SIZE = 50000
+MONTHS_AHEAD = 3
+
+# Leftovers of an earlier run that did not finish; the conversion starts over
+RESET_SQL = [
+    f"DROP TRIGGER IF EXISTS farms_milkrecord_mirror ON {OLD_TABLE}",
+    "DROP FUNCTION IF EXISTS farms_milkrecord_mirror()",
+    f"DROP TABLE IF EXISTS {NEW_TABLE}",
+    f"DROP SEQUENCE IF EXISTS {SEQUENCE}",
+]
+
+CREATE_SQL = [
+    f"CREATE SEQUENCE {SEQUENCE}",
+    f"""
+    CREATE TABLE {NEW_TABLE} (
+        LIKE {OLD_TABLE} INCLUDING DEFAULTS,
+        CONSTRAINT farms_milkrecord_id_date_pk PRIMARY KEY (id, date),
+        CONSTRAINT farms_milkrecord_cow_id_date_uniq UNIQUE (cow_id, date)
+    ) PARTITION BY RANGE (date)
+    """,
+    f"ALTER TABLE {NEW_TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')",
+    f"""
+    ALTER TABLE {NEW_TABLE}
+        ADD CONSTRAINT farms_milkrecord_cow_id_fk
+            FOREIGN KEY (cow_id) REFERENCES farms_cow (id) DEFERRABLE INITIALLY DEFERRED,
+        ADD CONSTRAINT farms_milkrecord_created_by_id_fk
+            FOREIGN KEY (created_by_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED,
+        ADD CONSTRAINT farms_milkrecord_recorded_by_id_fk
+            FOREIGN KEY (recorded_by_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED
+    """,
+    f"CREATE INDEX farms_milkrecord_created_by_id_idx ON {NEW_TABLE} (created_by_id)",
+    f"CREATE INDEX farms_milkrecord_recorded_by_id_idx ON {NEW_TABLE} (recorded_by_id)",
+    f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {NEW_TABLE} DEFAULT",
+]
+
+# Keeps the new table in step with writes made to the old one during the copy
+MIRROR_SQL = [
+    f"""
+    CREATE FUNCTION farms_milkrecord_mirror() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM {NEW_TABLE} WHERE id = OLD.id AND date = OLD.date;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO {NEW_TABLE} SELECT (NEW).* ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE TRIGGER farms_milkrecord_mirror
+    AFTER INSERT OR UPDATE OR DELETE ON {OLD_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION farms_milkrecord_mirror()
+    """,
+]
+
+SWAP_SQL = [
+    f"LOCK TABLE {OLD_TABLE} IN ACCESS EXCLUSIVE MODE",
+    f"DROP TRIGGER farms_milkrecord_mirror ON {OLD_TABLE}",
+    "DROP FUNCTION farms_milkrecord_mirror()",
+    f"SELECT setval('{SEQUENCE}', (SELECT COALESCE(max(id), 0) + 1 FROM {OLD_TABLE}), false)",
+    f"DROP TABLE {OLD_TABLE}",
+    f"ALTER TABLE {NEW_TABLE} RENAME TO {OLD_TABLE}",
+    f"ALTER SEQUENCE {SEQUENCE} RENAME TO farms_milkrecord_id_seq",
+    f"ALTER SEQUENCE farms_milkrecord_id_seq OWNED BY {OLD_TABLE}.id",
+]
+
+
+def _execute(statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def partition_milk_records(apps, schema_editor):
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, OLD_TABLE):
+            return
+        cursor.execute(f"SELECT min(date), max(date) FROM {OLD_TABLE}")
+        first_day, last_day = cursor.fetchone()
+
+    with transaction.atomic():
+        _execute(RESET_SQL)
+        _execute(CREATE_SQL)
+        today = month_start(date.today())
+        month = month_start(first_day) if first_day else today
+        last_month = max(month_start(last_day) if last_day else today, add_months(today, MONTHS_AHEAD))
+        with connection.cursor() as cursor:
+            while month <= last_month:
+                create_month_partition(cursor, month, parent=NEW_TABLE)
+                month = add_months(month, 1)
+        _execute(MIRROR_SQL)
+
+    # Creating the trigger waited for in-flight writes, so rows written from
+    # here on reach the new table through it and the copy below covers the
+    # rest. Locking each chunk's rows while it is copied stops them changing
+    # between being read and being written.
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COALESCE(max(id), 0) FROM {OLD_TABLE}")
+        last_id = cursor.fetchone()[0]
+    for chunk_start in range(0, last_id, CHUNK_SIZE):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {NEW_TABLE}
+                SELECT * FROM (
+                    SELECT * FROM {OLD_TABLE} WHERE id > %s AND id <= %s FOR SHARE
+                ) AS chunk
+                ON CONFLICT DO NOTHING
+                """,
+                [chunk_start, chunk_start + CHUNK_SIZE],
+            )
+
+    with transaction.atomic():
+        _execute(SWAP_SQL)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("farms", "0008_changeevent"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_milk_records, migrations.RunPython.noop),
+    ]
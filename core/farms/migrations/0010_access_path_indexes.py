@@ -0,0 +1,66 @@
+# Generated by Django 5.0.7 on 2026-10-17 01:31
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+from farms.partitions import AddPartitionedIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without blocking writes. farms_milkrecord is
+    # partitioned, which CONCURRENTLY does not support, so its indexes are
+    # built concurrently partition by partition and attached to the parent.
+    atomic = False
+
+    dependencies = [
+        ("farms", "0009_partition_milkrecord"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="activity",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="farms_activity_recent_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="activity",
+            index=models.Index(
+                fields=["farmer", "-created_at", "-id"],
+                name="farms_activity_farmer_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="cowdailymilk",
+            index=models.Index(fields=["date"], name="farms_cowdailymilk_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="farmdailymilk",
+            index=models.Index(fields=["date"], name="farms_farmdailymilk_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="farmdailymilksketch",
+            index=models.Index(fields=["date"], name="farms_milksketch_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="farmerdailymilk",
+            index=models.Index(fields=["date"], name="farms_farmerdailymilk_date_idx"),
+        ),
+        AddPartitionedIndexConcurrently(
+            model_name="milkrecord",
+            index=models.Index(
+                fields=["date", "cow"],
+                include=("liters",),
+                name="farms_milk_date_cow_idx",
+            ),
+        ),
+        AddPartitionedIndexConcurrently(
+            model_name="milkrecord",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["date"], name="farms_milk_date_brin"
+            ),
+        ),
+    ]
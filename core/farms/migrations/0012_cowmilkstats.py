@@ -0,0 +1,54 @@
+# Generated by Django 5.0.7 on 2026-10-17 01:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from farms.rollups import compute_cow_stats
+
+
+def backfill_cow_stats(apps, schema_editor):
+    Cow = apps.get_model("farms", "Cow")
+    CowMilkStats = apps.get_model("farms", "CowMilkStats")
+    MilkRecord = apps.get_model("farms", "MilkRecord")
+    cow_ids = list(Cow.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(cow_ids), 1000):
+        rows = compute_cow_stats(MilkRecord.objects.filter(cow_id__in=cow_ids[start : start + 1000]))
+        CowMilkStats.objects.bulk_create(CowMilkStats(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("farms", "0011_milkimport"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CowMilkStats",
+            fields=[
+                (
+                    "cow",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="milk_stats",
+                        serialize=False,
+                        to="farms.cow",
+                    ),
+                ),
+                ("record_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total_liters",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("min_liters", models.DecimalField(decimal_places=2, max_digits=8)),
+                ("max_liters", models.DecimalField(decimal_places=2, max_digits=8)),
+                ("last_date", models.DateField()),
+                (
+                    "recent_liters",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_cow_stats, migrations.RunPython.noop),
+    ]
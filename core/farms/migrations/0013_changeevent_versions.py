@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("farms", "0012_cowmilkstats"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="TableVersion",
+        ),
+        migrations.RemoveField(
+            model_name="changeevent",
+            name="version",
+        ),
+        migrations.AddIndex(
+            model_name="changeevent",
+            index=models.Index(
+                fields=["table_name", "id"], name="farms_changeevent_table_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+from farms.partitions import AddPartitionedIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Built without blocking writes; see AddPartitionedIndexConcurrently
+    atomic = False
+
+    dependencies = [
+        ("farms", "0013_changeevent_versions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddPartitionedIndexConcurrently(
+            model_name="milkrecord",
+            index=models.Index(
+                fields=["-date", "-created_at", "-id"], name="farms_milk_recent_idx"
+            ),
+        ),
+    ]
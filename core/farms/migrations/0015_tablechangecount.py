@@ -0,0 +1,76 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:01
+#
+# On PostgreSQL, change events are counted and published by a deferred
+# trigger on the outbox, which runs as the writing transaction commits. The
+# counts start from the events already in the outbox.
+
+from django.db import migrations, models
+
+from farms.changes import CHANGE_CHANNEL
+
+PUBLISH_SQL = [
+    f"""
+    CREATE FUNCTION farms_changeevent_publish() RETURNS trigger AS $$
+    DECLARE
+        committed bigint;
+    BEGIN
+        INSERT INTO farms_tablechangecount AS c (table_name, events) VALUES (NEW.table_name, 1)
+        ON CONFLICT (table_name) DO UPDATE SET events = c.events + 1
+        RETURNING c.events INTO committed;
+        PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object(
+            'id', NEW.id, 'table', NEW.table_name, 'action', NEW.action,
+            'object_id', NEW.object_id, 'count', committed
+        )::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE CONSTRAINT TRIGGER farms_changeevent_publish
+    AFTER INSERT ON farms_changeevent
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION farms_changeevent_publish()
+    """,
+    """
+    INSERT INTO farms_tablechangecount (table_name, events)
+    SELECT table_name, count(*) FROM farms_changeevent GROUP BY table_name
+    """,
+]
+
+UNPUBLISH_SQL = [
+    "DROP TRIGGER IF EXISTS farms_changeevent_publish ON farms_changeevent",
+    "DROP FUNCTION IF EXISTS farms_changeevent_publish()",
+]
+
+
+def publish_changes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in PUBLISH_SQL:
+            schema_editor.execute(statement)
+
+
+def unpublish_changes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in UNPUBLISH_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("farms", "0014_milkrecord_recent_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TableChangeCount",
+            fields=[
+                (
+                    "table_name",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("events", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(publish_changes, unpublish_changes),
+    ]
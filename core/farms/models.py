@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import models, transaction
 from django.forms import ValidationError
 
 
@@ -10,6 +11,12 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        # Rollups and change events are maintained from the save signals;
+        # keep them in the same transaction as the row itself.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
 User = get_user_model()
 
 class Agent(TimeStampedModel):
@@ -56,6 +63,11 @@ class Activity(TimeStampedModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Newest-first lists, overall and per farmer; id breaks ties for keyset pagination
+            models.Index(fields=["-created_at", "-id"], name="farms_activity_recent_idx"),
+            models.Index(fields=["farmer", "-created_at", "-id"], name="farms_activity_farmer_idx"),
+        ]
 
 
 class MilkRecord(TimeStampedModel):
@@ -68,5 +80,136 @@ class MilkRecord(TimeStampedModel):
     class Meta:
         unique_together = ("cow", "date")
         ordering = ["-date", "-created_at"]
+        indexes = [
+            # Date-range totals per cow read liters from the index alone
+            models.Index(fields=["date", "cow"], include=["liters"], name="farms_milk_date_cow_idx"),
+            # Rows arrive roughly in date order, so a BRIN index narrows
+            # date ranges for very little space
+            BrinIndex(fields=["date"], name="farms_milk_date_brin"),
+            # Serves the list ordering, id included for keyset pages
+            models.Index(fields=["-date", "-created_at", "-id"], name="farms_milk_recent_idx"),
+        ]
+
+
+class DailyMilkRollup(models.Model):
+    """Milk totals for one day, kept current from MilkRecord changes."""
+
+    date = models.DateField()
+    total_liters = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    record_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        # Reports read every owner's rollups over a date range
+        indexes = [models.Index(fields=["date"], name="%(app_label)s_%(class)s_date_idx")]
+
+
+class CowDailyMilk(DailyMilkRollup):
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name="daily_milk")
+
+    class Meta(DailyMilkRollup.Meta):
+        unique_together = ("cow", "date")
+
+
+class FarmerDailyMilk(DailyMilkRollup):
+    farmer = models.ForeignKey(Farmer, on_delete=models.CASCADE, related_name="daily_milk")
+
+    class Meta(DailyMilkRollup.Meta):
+        unique_together = ("farmer", "date")
+
+
+class FarmDailyMilk(DailyMilkRollup):
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name="daily_milk")
+
+    class Meta(DailyMilkRollup.Meta):
+        unique_together = ("farm", "date")
+
+
+class CowMilkStats(models.Model):
+    """Running statistics of one cow's milk records, kept current from MilkRecord changes.
+
+    ``recent_liters`` sums the 30 days up to and including ``last_date``,
+    the cow's latest record (see ``farms.rollups.RECENT_DAYS``).
+    """
+
+    cow = models.OneToOneField(Cow, on_delete=models.CASCADE, primary_key=True, related_name="milk_stats")
+    record_count = models.PositiveIntegerField(default=0)
+    total_liters = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    min_liters = models.DecimalField(max_digits=8, decimal_places=2)
+    max_liters = models.DecimalField(max_digits=8, decimal_places=2)
+    last_date = models.DateField()
+    recent_liters = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
 
+class FarmDailyMilkSketch(models.Model):
+    """Mergeable summary of the cow daily yields of one farm and day.
+
+    See ``farms.sketches`` for the encoding of the bucket counts and the
+    distinct-cow registers.
+    """
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name="daily_milk_sketches")
+    date = models.DateField()
+    cow_days = models.PositiveIntegerField(default=0)
+    zero_count = models.PositiveIntegerField(default=0)
+    buckets = models.JSONField(default=dict)
+    cow_registers = models.BinaryField()
+
+    class Meta:
+        unique_together = ("farm", "date")
+        indexes = [models.Index(fields=["date"], name="farms_milksketch_date_idx")]
+
+
+class ChangeEvent(models.Model):
+    """Outbox of writes to the versioned tables, appended in the writing transaction.
+
+    Each event is also published with NOTIFY when the transaction commits; the
+    table lets subscribers that were disconnected catch up on what they missed.
+    Readers version a table by its newest events and its TableChangeCount.
+    """
+
+    ACTION_CHOICES = (
+        ("insert", "Insert"),
+        ("update", "Update"),
+        ("delete", "Delete"),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    table_name = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    object_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["table_name", "id"], name="farms_changeevent_table_idx")]
+
+
+class TableChangeCount(models.Model):
+    """Number of committed change events of each versioned table.
+
+    Kept on PostgreSQL by a deferred trigger on the outbox, which bumps the
+    count while the writing transaction commits, so writers of a table only
+    queue for the row during their commit. Unlike event ids, the count
+    changes with every commit, whatever the order the ids were drawn in.
+    """
+
+    table_name = models.CharField(max_length=64, primary_key=True)
+    events = models.BigIntegerField(default=0)
+
+
+class MilkImport(models.Model):
+    """Progress of an ``import_milk`` run, saved with every chunk it commits.
+
+    An import that fails part way resumes after the last committed row when
+    it is run again on the same file.
+    """
+
+    file_name = models.CharField(max_length=255)
+    file_hash = models.CharField(max_length=64, db_index=True)
+    rows_done = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
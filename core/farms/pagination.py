@@ -0,0 +1,186 @@
+"""Pagination of the core API lists.
+
+Lists are paginated by page number as before, with two additions: clients
+choose the page size with ``?page_size=`` (at most ``MAX_PAGE_SIZE``), and
+``?count=estimated`` replaces the exact ``COUNT(*)`` with the planner's row
+estimate, which PostgreSQL derives from its table statistics.
+
+Viewsets that set ``cursor_ordering`` also serve keyset pages when asked
+with ``?pagination=cursor``. A cursor holds the ordering values of the row
+it starts from, so every page is one indexed range read with no OFFSET and
+no count, however deep the page.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.query import ValuesListIterable
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+MAX_PAGE_SIZE = 500
+
+# Planner estimates are loose for small results; count those exactly
+EXACT_COUNT_BELOW = 1000
+
+
+def estimated_count(queryset):
+    """Return the planner's estimate of the rows in ``queryset``, or the exact count when it is small."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    return queryset.count() if estimate < EXACT_COUNT_BELOW else estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+def _encode_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class ListPagination(pagination.PageNumberPagination):
+    """Page-number pagination with an optional keyset (cursor) mode."""
+
+    page_size_query_param = "page_size"
+    max_page_size = MAX_PAGE_SIZE
+    count_query_param = "count"
+    cursor_query_param = "cursor"
+    mode_query_param = "pagination"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.estimate = request.query_params.get(self.count_query_param) == "estimated"
+        self.ordering = getattr(view, "cursor_ordering", None)
+        self.cursor_mode = bool(self.ordering) and (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == "cursor"
+        )
+        if self.cursor_mode:
+            return self.paginate_cursor(queryset, request, view)
+        self.django_paginator_class = EstimatedCountPaginator if self.estimate else Paginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+        if self.estimate:
+            response = {"count": self.count, **response}
+        return Response(response)
+
+    # Keyset pages
+
+    def paginate_cursor(self, queryset, request, view):
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            raise ValidationError({"ordering": ["Cursor pages use a fixed ordering."]})
+        self.display_page_controls = False
+        self.count = estimated_count(queryset) if self.estimate else None
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        fields = [name.lstrip("-") for name in self.ordering]
+        values_list = issubclass(queryset._iterable_class, ValuesListIterable)
+        if values_list:
+            # Read each row's position from extra trailing columns
+            queryset = queryset.values_list(*queryset._fields, *fields)
+        ordering = [self._flip(name) for name in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        try:
+            if position is not None:
+                queryset = queryset.filter(self._after(ordering, position))
+            rows = list(queryset[: page_size + 1])
+        except (DjangoValidationError, TypeError, ValueError):
+            # Cursor values that do not fit their fields
+            raise NotFound("Invalid cursor")
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        positions = [
+            list(row[-len(fields):]) if values_list else [getattr(row, name) for name in fields] for row in rows
+        ]
+        if values_list:
+            rows = [row[: -len(fields)] for row in rows]
+        if reverse:
+            rows.reverse()
+            positions.reverse()
+
+        # Going forward there is a previous page if we came from one, and a
+        # next page if another row was found; backwards the other way round.
+        has_next, has_previous = (True, more) if reverse else (more, position is not None)
+        self.next_position = positions[-1] if rows and has_next else None
+        self.previous_position = positions[0] if rows and has_previous else None
+        return rows
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        return self.cursor_link(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        return self.cursor_link(self.previous_position, reverse=True)
+
+    def cursor_link(self, position, reverse):
+        if position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.mode_query_param)
+        payload = {"p": [_encode_value(value) for value in position], "r": reverse}
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = payload["p"], bool(payload["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound("Invalid cursor")
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return position, reverse
+
+    @staticmethod
+    def _flip(name):
+        return name[1:] if name.startswith("-") else f"-{name}"
+
+    @staticmethod
+    def _after(ordering, position):
+        """Return the filter for rows after ``position`` in ``ordering``.
+
+        The OR of the column comparisons is ANDed with an inclusive bound on
+        the leading column, which the planner can use as the start of an
+        index range; the OR chain alone is only applied as a filter.
+        """
+        condition = equal = Q()
+        for name, value in zip(ordering, position):
+            field = name.lstrip("-")
+            condition |= equal & Q(**{f"{field}__{'lt' if name.startswith('-') else 'gt'}": value})
+            equal &= Q(**{field: value})
+        name, value = ordering[0], position[0]
+        return Q(**{f"{name.lstrip('-')}__{'lte' if name.startswith('-') else 'gte'}": value}) & condition
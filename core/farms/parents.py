@@ -0,0 +1,71 @@
+"""Resolution of the parent objects named in nested routes.
+
+``/api/farms/{farm_pk}/farmers/{farmer_pk}/cows/{cow_pk}/milk/`` names a cow
+and the farmer and farm it belongs to. ``get_parents`` loads the innermost
+parent with its whole chain (farm, farmer, the farmer's user and cow) in one
+query and caches it on the request, so permissions, serializers and views
+share it. A parent that does not exist, or that does not belong to the one
+before it in the URL, is a 404.
+"""
+from collections import namedtuple
+
+from django.http import Http404
+
+from .models import Cow, Farm, Farmer
+
+Parents = namedtuple("Parents", ["farm", "farmer", "cow"])
+
+NO_PARENTS = Parents(None, None, None)
+
+
+def _get(queryset, pk):
+    try:
+        return queryset.get(pk=pk)
+    except (queryset.model.DoesNotExist, TypeError, ValueError):
+        raise Http404(f"No {queryset.model._meta.verbose_name} matches the given query.")
+
+
+def load_parents(kwargs):
+    """Load the parents named by ``farm_pk``, ``farmer_pk`` and ``cow_pk`` in ``kwargs``."""
+    farm_pk, farmer_pk, cow_pk = kwargs.get("farm_pk"), kwargs.get("farmer_pk"), kwargs.get("cow_pk")
+    if cow_pk is not None:
+        cow = _get(Cow.objects.select_related("farmer__farm", "farmer__user"), cow_pk)
+        parents = Parents(cow.farmer.farm, cow.farmer, cow)
+    elif farmer_pk is not None:
+        farmer = _get(Farmer.objects.select_related("farm", "user"), farmer_pk)
+        parents = Parents(farmer.farm, farmer, None)
+    elif farm_pk is not None:
+        parents = Parents(_get(Farm.objects.all(), farm_pk), None, None)
+    else:
+        return NO_PARENTS
+
+    # The outer parameters must name the inner object's own parents
+    if farmer_pk is not None and str(parents.farmer.pk) != str(farmer_pk):
+        raise Http404("The cow does not belong to this farmer.")
+    if farm_pk is not None and str(parents.farm.pk) != str(farm_pk):
+        raise Http404("The farmer does not belong to this farm.")
+    return parents
+
+
+def get_parents(request, kwargs):
+    """Return the request's parents, loading them on first use."""
+    parents = getattr(request, "_nested_parents", None)
+    if parents is None:
+        parents = request._nested_parents = load_parents(kwargs)
+    return parents
+
+
+class NestedParentsMixin:
+    """ViewSet mixin resolving the parents in the URL once per request.
+
+    They are checked after authentication and permissions, so a request
+    that may not see them gets a 401/403 rather than learning whether they
+    exist.
+    """
+
+    def get_parents(self):
+        return get_parents(self.request, self.kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.get_parents()
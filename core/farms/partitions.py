@@ -0,0 +1,155 @@
+"""Monthly range partitions of the milk record table (PostgreSQL only).
+
+``farms_milkrecord`` is partitioned by ``date``, one partition per calendar
+month plus a default partition for anything outside them, so date-range
+queries only read the months they cover. Partitions are named
+``farms_milkrecord_y2025m08``; ``create_milk_partitions`` adds them ahead
+of time.
+"""
+from datetime import date
+
+from django.db import NotSupportedError, connection, transaction
+from django.db.migrations.operations import AddIndex
+
+from .models import MilkRecord
+
+MILK_TABLE = MilkRecord._meta.db_table
+DEFAULT_PARTITION = f"{MILK_TABLE}_default"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{MILK_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(cursor, table=MILK_TABLE) -> bool:
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+        [table],
+    )
+    return cursor.fetchone()[0]
+
+
+def create_month_partition(cursor, month: date, parent=MILK_TABLE) -> bool:
+    """Create the partition for ``month`` unless it exists; return whether it was created.
+
+    Rows already in the default partition for that month are moved into the
+    new partition before it is attached.
+    """
+    name = partition_name(month)
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    if cursor.fetchone()[0]:
+        return False
+
+    start, end = month_start(month), add_months(month, 1)
+    cursor.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """,
+        [start, end],
+    )
+    # The constraint lets ATTACH skip validating every row of the new table
+    cursor.execute(
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_date_range CHECK (date >= %s AND date < %s)",
+        [start, end],
+    )
+    cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_date_range")
+    return True
+
+
+def ensure_partitions(first_month: date, last_month: date, parent=MILK_TABLE):
+    """Create every missing monthly partition from ``first_month`` to ``last_month``.
+
+    Each partition is created in its own transaction; returns the names created.
+    """
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if create_month_partition(cursor, month, parent):
+                created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def partitions_of(cursor, table=MILK_TABLE):
+    """Return the names of ``table``'s partitions."""
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+        ORDER BY child.relname
+        """,
+        [table],
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+class AddPartitionedIndexConcurrently(AddIndex):
+    """Add an index without blocking writes, on a partitioned table too.
+
+    CREATE INDEX CONCURRENTLY is not supported on a partitioned table, so the
+    index is created ON ONLY the parent, where it starts out invalid, then
+    concurrently on each partition and attached to it; the parent's index
+    becomes valid once every partition has one. Re-running after an
+    interruption drops the partition indexes it left invalid and carries on.
+    Tables that are not partitioned get CREATE INDEX CONCURRENTLY, and other
+    databases a plain CREATE INDEX.
+    """
+
+    atomic = False
+
+    def describe(self):
+        return "Concurrently create index %s on field(s) %s of model %s, partition by partition" % (
+            self.index.name,
+            ", ".join(self.index.fields),
+            self.model_name,
+        )
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                "Concurrent index creation cannot run inside a transaction; set Migration.atomic = False."
+            )
+        table = model._meta.db_table
+        with schema_editor.connection.cursor() as cursor:
+            if not is_partitioned(cursor, table):
+                schema_editor.add_index(model, self.index, concurrently=True)
+                return
+            partitions = partitions_of(cursor, table)
+
+        quote = schema_editor.quote_name
+        template = schema_editor.sql_create_index.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS")
+        schema_editor.execute(self.index.create_sql(model, schema_editor, sql=template.replace(" ON ", " ON ONLY ")))
+        for partition in partitions:
+            name = f"{self.index.name}_{partition.removeprefix(f'{table}_')}"
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", [name])
+                row = cursor.fetchone()
+            if row and not row[0]:
+                schema_editor.execute(f"DROP INDEX CONCURRENTLY {quote(name)}")
+            statement = self.index.create_sql(
+                model, schema_editor, sql=template.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY")
+            )
+            statement.parts["name"], statement.parts["table"] = quote(name), quote(partition)
+            schema_editor.execute(statement)
+            schema_editor.execute(f"ALTER INDEX {quote(self.index.name)} ATTACH PARTITION {quote(name)}")
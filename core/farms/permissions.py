@@ -1,5 +1,11 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from .models import Cow
+from .parents import get_parents
+
+
+def _record_cow(request, view, obj):
+    # On nested routes the cow has been loaded for the request already
+    cow = get_parents(request, view.kwargs).cow
+    return cow if cow is not None and cow.pk == obj.cow_id else obj.cow
 
 
 class IsAdminUser(BasePermission):
@@ -46,15 +52,13 @@ class MilkRecordPermission(BasePermission):
             return False
             
         # Get the cow for this milk record
-        cow_id = view.kwargs.get('cow_pk')
-        try:
-            cow = Cow.objects.get(pk=cow_id)
-        except Cow.DoesNotExist:
+        cow = get_parents(request, view.kwargs).cow
+        if cow is None:
             return False
             
         # Farmers can only access their own cows' records
         if hasattr(request.user, 'farmer_profile'):
-            return cow.farmer.user == request.user
+            return cow.farmer.user_id == request.user.pk
             
         # Admin and agents can access all records
         return (request.user.is_staff or request.user.is_agent or request.user.is_farmer)
@@ -65,7 +69,7 @@ class MilkRecordPermission(BasePermission):
             
         # Farmers can only access their own cows' records
         if hasattr(request.user, 'farmer_profile'):
-            return obj.cow.farmer.user == request.user
+            return _record_cow(request, view, obj).farmer.user_id == request.user.pk
             
         return False
 
@@ -146,8 +150,8 @@ class CowPermission(BasePermission):
         # Only admin, the creator, or the farmer can edit
         return bool(
             request.user.is_staff or 
-            obj.created_by == request.user or 
-            obj.farmer.user == request.user
+            obj.created_by_id == request.user.pk or 
+            obj.farmer.user_id == request.user.pk
         )
 
 
@@ -164,10 +168,29 @@ class MilkRecordPermission(BasePermission):
         # Only admin, the creator, or the farmer can edit
         return bool(
             request.user.is_staff or 
-            obj.created_by == request.user or 
-            obj.cow.farmer.user == request.user
+            obj.created_by_id == request.user.pk or 
+            _record_cow(request, view, obj).farmer.user_id == request.user.pk
+        )
+
+
+class BulkMilkRecordPermission(BasePermission):
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        return bool(
+            request.user.is_staff or
+            getattr(request.user, 'is_agent', False) or
+            hasattr(request.user, 'farmer_profile')
         )
 
+    def has_cow_permission(self, request, farmer_user_id):
+        # Farmers can only record milk for their own cows
+        if hasattr(request.user, 'farmer_profile'):
+            return farmer_user_id == request.user.pk
+
+        # Admin and agents can record milk for any cow
+        return True
+
 
 class ActivityPermission(BasePermission):
     def has_permission(self, request, view):
@@ -190,9 +213,9 @@ class ActivityPermission(BasePermission):
             
         # Farmers can only edit activities related to them
         if request.user.is_farmer:
-            return obj.farmer.user == request.user
+            return obj.farmer.user_id == request.user.pk
 
-        if obj.created_by == request.user:
+        if obj.created_by_id == request.user.pk:
             return True
 
         return False
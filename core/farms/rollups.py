@@ -0,0 +1,413 @@
+"""Maintenance of the daily milk rollup tables.
+
+CowDailyMilk, FarmerDailyMilk and FarmDailyMilk hold one row per owner and
+day, FarmDailyMilkSketch one per farm and day, and CowMilkStats one per cow.
+They are updated incrementally from the MilkRecord signals and can be
+rebuilt wholesale with the ``rebuild_milk_rollups`` and
+``rebuild_cow_milk_stats`` management commands.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+
+from . import sketches
+from .models import Cow, CowDailyMilk, CowMilkStats, FarmDailyMilk, Farmer, FarmerDailyMilk, MilkRecord
+
+# CowMilkStats.recent_liters covers this many days up to the cow's last record
+RECENT_DAYS = 30
+
+
+def _add(model, day, liters, count, **owner):
+    updated = model.objects.filter(date=day, **owner).update(
+        total_liters=F("total_liters") + liters,
+        record_count=F("record_count") + count,
+    )
+    if updated:
+        if count < 0:
+            model.objects.filter(date=day, record_count=0, **owner).delete()
+        return
+
+    # Removing from a row that does not exist is a no-op; this happens when
+    # the owner itself is being deleted and its rollups are already gone.
+    if count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(date=day, total_liters=liters, record_count=count, **owner)
+    except IntegrityError:
+        # Another transaction created the row first
+        model.objects.filter(date=day, **owner).update(
+            total_liters=F("total_liters") + liters,
+            record_count=F("record_count") + count,
+        )
+
+
+def apply_milk_delta(cow_id, day, liters, count):
+    """Add ``liters`` and ``count`` records to every rollup of a cow's day."""
+    owners = Cow.objects.filter(pk=cow_id).values_list("farmer_id", "farmer__farm_id").first()
+    cow_day = CowDailyMilk.objects.filter(cow_id=cow_id, date=day).values_list("total_liters", flat=True)
+    with transaction.atomic():
+        previous = cow_day.select_for_update().first()
+        _add(CowDailyMilk, day, liters, count, cow_id=cow_id)
+        if owners:
+            farmer_id, farm_id = owners
+            _add(FarmerDailyMilk, day, liters, count, farmer_id=farmer_id)
+            _add(FarmDailyMilk, day, liters, count, farm_id=farm_id)
+            if previous is None and count < 0:
+                # The cow-day rollup went first (cascading delete), so its old
+                # yield is unknown; recount the farm's day instead.
+                sketches.rebuild_sketches([farm_id], day, day)
+            else:
+                sketches.record_cow_day_change(farm_id, day, cow_id, previous, cow_day.first())
+
+
+def recent_start(last_date):
+    """Return the first day of the recent window ending on ``last_date``."""
+    return last_date - timedelta(days=RECENT_DAYS - 1)
+
+
+def compute_cow_stats(records):
+    """Return the CowMilkStats fields of every cow in a MilkRecord queryset, as dicts.
+
+    The recent windows of all cows whose last record is on the same day are
+    summed in one query.
+    """
+    records = records.order_by()
+    totals = list(
+        records.values("cow_id").annotate(
+            record_count=Count("pk"),
+            total_liters=Sum("liters"),
+            min_liters=Min("liters"),
+            max_liters=Max("liters"),
+            last_date=Max("date"),
+        )
+    )
+    cows_by_last_date = defaultdict(list)
+    for row in totals:
+        cows_by_last_date[row["last_date"]].append(row["cow_id"])
+    recent = {}
+    for last_date, cow_ids in cows_by_last_date.items():
+        recent.update(
+            records.filter(cow_id__in=cow_ids, date__gte=recent_start(last_date))
+            .values("cow_id")
+            .annotate(liters=Sum("liters"))
+            .values_list("cow_id", "liters")
+        )
+    return [dict(row, recent_liters=recent.get(row["cow_id"], 0)) for row in totals]
+
+
+def rebuild_cow_stats(cow_ids):
+    """Recompute CowMilkStats for these cows from their milk records."""
+    cow_ids = list(cow_ids)
+    with transaction.atomic():
+        rows = compute_cow_stats(MilkRecord.objects.filter(cow_id__in=cow_ids))
+        CowMilkStats.objects.filter(cow_id__in=cow_ids).delete()
+        CowMilkStats.objects.bulk_create(CowMilkStats(**row) for row in rows)
+
+
+def apply_cow_stats_change(cow_id, previous, current):
+    """Update a cow's CowMilkStats for one of its records going from ``previous`` to ``current``.
+
+    Both are ``(date, liters)`` or ``None``. Only removing the lowest or
+    highest yield, or writing within the recent window, reads the cow's
+    records again.
+    """
+    if previous == current:
+        return
+    with transaction.atomic():
+        stats = CowMilkStats.objects.select_for_update().filter(cow_id=cow_id).first()
+        if stats is None:
+            # The cow's first record
+            try:
+                with transaction.atomic():
+                    rebuild_cow_stats([cow_id])
+                return
+            except IntegrityError:
+                # Another transaction created the row first
+                return apply_cow_stats_change(cow_id, previous, current)
+
+        removed = [previous] if previous else []
+        added = [current] if current else []
+        stats.record_count += len(added) - len(removed)
+        if not stats.record_count:
+            stats.delete()
+            return
+        stats.total_liters += sum(liters for _, liters in added) - sum(liters for _, liters in removed)
+
+        records = MilkRecord.objects.filter(cow_id=cow_id).order_by()
+        if any(liters in (stats.min_liters, stats.max_liters) for _, liters in removed):
+            extremes = records.aggregate(low=Min("liters"), high=Max("liters"))
+            stats.min_liters, stats.max_liters = extremes["low"], extremes["high"]
+        for _, liters in added:
+            stats.min_liters = min(stats.min_liters, liters)
+            stats.max_liters = max(stats.max_liters, liters)
+
+        # Days before the recent window leave it and the last date unchanged
+        window_start = recent_start(stats.last_date)
+        if any(day >= window_start for day, _ in removed + added):
+            stats.last_date = records.aggregate(last=Max("date"))["last"]
+            stats.recent_liters = (
+                records.filter(date__gte=recent_start(stats.last_date)).aggregate(total=Sum("liters"))["total"] or 0
+            )
+        stats.save()
+
+
+def apply_cow_stats_changes(changes):
+    """Update CowMilkStats for many records written at once.
+
+    ``changes`` are ``(cow_id, date, previous, liters)`` for records that
+    were inserted (``previous`` is ``None``) or given new liters; none is
+    removed or moved to another day. Like ``apply_cow_stats_change``, the
+    totals are adjusted in place under a row lock, and a cow's records are
+    only read again when one of its extremes was overwritten or its recent
+    window moved.
+    """
+    written = defaultdict(list)
+    for cow_id, day, previous, liters in changes:
+        written[cow_id].append((day, previous, liters))
+    cow_ids = sorted(written)
+    records = MilkRecord.objects.order_by()
+    with transaction.atomic():
+        # Cows without stats get an empty row, so every row can be locked
+        # first; it is filled in from the cow's records below.
+        CowMilkStats.objects.bulk_create(
+            [CowMilkStats(cow_id=cow_id, min_liters=0, max_liters=0, last_date=date.min) for cow_id in cow_ids],
+            ignore_conflicts=True,
+        )
+        stats = list(CowMilkStats.objects.select_for_update().filter(cow_id__in=cow_ids).order_by("cow_id"))
+        new = [row.cow_id for row in stats if not row.record_count]
+        computed = {row["cow_id"]: row for row in compute_cow_stats(records.filter(cow_id__in=new))} if new else {}
+
+        extremes = []
+        moved = defaultdict(list)
+        for row in stats:
+            if row.cow_id in computed:
+                for name, value in computed[row.cow_id].items():
+                    setattr(row, name, value)
+                continue
+            cow_changes = written[row.cow_id]
+            row.record_count += sum(previous is None for _, previous, _ in cow_changes)
+            row.total_liters += sum(liters - (previous or 0) for _, previous, liters in cow_changes)
+            if any(previous in (row.min_liters, row.max_liters) for _, previous, _ in cow_changes):
+                extremes.append(row.cow_id)
+            else:
+                row.min_liters = min(row.min_liters, *(liters for _, _, liters in cow_changes))
+                row.max_liters = max(row.max_liters, *(liters for _, _, liters in cow_changes))
+            last_date = max(row.last_date, *(day for day, _, _ in cow_changes))
+            if last_date != row.last_date:
+                row.last_date = last_date
+                moved[last_date].append(row.cow_id)
+            else:
+                window_start = recent_start(row.last_date)
+                row.recent_liters += sum(
+                    liters - (previous or 0) for day, previous, liters in cow_changes if day >= window_start
+                )
+
+        found = {}
+        if extremes:
+            found = {
+                cow_id: (low, high)
+                for cow_id, low, high in records.filter(cow_id__in=extremes)
+                .values("cow_id")
+                .annotate(low=Min("liters"), high=Max("liters"))
+                .values_list("cow_id", "low", "high")
+            }
+        recent = {}
+        for last_date, moved_ids in moved.items():
+            recent.update(
+                records.filter(cow_id__in=moved_ids, date__gte=recent_start(last_date))
+                .values("cow_id")
+                .annotate(liters=Sum("liters"))
+                .values_list("cow_id", "liters")
+            )
+        for row in stats:
+            if row.cow_id in found:
+                row.min_liters, row.max_liters = found[row.cow_id]
+            if row.cow_id in recent:
+                row.recent_liters = recent[row.cow_id]
+        CowMilkStats.objects.bulk_update(
+            stats,
+            ["record_count", "total_liters", "min_liters", "max_liters", "last_date", "recent_liters"],
+            batch_size=1000,
+        )
+
+
+def record_milk_change(previous, current):
+    """Apply the rollup deltas for a MilkRecord going from ``previous`` to ``current``.
+
+    Both arguments are ``(cow_id, date, liters)`` tuples or ``None`` for a
+    record that did not exist before (insert) or no longer exists (delete).
+    """
+    if previous and current and previous[0] == current[0]:
+        apply_cow_stats_change(current[0], previous[1:], current[1:])
+    else:
+        if previous:
+            apply_cow_stats_change(previous[0], previous[1:], None)
+        if current:
+            apply_cow_stats_change(current[0], None, current[1:])
+
+    if previous and current and previous[:2] == current[:2]:
+        if previous[2] != current[2]:
+            apply_milk_delta(current[0], current[1], current[2] - previous[2], 0)
+        return
+    if previous:
+        apply_milk_delta(previous[0], previous[1], -previous[2], -1)
+    if current:
+        apply_milk_delta(current[0], current[1], current[2], 1)
+
+
+def _add_totals(model, column, totals, batch_size=250):
+    """Add ``{(owner_id, date): [liters, count]}`` to a rollup table, creating the rows it lacks.
+
+    Rows are written in key order, so batches running at the same time lock
+    them in the same order.
+    """
+    table = model._meta.db_table
+    rows = [(owner_id, day, liters, count) for (owner_id, day), (liters, count) in sorted(totals.items())]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({column}, date, total_liters, record_count)
+                VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))}
+                ON CONFLICT ({column}, date) DO UPDATE SET
+                    total_liters = {table}.total_liters + EXCLUDED.total_liters,
+                    record_count = {table}.record_count + EXCLUDED.record_count
+                """,
+                [value for row in batch for value in row],
+            )
+
+
+def apply_milk_changes(changes):
+    """Apply the rollup deltas of many MilkRecord writes at once.
+
+    ``changes`` are ``(cow_id, date, previous, liters)`` for records written
+    with ``liters``, where ``previous`` is their liters before or ``None``
+    for a new record. As for a single record, the rollups are only added to,
+    and only the rows changed are locked, table by table in the same order
+    as ``record_milk_change``, so batches and single writes run side by side.
+    """
+    changes = [change for change in changes if change[2] != change[3]]
+    if not changes:
+        return
+    owners = {
+        cow_id: (farmer_id, farm_id)
+        for cow_id, farmer_id, farm_id in Cow.objects.filter(pk__in={change[0] for change in changes})
+        .values_list("pk", "farmer_id", "farmer__farm_id")
+    }
+    cow_days, farmer_days, farm_days = (defaultdict(lambda: [0, 0]) for _ in range(3))
+    sketch_changes = []
+    for cow_id, day, previous, liters in changes:
+        farmer_id, farm_id = owners[cow_id]
+        for totals, owner_id in ((cow_days, cow_id), (farmer_days, farmer_id), (farm_days, farm_id)):
+            totals[owner_id, day][0] += liters - (previous or 0)
+            totals[owner_id, day][1] += previous is None
+        # A cow has one record a day, so its day's yield is the record's
+        sketch_changes.append((farm_id, day, cow_id, previous, liters))
+
+    with transaction.atomic():
+        apply_cow_stats_changes(changes)
+        _add_totals(CowDailyMilk, "cow_id", cow_days)
+        _add_totals(FarmerDailyMilk, "farmer_id", farmer_days)
+        _add_totals(FarmDailyMilk, "farm_id", farm_days)
+        sketches.record_cow_day_changes(sketch_changes)
+
+
+def rebuild_farmer_rollups(farmer_ids):
+    """Recompute FarmerDailyMilk for these farmers from CowDailyMilk."""
+    farmer_ids = [farmer_id for farmer_id in farmer_ids if farmer_id]
+    with transaction.atomic():
+        FarmerDailyMilk.objects.filter(farmer_id__in=farmer_ids).delete()
+        rows = (
+            CowDailyMilk.objects.filter(cow__farmer_id__in=farmer_ids)
+            .values("cow__farmer_id", "date")
+            .annotate(liters=Sum("total_liters"), records=Sum("record_count"))
+        )
+        FarmerDailyMilk.objects.bulk_create(
+            FarmerDailyMilk(
+                farmer_id=row["cow__farmer_id"],
+                date=row["date"],
+                total_liters=row["liters"],
+                record_count=row["records"],
+            )
+            for row in rows.iterator()
+        )
+
+
+def rebuild_farm_rollups(farm_ids):
+    """Recompute FarmDailyMilk and the sketches of these farms."""
+    farm_ids = [farm_id for farm_id in farm_ids if farm_id]
+    with transaction.atomic():
+        FarmDailyMilk.objects.filter(farm_id__in=farm_ids).delete()
+        rows = (
+            FarmerDailyMilk.objects.filter(farmer__farm_id__in=farm_ids)
+            .values("farmer__farm_id", "date")
+            .annotate(liters=Sum("total_liters"), records=Sum("record_count"))
+        )
+        FarmDailyMilk.objects.bulk_create(
+            FarmDailyMilk(
+                farm_id=row["farmer__farm_id"],
+                date=row["date"],
+                total_liters=row["liters"],
+                record_count=row["records"],
+            )
+            for row in rows.iterator()
+        )
+        sketches.rebuild_sketches(farm_ids)
+
+
+def rebuild_rollups_for_range(start_date, end_date):
+    """Rebuild every rollup row dated within ``[start_date, end_date]``.
+
+    MilkRecord writes are blocked for the duration, so the rebuilt rows and
+    the incremental updates that follow them never overlap.
+    """
+    milk = MilkRecord._meta.db_table
+    cows = Cow._meta.db_table
+    farmers = Farmer._meta.db_table
+    params = [start_date, end_date]
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(f"LOCK TABLE {milk} IN SHARE MODE")
+            for model in (CowDailyMilk, FarmerDailyMilk, FarmDailyMilk):
+                cursor.execute(
+                    f"DELETE FROM {model._meta.db_table} WHERE date BETWEEN %s AND %s", params
+                )
+            cursor.execute(
+                f"""
+                INSERT INTO {CowDailyMilk._meta.db_table} (cow_id, date, total_liters, record_count)
+                SELECT m.cow_id, m.date, SUM(m.liters), COUNT(*)
+                FROM {milk} m
+                WHERE m.date BETWEEN %s AND %s
+                GROUP BY m.cow_id, m.date
+                """,
+                params,
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {FarmerDailyMilk._meta.db_table} (farmer_id, date, total_liters, record_count)
+                SELECT c.farmer_id, m.date, SUM(m.liters), COUNT(*)
+                FROM {milk} m JOIN {cows} c ON c.id = m.cow_id
+                WHERE m.date BETWEEN %s AND %s
+                GROUP BY c.farmer_id, m.date
+                """,
+                params,
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {FarmDailyMilk._meta.db_table} (farm_id, date, total_liters, record_count)
+                SELECT f.farm_id, m.date, SUM(m.liters), COUNT(*)
+                FROM {milk} m
+                JOIN {cows} c ON c.id = m.cow_id
+                JOIN {farmers} f ON f.id = c.farmer_id
+                WHERE m.date BETWEEN %s AND %s
+                GROUP BY f.farm_id, m.date
+                """,
+                params,
+            )
+        sketches.rebuild_sketches(start_date=start_date, end_date=end_date)
@@ -0,0 +1,242 @@
+"""Serializer-free rendering of list pages.
+
+Rendering a page through a ModelSerializer runs every field of every nested
+serializer for every row. For list actions, ValuesListMixin instead compiles
+the serializer that would render the page, once per request, into the
+columns it reads and functions that build each object from a
+``values_list`` tuple. The JSON is the same, ``?fields=`` and ``?expand=``
+included; serializers with fields the compiler does not handle fall back to
+the regular path.
+
+Each relation nested directly in a row is loaded with one query for all
+the distinct objects on the page, with the relations nested in it joined
+in; related counts are one grouped query per count field. A page of a
+cow's milk records therefore reads and renders the cow once, not once per
+record.
+"""
+from datetime import date
+from decimal import Decimal, getcontext
+
+from django.db.models import Count
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+
+VALUE, NESTED, FETCHED, COUNT = range(4)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _lookup(model, source):
+    """Return the lookup for a field's ``source`` and the model field it ends at."""
+    if source == "*":
+        raise Unsupported(source)
+    field = None
+    for name in source.split("."):
+        if field is not None:
+            if not field.is_relation:
+                raise Unsupported(source)
+            model = field.related_model
+        try:
+            field = model._meta.get_field(name)
+        except Exception:
+            raise Unsupported(source)
+        if not field.concrete:
+            raise Unsupported(source)
+    return source.replace(".", "__"), field
+
+
+def _converter(field):
+    """Return a function rendering a database value as ``field`` would, or ``None`` if unchanged."""
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        if getattr(field, "format", api_settings.DATE_FORMAT).lower() == ISO_8601:
+            return date.isoformat
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    return field.to_representation
+
+
+def _datetime_converter(field):
+    # DateTimeField looks the current timezone up for every value; it does
+    # not change within a request, so look it up once.
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    tz = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or tz is None:
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        text = value.astimezone(tz).isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    return convert
+
+
+def _decimal_converter(field):
+    # DecimalField copies the decimal context and builds the exponent for
+    # every value; both are the same for every row.
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = Decimal(".1") ** field.decimal_places
+    context = getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    # A value quantized to a fixed number of places never prints in
+    # exponent notation, so str() gives the same text as DRF's "{:f}"
+    def convert(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return str(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _builder(steps, guard, built):
+    # A joined nested object is built once per page: every column of it
+    # follows from its primary key, which is the foreign key in ``guard``.
+    def build(row):
+        if guard is not None:
+            pk = row[guard]
+            if pk is None:
+                return None
+            if pk in built:
+                return built[pk]
+        item = {}
+        for key, kind, index, arg in steps:
+            if kind is VALUE:
+                value = row[index]
+                item[key] = value if arg is None or value is None else arg(value)
+            elif kind is NESTED:
+                item[key] = arg(row)
+            else:
+                # FETCHED objects and COUNTs are looked up by a key column
+                item[key] = arg.get(row[index], None if kind is FETCHED else 0)
+        if guard is not None:
+            built[pk] = item
+        return item
+    return build
+
+
+class RowPlan:
+    """The columns a serializer reads and a function building its output from them.
+
+    With ``split`` set, relations nested in the serializer are loaded by
+    their own plans, one query each per page; otherwise they are joined.
+    """
+
+    def __init__(self, serializer, split=True):
+        self.model = serializer.Meta.model
+        # The primary key comes first; counts and fetched objects are keyed on it
+        self.columns = [self.model._meta.pk.name]
+        self.counts = []
+        self.fetched = []
+        self.built = []
+        self.build = self._compile(serializer, self.model, "", None, split)
+
+    def _column(self, column):
+        if column in self.columns:
+            return self.columns.index(column)
+        self.columns.append(column)
+        return len(self.columns) - 1
+
+    def _compile(self, serializer, model, prefix, guard, split):
+        counts = getattr(serializer, "related_counts", {})
+        steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in counts:
+                    raise Unsupported(name)
+                owner = guard if guard is not None else 0
+                found = {}
+                self.counts.append((owner, model, counts[name], found))
+                steps.append((name, COUNT, owner, found))
+                continue
+            if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+                raise Unsupported(name)
+
+            lookup, model_field = _lookup(model, field.source)
+            if not isinstance(field, serializers.BaseSerializer):
+                steps.append((name, VALUE, self._column(prefix + lookup), _converter(field)))
+                continue
+            if not model_field.many_to_one and not model_field.one_to_one:
+                raise Unsupported(name)
+            key = self._column(prefix + lookup)
+            if split:
+                objects = {}
+                self.fetched.append((key, RowPlan(field, split=False), objects))
+                steps.append((name, FETCHED, key, objects))
+            else:
+                nested = self._compile(field, model_field.related_model, f"{prefix}{lookup}__", key, split)
+                steps.append((name, NESTED, None, nested))
+
+        built = {}
+        self.built.append(built)
+        return _builder(steps, guard, built)
+
+    def rows(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).values_list(*self.columns)
+
+    def render(self, rows):
+        """Build the output of ``rows``, loading nested objects and counts for all of them at once."""
+        rows = list(rows)
+        for built in self.built:
+            built.clear()
+        for key, plan, objects in self.fetched:
+            ids = {row[key] for row in rows} - {None}
+            nested_rows = list(plan.rows(plan.model._default_manager.filter(pk__in=ids).order_by()))
+            objects.clear()
+            objects.update(zip((row[0] for row in nested_rows), plan.render(nested_rows)))
+        for owner, model, relation, found in self.counts:
+            rel = model._meta.get_field(relation)
+            fk = rel.field.name
+            ids = {row[owner] for row in rows} - {None}
+            found.clear()
+            found.update(
+                rel.related_model._default_manager.filter(**{f"{fk}__in": ids})
+                .order_by()
+                .values(fk)
+                .annotate(count=Count("pk"))
+                .values_list(fk, "count")
+            )
+        return [self.build(row) for row in rows]
+
+
+class ValuesListMixin:
+    """ViewSet mixin serving ``list`` from compiled ``values_list`` rows instead of serializers."""
+
+    def get_row_plan(self):
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        try:
+            return RowPlan(serializer)
+        except Unsupported:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_row_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = plan.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page))
+        return Response(plan.render(rows))
@@ -3,15 +3,16 @@ from django.forms import ValidationError
 from rest_framework import serializers
 
 
+from .fieldsets import SparseFieldsMixin
 from .models import Activity, Agent, Cow, Farm, Farmer, MilkRecord, User
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ["id", "username", "first_name", "last_name", "email"]
 
-class AgentSerializer(serializers.ModelSerializer):
+class AgentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -68,7 +69,7 @@ class AgentSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class MilkRecordSerializer(serializers.ModelSerializer):
+class MilkRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     recorded_by = UserSerializer(read_only=True)
     created_by = UserSerializer(read_only=True)
 
@@ -89,7 +90,7 @@ class MilkRecordSerializer(serializers.ModelSerializer):
             
         if hasattr(request.user, 'farmer_profile'):
             # If user is a farmer, they can only add records for their own cows
-            if cow.farmer.user != request.user:
+            if cow.farmer.user_id != request.user.pk:
                 raise serializers.ValidationError("You can only add milk records for your own cows")
                 
         return attrs
@@ -98,9 +99,10 @@ class MilkRecordSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "first_name", "last_name", "email"]
 
 
-class FarmSerializer(serializers.ModelSerializer):
+class FarmSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
     farmers_count = serializers.SerializerMethodField()
+    related_counts = {"farmers_count": "farmers"}
     
 
     class Meta:
@@ -109,11 +111,14 @@ class FarmSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_by", "farmers_count"]
 
     def get_farmers_count(self, obj):
+        # Annotated by the viewset; objects just created or updated are not
+        if hasattr(obj, "farmers_count"):
+            return obj.farmers_count
         return obj.farmers.count()
 
 
 
-class FarmerSerializer(serializers.ModelSerializer):
+class FarmerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -128,6 +133,7 @@ class FarmerSerializer(serializers.ModelSerializer):
         required=False
     )
     cows_count = serializers.SerializerMethodField()
+    related_counts = {"cows_count": "cows"}
 
     class Meta:
         model = Farmer
@@ -135,6 +141,9 @@ class FarmerSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_by', 'cows_count', 'created_at', 'updated_at']
 
     def get_cows_count(self, obj):
+        # Annotated by the viewset; objects just created or updated are not
+        if hasattr(obj, "cows_count"):
+            return obj.cows_count
         return obj.cows.count()
 
     def validate(self, attrs):
@@ -187,7 +196,7 @@ class FarmerSerializer(serializers.ModelSerializer):
         
         return super().update(instance, validated_data)
 
-class CowSerializer(serializers.ModelSerializer):
+class CowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     farmer = FarmerSerializer(read_only=True)
     farmer_id = serializers.PrimaryKeyRelatedField(
         queryset=Farmer.objects.all(), source="farmer", write_only=True,
@@ -195,6 +204,7 @@ class CowSerializer(serializers.ModelSerializer):
     )
     created_by = UserSerializer(read_only=True)
     milk_records_count = serializers.SerializerMethodField()
+    related_counts = {"milk_records_count": "milk_records"}
 
     class Meta:
         model = Cow
@@ -202,6 +212,9 @@ class CowSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_by", "milk_records_count"]
 
     def get_milk_records_count(self, obj):
+        # Annotated by the viewset; objects just created or updated are not
+        if hasattr(obj, "milk_records_count"):
+            return obj.milk_records_count
         return obj.milk_records.count()
 
     def validate(self, attrs):
@@ -224,7 +237,7 @@ class CowSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class MilkRecordSerializer(serializers.ModelSerializer):
+class MilkRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     cow = CowSerializer(read_only=True)
     cow_id = serializers.PrimaryKeyRelatedField(
         queryset=Cow.objects.all(), source="cow", write_only=True
@@ -255,7 +268,21 @@ class MilkRecordSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class ActivitySerializer(serializers.ModelSerializer):
+class BulkMilkRecordSerializer(serializers.Serializer):
+    """One entry of a bulk milk upload; the cow is given by ``cow_id`` or ``tag_id``."""
+
+    cow_id = serializers.IntegerField(required=False)
+    tag_id = serializers.CharField(required=False, max_length=64)
+    date = serializers.DateField()
+    liters = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+    def validate(self, attrs):
+        if ("cow_id" in attrs) == ("tag_id" in attrs):
+            raise serializers.ValidationError("Give either cow_id or tag_id.")
+        return attrs
+
+
+class ActivitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     farmer = FarmerSerializer(read_only=True)
     farmer_id = serializers.PrimaryKeyRelatedField(
         queryset=Farmer.objects.all(), source="farmer", write_only=True
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import rollups
+from .changes import record_change
+from .models import Activity, Cow, Farm, Farmer, MilkRecord
+
+# Reports show user emails, so users are versioned too
+VERSIONED_MODELS = (Farm, Farmer, Cow, MilkRecord, Activity, get_user_model())
+
+
+def _record_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # A login only stamps last_login, which no report reads
+    if raw or update_fields == {"last_login"}:
+        return
+    record_change(sender, "insert" if created else "update", instance.pk)
+
+
+def _record_delete(sender, instance, **kwargs):
+    record_change(sender, "delete", instance.pk)
+
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(_record_save, sender=_model, dispatch_uid=f"record-change-save-{_model.__name__}")
+    post_delete.connect(_record_delete, sender=_model, dispatch_uid=f"record-change-delete-{_model.__name__}")
+
+
+def _milk_key(record):
+    # Normalise through the fields so strings and floats compare as date/Decimal
+    date = MilkRecord._meta.get_field("date").to_python(record.date)
+    liters = MilkRecord._meta.get_field("liters").to_python(record.liters)
+    return (record.cow_id, date, liters)
+
+
+@receiver(pre_save, sender=MilkRecord)
+def remember_previous_milk_record(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if raw or instance._state.adding:
+        return
+    # Lock the row until the save commits, so an overlapping update of the
+    # same record waits and then reads this save's values as its previous
+    # ones, rather than both applying their change against the same old row.
+    # save() runs in TimeStampedModel's atomic block.
+    instance._rollup_previous = (
+        MilkRecord.objects.select_for_update().filter(pk=instance.pk).values_list("cow_id", "date", "liters").first()
+    )
+
+
+@receiver(post_save, sender=MilkRecord)
+def update_rollups_on_milk_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.record_milk_change(getattr(instance, "_rollup_previous", None), _milk_key(instance))
+    instance._rollup_previous = _milk_key(instance)
+
+
+@receiver(post_delete, sender=MilkRecord)
+def update_rollups_on_milk_delete(sender, instance, **kwargs):
+    rollups.record_milk_change(_milk_key(instance), None)
+
+
+@receiver(pre_save, sender=Cow)
+def remember_previous_cow_farmer(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous_farmer_id = None
+    if raw or instance._state.adding:
+        return
+    instance._rollup_previous_farmer_id = (
+        Cow.objects.filter(pk=instance.pk).values_list("farmer_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Cow)
+def move_rollups_on_cow_transfer(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_rollup_previous_farmer_id", None)
+    if raw or previous is None or previous == instance.farmer_id:
+        return
+    farm_ids = Farmer.objects.filter(pk__in=[previous, instance.farmer_id]).values_list("farm_id", flat=True)
+    rollups.rebuild_farmer_rollups([previous, instance.farmer_id])
+    rollups.rebuild_farm_rollups(set(farm_ids))
+
+
+@receiver(pre_save, sender=Farmer)
+def remember_previous_farmer_farm(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous_farm_id = None
+    if raw or instance._state.adding:
+        return
+    instance._rollup_previous_farm_id = (
+        Farmer.objects.filter(pk=instance.pk).values_list("farm_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Farmer)
+def move_rollups_on_farmer_transfer(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_rollup_previous_farm_id", None)
+    if raw or previous is None or previous == instance.farm_id:
+        return
+    rollups.rebuild_farm_rollups([previous, instance.farm_id])
@@ -0,0 +1,208 @@
+"""Mergeable sketches of cow daily yields, one per farm and day.
+
+A FarmDailyMilkSketch summarises the CowDailyMilk totals of a farm's cows on
+one day, so distribution statistics over any range of days and farms can be
+answered by merging sketches instead of reading every cow-day:
+
+* ``buckets`` counts yields in logarithmic buckets (as in DDSketch). Bucket
+  ``i`` holds values in ``(GAMMA ** (i - 1), GAMMA ** i]``, so any quantile
+  read back from merged buckets is within ``RELATIVE_ACCURACY`` of the true
+  value. Yields of zero are counted in ``zero_count``. Buckets merge by
+  adding counts, and a changed cow-day moves one count between buckets.
+* ``cow_registers`` are HyperLogLog registers of the cow ids, merged by
+  taking the per-register maximum. Registers cannot forget a cow, so a
+  cow-day that is deleted keeps counting towards the distinct-cow estimate
+  until the sketch is rebuilt.
+
+The reporting service merges these rows; the constants below are shared
+with it and must not change without rebuilding every sketch.
+"""
+import hashlib
+import math
+from collections import defaultdict
+from itertools import groupby
+
+from django.db import IntegrityError, transaction
+
+from .models import CowDailyMilk, FarmDailyMilkSketch
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+def bucket_index(liters):
+    """Return the bucket of a positive yield, or ``None`` for zero."""
+    liters = float(liters)
+    if liters <= 0:
+        return None
+    return math.ceil(math.log(liters) / math.log(GAMMA))
+
+
+def _register_update(cow_id):
+    digest = hashlib.blake2b(str(cow_id).encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    register = value >> (64 - HLL_PRECISION)
+    remainder = value & ((1 << (64 - HLL_PRECISION)) - 1)
+    return register, (64 - HLL_PRECISION) - remainder.bit_length() + 1
+
+
+class MilkSketch:
+    def __init__(self, cow_days=0, zero_count=0, buckets=None, cow_registers=None):
+        self.cow_days = cow_days
+        self.zero_count = zero_count
+        # JSON object keys are strings
+        self.buckets = {int(index): count for index, count in (buckets or {}).items()}
+        self.cow_registers = bytearray(cow_registers or bytes(HLL_REGISTERS))
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.cow_days, row.zero_count, row.buckets, row.cow_registers)
+
+    def add(self, cow_id, liters):
+        self.cow_days += 1
+        index = bucket_index(liters)
+        if index is None:
+            self.zero_count += 1
+        else:
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        register, rank = _register_update(cow_id)
+        self.cow_registers[register] = max(self.cow_registers[register], rank)
+
+    def remove(self, liters):
+        self.cow_days = max(self.cow_days - 1, 0)
+        index = bucket_index(liters)
+        if index is None:
+            self.zero_count = max(self.zero_count - 1, 0)
+        elif self.buckets.get(index, 0) > 1:
+            self.buckets[index] -= 1
+        else:
+            self.buckets.pop(index, None)
+
+    def fields(self):
+        return {
+            "cow_days": self.cow_days,
+            "zero_count": self.zero_count,
+            "buckets": {str(index): count for index, count in sorted(self.buckets.items())},
+            "cow_registers": bytes(self.cow_registers),
+        }
+
+
+def record_cow_day_change(farm_id, day, cow_id, previous, current):
+    """Move one cow-day of a farm's sketch from yield ``previous`` to ``current``.
+
+    Either yield is ``None`` when the cow had no milk recorded that day
+    before or after the change.
+    """
+    if previous == current:
+        return
+    with transaction.atomic():
+        row = FarmDailyMilkSketch.objects.select_for_update().filter(farm_id=farm_id, date=day).first()
+        if row is None:
+            if current is None:
+                return
+            sketch = MilkSketch()
+            sketch.add(cow_id, current)
+            try:
+                with transaction.atomic():
+                    FarmDailyMilkSketch.objects.create(farm_id=farm_id, date=day, **sketch.fields())
+                return
+            except IntegrityError:
+                # Another transaction created the row first
+                row = FarmDailyMilkSketch.objects.select_for_update().get(farm_id=farm_id, date=day)
+
+        sketch = MilkSketch.from_row(row)
+        if previous is not None:
+            sketch.remove(previous)
+        if current is not None:
+            sketch.add(cow_id, current)
+        if not sketch.cow_days:
+            row.delete()
+            return
+        FarmDailyMilkSketch.objects.filter(pk=row.pk).update(**sketch.fields())
+
+
+def record_cow_day_changes(changes):
+    """Apply many ``(farm_id, date, cow_id, previous, current)`` cow-day changes, as ``record_cow_day_change`` does one.
+
+    Each farm's day is locked and written once, in ``(farm_id, date)``
+    order. Days without a sketch get an empty one first, so that every row
+    can be locked before it is changed.
+    """
+    by_farm_day = defaultdict(list)
+    for farm_id, day, cow_id, previous, current in changes:
+        if previous != current:
+            by_farm_day[farm_id, day].append((cow_id, previous, current))
+    if not by_farm_day:
+        return
+    keys = sorted(by_farm_day)
+    with transaction.atomic():
+        FarmDailyMilkSketch.objects.bulk_create(
+            [FarmDailyMilkSketch(farm_id=farm_id, date=day, **MilkSketch().fields()) for farm_id, day in keys],
+            ignore_conflicts=True,
+        )
+        rows = (
+            FarmDailyMilkSketch.objects.select_for_update()
+            .filter(farm_id__in={farm_id for farm_id, _ in keys}, date__in={day for _, day in keys})
+            .order_by("farm_id", "date")
+        )
+        changed, emptied = [], []
+        for row in rows:
+            if (row.farm_id, row.date) not in by_farm_day:
+                continue
+            sketch = MilkSketch.from_row(row)
+            for cow_id, previous, current in by_farm_day[row.farm_id, row.date]:
+                if previous is not None:
+                    sketch.remove(previous)
+                if current is not None:
+                    sketch.add(cow_id, current)
+            if not sketch.cow_days:
+                emptied.append(row.pk)
+                continue
+            for name, value in sketch.fields().items():
+                setattr(row, name, value)
+            changed.append(row)
+        FarmDailyMilkSketch.objects.bulk_update(changed, ["cow_days", "zero_count", "buckets", "cow_registers"])
+        FarmDailyMilkSketch.objects.filter(pk__in=emptied).delete()
+
+
+def build_sketches(rows):
+    """Yield ``(farm_id, date, MilkSketch)`` from ``(farm_id, date, cow_id, liters)``
+    rows ordered by farm and date.
+    """
+    for (farm_id, day), cow_days in groupby(rows, key=lambda row: (row[0], row[1])):
+        sketch = MilkSketch()
+        for _, _, cow_id, liters in cow_days:
+            sketch.add(cow_id, liters)
+        yield farm_id, day, sketch
+
+
+def rebuild_sketches(farm_ids=None, start_date=None, end_date=None, batch_size=1000):
+    """Recompute the sketches of these farms and/or dates from CowDailyMilk."""
+    sketches = FarmDailyMilkSketch.objects.all()
+    cow_days = CowDailyMilk.objects.all()
+    if farm_ids is not None:
+        farm_ids = [farm_id for farm_id in farm_ids if farm_id]
+        sketches = sketches.filter(farm_id__in=farm_ids)
+        cow_days = cow_days.filter(cow__farmer__farm_id__in=farm_ids)
+    if start_date is not None:
+        sketches = sketches.filter(date__gte=start_date)
+        cow_days = cow_days.filter(date__gte=start_date)
+    if end_date is not None:
+        sketches = sketches.filter(date__lte=end_date)
+        cow_days = cow_days.filter(date__lte=end_date)
+
+    rows = (
+        cow_days.order_by("cow__farmer__farm_id", "date")
+        .values_list("cow__farmer__farm_id", "date", "cow_id", "total_liters")
+    )
+    with transaction.atomic():
+        sketches.delete()
+        batch = []
+        for farm_id, day, sketch in build_sketches(rows.iterator()):
+            batch.append(FarmDailyMilkSketch(farm_id=farm_id, date=day, **sketch.fields()))
+            if len(batch) >= batch_size:
+                FarmDailyMilkSketch.objects.bulk_create(batch)
+                batch = []
+        FarmDailyMilkSketch.objects.bulk_create(batch)
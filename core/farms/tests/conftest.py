@@ -0,0 +1,17 @@
+import pytest
+from rest_framework.test import APIClient
+
+from farms.tests.factories import UserFactory
+
+
+@pytest.fixture
+def superuser(db):
+    return UserFactory(is_superuser=True, is_staff=True)
+
+
+@pytest.fixture
+def api_client(superuser):
+    """An API client authenticated as a superuser, who sees every farm."""
+    client = APIClient()
+    client.force_authenticate(user=superuser)
+    return client
@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import factory
+from django.contrib.auth import get_user_model
+from factory.django import DjangoModelFactory
+
+from farms.models import Activity, Agent, Cow, Farm, Farmer, MilkRecord
+
+
+class UserFactory(DjangoModelFactory):
+    class Meta:
+        model = get_user_model()
+
+    username = factory.Sequence(lambda n: f"user{n}")
+    email = factory.LazyAttribute(lambda user: f"{user.username}@example.com")
+    first_name = factory.Faker("first_name")
+    last_name = factory.Faker("last_name")
+
+
+class AgentFactory(DjangoModelFactory):
+    class Meta:
+        model = Agent
+
+    user = factory.SubFactory(UserFactory, is_agent=True)
+    phone = factory.Sequence(lambda n: f"+2547{n:08d}")
+    locations = "Nakuru"
+
+
+class FarmFactory(DjangoModelFactory):
+    class Meta:
+        model = Farm
+
+    name = factory.Sequence(lambda n: f"Farm {n}")
+    location = "Nakuru"
+    created_by = factory.SubFactory(UserFactory)
+
+
+class FarmerFactory(DjangoModelFactory):
+    class Meta:
+        model = Farmer
+
+    user = factory.SubFactory(UserFactory, is_farmer=True)
+    farm = factory.SubFactory(FarmFactory)
+    created_by = factory.SelfAttribute("farm.created_by")
+
+
+class CowFactory(DjangoModelFactory):
+    class Meta:
+        model = Cow
+
+    tag_id = factory.Sequence(lambda n: f"COW-{n:05d}")
+    farmer = factory.SubFactory(FarmerFactory)
+    birth_date = date(2022, 3, 1)
+    created_by = factory.SelfAttribute("farmer.created_by")
+
+
+class MilkRecordFactory(DjangoModelFactory):
+    class Meta:
+        model = MilkRecord
+
+    cow = factory.SubFactory(CowFactory)
+    date = factory.Sequence(lambda n: date.today() - timedelta(days=n))
+    liters = factory.Sequence(lambda n: Decimal("8.50") + n % 7)
+    recorded_by = factory.SelfAttribute("cow.farmer.user")
+    created_by = factory.SelfAttribute("cow.created_by")
+
+
+class ActivityFactory(DjangoModelFactory):
+    class Meta:
+        model = Activity
+
+    farmer = factory.SubFactory(FarmerFactory)
+    actor = factory.SelfAttribute("farmer.user")
+    description = factory.Sequence(lambda n: f"Milking round {n}")
+    created_by = factory.SelfAttribute("farmer.created_by")
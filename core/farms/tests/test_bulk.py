@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection, transaction
+
+from farms import rollups, sketches
+from farms.bulk import merge_milk_records, upsert_milk_records
+from farms.models import CowDailyMilk, CowMilkStats, FarmDailyMilk, FarmDailyMilkSketch, FarmerDailyMilk
+from farms.tests.factories import CowFactory, FarmerFactory, MilkRecordFactory, UserFactory
+
+pytestmark = pytest.mark.django_db
+
+TODAY = date(2026, 6, 30)
+
+
+def rollup_rows():
+    return {
+        "cow_days": set(CowDailyMilk.objects.values_list("cow_id", "date", "total_liters", "record_count")),
+        "farmer_days": set(FarmerDailyMilk.objects.values_list("farmer_id", "date", "total_liters", "record_count")),
+        "farm_days": set(FarmDailyMilk.objects.values_list("farm_id", "date", "total_liters", "record_count")),
+        "stats": set(CowMilkStats.objects.values_list(
+            "cow_id", "record_count", "total_liters", "min_liters", "max_liters", "last_date", "recent_liters"
+        )),
+        "sketches": {
+            (farm_id, day, cow_days, zero_count, tuple(sorted(buckets.items())), bytes(registers))
+            for farm_id, day, cow_days, zero_count, buckets, registers in FarmDailyMilkSketch.objects.values_list(
+                "farm_id", "date", "cow_days", "zero_count", "buckets", "cow_registers"
+            )
+        },
+    }
+
+
+@pytest.fixture
+def herd():
+    """Two farmers' cows with a few days of milk, their rollups kept by the signals."""
+    farmer = FarmerFactory()
+    cows = CowFactory.create_batch(2, farmer=farmer) + [CowFactory(farmer=FarmerFactory(farm=farmer.farm))]
+    cows.append(CowFactory())
+    for cow in cows[:3]:
+        for days_ago, liters in ((60, "9.00"), (2, "12.50"), (1, "11.00")):
+            MilkRecordFactory(cow=cow, date=TODAY - timedelta(days=days_ago), liters=Decimal(liters))
+    return cows
+
+
+@pytest.mark.parametrize("write", [upsert_milk_records, merge_milk_records])
+def test_bulk_writes_keep_the_rollups_in_step(herd, write):
+    first, second, third, new = herd
+    liters_by_key = {
+        (first.pk, TODAY - timedelta(days=2)): Decimal("12.50"),  # unchanged
+        (first.pk, TODAY - timedelta(days=1)): Decimal("3.25"),  # was the cow's highest but one
+        (second.pk, TODAY - timedelta(days=2)): Decimal("0.00"),  # was its highest
+        (second.pk, TODAY - timedelta(days=60)): Decimal("10.00"),  # was its lowest, before its recent window
+        (first.pk, TODAY): Decimal("10.00"),
+        (second.pk, TODAY): Decimal("8.75"),
+        (third.pk, TODAY): Decimal("0.00"),
+        (new.pk, TODAY - timedelta(days=10)): Decimal("6.00"),  # the cow's first record
+        (new.pk, TODAY): Decimal("7.00"),
+    }
+
+    written = write(liters_by_key, UserFactory())
+
+    if write is upsert_milk_records:
+        assert {key for key, (_, created) in written.items() if created} == {
+            (first.pk, TODAY), (second.pk, TODAY), (third.pk, TODAY), (new.pk, TODAY - timedelta(days=10)), (new.pk, TODAY)
+        }
+    else:
+        assert written == (5, 4)
+    incremental = rollup_rows()
+    rollups.rebuild_rollups_for_range(TODAY - timedelta(days=60), TODAY)
+    rollups.rebuild_cow_stats([cow.pk for cow in herd])
+    sketches.rebuild_sketches()
+    assert incremental == rollup_rows()
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="table locks are PostgreSQL's")
+def test_bulk_writes_lock_rows_not_the_milk_table(herd):
+    with transaction.atomic():
+        upsert_milk_records({(cow.pk, TODAY): Decimal("10.00") for cow in herd}, UserFactory())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT mode FROM pg_locks WHERE relation = 'farms_milkrecord'::regclass AND pid = pg_backend_pid()"
+            )
+            modes = {mode for mode, in cursor.fetchall()}
+    assert modes <= {"AccessShareLock", "RowShareLock", "RowExclusiveLock"}
@@ -0,0 +1,25 @@
+import pytest
+from django.db import connection, transaction
+
+from farms.models import ChangeEvent, TableChangeCount
+from farms.tests.factories import FarmFactory
+
+
+def farm_event_count():
+    return TableChangeCount.objects.filter(table_name="farms_farm").values_list("events", flat=True).first() or 0
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="counted by a PostgreSQL trigger")
+def test_committed_changes_are_counted_and_rolled_back_ones_are_not():
+    farm = FarmFactory()
+    farm.name = "Renamed"
+    farm.save()
+
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            farm.save()
+            raise RuntimeError
+
+    assert ChangeEvent.objects.filter(table_name="farms_farm").count() == 2
+    assert farm_event_count() == 2
@@ -0,0 +1,60 @@
+"""The list endpoints run a fixed number of queries however many rows a page has.
+
+Each page below holds at least two rows, so a query run per row (or per
+related row) pushes its endpoint past the budget. Budgets count the
+pagination COUNT (none for cursor pages), the page itself, the parents of a
+nested route, the requesting user's farmer profile where a view scopes by
+it, and one query per prefetched or separately loaded relation and per
+related count.
+"""
+import pytest
+
+from farms.tests.factories import ActivityFactory, AgentFactory, CowFactory, FarmerFactory, FarmFactory, MilkRecordFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def farm():
+    """Two farms of two farmers, each with two cows, three days of milk and two activities."""
+    farms = FarmFactory.create_batch(2)
+    for farm in farms:
+        for farmer in FarmerFactory.create_batch(2, farm=farm):
+            for cow in CowFactory.create_batch(2, farmer=farmer):
+                MilkRecordFactory.reset_sequence()
+                MilkRecordFactory.create_batch(3, cow=cow)
+            ActivityFactory(farmer=farmer)
+            ActivityFactory(farmer=farmer, actor=None)
+    AgentFactory.create_batch(2)
+    return farms[0]
+
+
+@pytest.mark.parametrize(
+    "url, query, budget",
+    [
+        ("/api/farms/", "", 2),
+        ("/api/farmers/", "", 3),
+        ("/api/farms/{farm}/farmers/", "", 4),
+        ("/api/cows/", "", 5),
+        ("/api/farmers/{farmer}/cows/", "", 6),
+        ("/api/farms/{farm}/farmers/{farmer}/cows/", "", 6),
+        ("/api/cows/{cow}/milk/", "", 9),
+        ("/api/cows/{cow}/milk/", "fields=id,date,liters,cow", 3),
+        ("/api/cows/{cow}/milk/", "pagination=cursor", 8),
+        ("/api/farms/{farm}/farmers/{farmer}/cows/{cow}/milk/", "", 9),
+        ("/api/activities/", "", 7),
+        ("/api/activities/", "pagination=cursor", 6),
+        ("/api/farms/{farm}/activities/", "", 8),
+        ("/api/agents/", "", 2),
+    ],
+)
+def test_list_query_budget(api_client, django_assert_max_num_queries, farm, url, query, budget):
+    farmer = farm.farmers.order_by("pk").first()
+    cow = farmer.cows.order_by("pk").first()
+    url = url.format(farm=farm.pk, farmer=farmer.pk, cow=cow.pk)
+
+    with django_assert_max_num_queries(budget):
+        response = api_client.get(url, QUERY_STRING=query)
+
+    assert response.status_code == 200
+    assert len(response.data["results"]) >= 2
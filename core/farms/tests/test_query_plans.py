@@ -0,0 +1,218 @@
+"""The list endpoints' first pages must read large tables through an index.
+
+Each list queryset is built as its view builds it and EXPLAINed against
+tables seeded well past ``MIN_ROWS`` and ANALYZEd, so a change that makes a
+list scan a whole table fails here rather than on a production database.
+"""
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+
+from farms.pagination import ListPagination
+from farms.views import (
+    ActivityViewSet,
+    AgentViewSet,
+    CowMilkRecordViewSet,
+    CowViewSet,
+    FarmerViewSet,
+    FarmViewSet,
+    MilkRecordViewSet,
+)
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != "postgresql", reason="query plans are checked on PostgreSQL"),
+]
+
+# Tables estimated below this many rows may be scanned
+MIN_ROWS = 5000
+
+FARMS = 500
+FARMERS_PER_FARM = 15
+COWS_PER_FARMER = 4
+DAYS = 10
+
+SEED_SQL = """
+INSERT INTO users_user (password, is_superuser, username, first_name, last_name, email,
+                        is_staff, is_active, date_joined, is_agent, is_farmer)
+SELECT '!', false, 'farmer' || n, 'Farmer', n::text, 'farmer' || n || '@example.com', false, true, now(), false, true
+FROM generate_series(1, %(farmers)s) n;
+
+INSERT INTO farms_farm (name, location, created_by_id, created_at, updated_at)
+SELECT 'Farm ' || n, 'Region ' || n %% 7, %(admin)s, now(), now() FROM generate_series(1, %(farms)s) n;
+
+INSERT INTO farms_farmer (farm_id, user_id, created_by_id, created_at, updated_at)
+SELECT farm.id, farmer_user.id, %(admin)s, now(), now()
+FROM (SELECT id, row_number() OVER (ORDER BY id) - 1 AS n FROM users_user WHERE is_farmer) farmer_user
+JOIN (SELECT id, row_number() OVER (ORDER BY id) - 1 AS n FROM farms_farm) farm
+  ON farm.n = farmer_user.n %% %(farms)s;
+
+INSERT INTO farms_cow (tag_id, farmer_id, created_by_id, created_at, updated_at)
+SELECT 'COW-' || farmer.id || '-' || n, farmer.id, %(admin)s, now(), now()
+FROM farms_farmer farmer, generate_series(1, %(cows_per_farmer)s) n;
+
+INSERT INTO farms_milkrecord (cow_id, date, liters, recorded_by_id, created_by_id, created_at, updated_at)
+SELECT cow.id, current_date - d, 8 + cow.id %% 9 + d %% 4 * 0.5, %(admin)s, %(admin)s, now(), now()
+FROM farms_cow cow, generate_series(0, %(days)s - 1) d;
+
+INSERT INTO farms_activity (farmer_id, description, actor_id, created_by_id, created_at, updated_at)
+SELECT farmer.id, 'Milking', NULL, %(admin)s, now() - d * interval '1 hour', now()
+FROM farms_farmer farmer, generate_series(1, 2) d;
+
+ANALYZE;
+"""
+
+
+def seq_scans(plan, limited=False):
+    """Yield the relation of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan that reads its whole table.
+
+    A Seq Scan feeding a Limit directly, or through the outer side of nested
+    loops, stops once the page is full and is not reported.
+    """
+    node = plan.get("Node Type")
+    if node == "Seq Scan" and not limited:
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        outer = node == "Nested Loop" and child.get("Parent Relationship") == "Outer"
+        yield from seq_scans(child, node == "Limit" or (limited and outer))
+
+
+def index_conditions(plan, table, relation=None):
+    """Yield the Index Cond of every index scan over ``table`` (or its partitions) in an EXPLAIN (FORMAT JSON) plan."""
+    # A Bitmap Index Scan names only its index; its relation is the heap scan's above it
+    relation = plan.get("Relation Name", relation)
+    if plan.get("Node Type") in ("Index Scan", "Index Only Scan", "Bitmap Index Scan") and relation.startswith(table):
+        yield plan.get("Index Cond", "")
+    for child in plan.get("Plans", []):
+        yield from index_conditions(child, table, relation)
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def large_seq_scans(queryset):
+    """Return ``(table, estimated rows)`` for each large table ``queryset`` scans sequentially."""
+    found = []
+    with connection.cursor() as cursor:
+        for table in sorted(set(seq_scans(explain(queryset)))):
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+            rows = cursor.fetchone()[0]
+            if rows > MIN_ROWS:
+                found.append((table, int(rows)))
+    return found
+
+
+@pytest.fixture(scope="module")
+def admin(django_db_setup, django_db_blocker):
+    """Seed the large tables once for the module, and roll them back after it."""
+    with django_db_blocker.unblock(), transaction.atomic():
+        user = get_user_model().objects.create_superuser(
+            email="admin@example.com", username="admin", first_name="Admin", last_name="User", password="admin"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SEED_SQL,
+                {
+                    "admin": user.pk,
+                    "farms": FARMS,
+                    "farmers": FARMS * FARMERS_PER_FARM,
+                    "cows_per_farmer": COWS_PER_FARMER,
+                    "days": DAYS,
+                },
+            )
+            # Check the seeded rows' foreign keys now, rather than again after every test
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        yield user
+        transaction.set_rollback(True)
+
+
+def filtered_queryset(viewset, user, **kwargs):
+    """Return ``viewset``'s list queryset, filtered as the view filters it."""
+    view = viewset(action="list", kwargs=kwargs, format_kwarg=None)
+    view.request = Request(APIRequestFactory().get("/"), authenticators=[])
+    view.request.user = user
+    return view.filter_queryset(view.get_queryset())
+
+
+def list_queryset(viewset, user, **kwargs):
+    """Return the first page query of ``viewset``'s list, as the view builds it."""
+    return filtered_queryset(viewset, user, **kwargs)[: api_settings.PAGE_SIZE or 100]
+
+
+def cursor_page_queryset(viewset, user, **kwargs):
+    """Return the query of a keyset page of ``viewset``'s list starting halfway through it."""
+    ordering = list(viewset.cursor_ordering)
+    queryset = filtered_queryset(viewset, user, **kwargs).order_by(*ordering)
+    position = queryset.values_list(*[name.lstrip("-") for name in ordering])[queryset.count() // 2]
+    return queryset.filter(ListPagination._after(ordering, list(position)))[: api_settings.PAGE_SIZE or 100]
+
+
+def parent_kwargs(parent):
+    """Return the view kwargs naming the last seeded row of ``parent``'s table."""
+    if not parent:
+        return {}
+    table = {"farm_pk": "farms_farm", "farmer_pk": "farms_farmer", "cow_pk": "farms_cow"}[parent]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT max(id) FROM {table}")
+        return {parent: cursor.fetchone()[0]}
+
+
+def test_seeded_tables_are_large(admin):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relname IN "
+            "('farms_farmer', 'farms_cow', 'farms_milkrecord', 'farms_activity') AND reltuples <= %s",
+            [MIN_ROWS],
+        )
+        assert cursor.fetchall() == []
+
+
+@pytest.mark.parametrize(
+    "viewset, parent",
+    [
+        (FarmViewSet, None),
+        (FarmerViewSet, None),
+        (FarmerViewSet, "farm_pk"),
+        (CowViewSet, None),
+        (CowViewSet, "farmer_pk"),
+        (CowMilkRecordViewSet, "cow_pk"),
+        (MilkRecordViewSet, None),
+        (ActivityViewSet, None),
+        (ActivityViewSet, "farm_pk"),
+        (ActivityViewSet, "farmer_pk"),
+        (AgentViewSet, None),
+    ],
+)
+def test_list_reads_large_tables_through_indexes(admin, viewset, parent):
+    assert large_seq_scans(list_queryset(viewset, admin, **parent_kwargs(parent))) == []
+
+
+@pytest.mark.parametrize(
+    "viewset, parent, table",
+    [
+        (MilkRecordViewSet, None, "farms_milkrecord"),
+        (CowMilkRecordViewSet, "cow_pk", "farms_milkrecord"),
+        (ActivityViewSet, None, "farms_activity"),
+    ],
+)
+def test_cursor_pages_start_their_index_range_at_the_cursor(admin, viewset, parent, table):
+    queryset = cursor_page_queryset(viewset, admin, **parent_kwargs(parent))
+    leading = viewset.cursor_ordering[0].lstrip("-")
+
+    conditions = list(index_conditions(explain(queryset), table))
+    assert conditions
+    assert all(f"{leading} <=" in condition or f"{leading} >=" in condition for condition in conditions)
+    assert large_seq_scans(queryset) == []
@@ -0,0 +1,49 @@
+import threading
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.db import connection, connections, transaction
+
+from farms.models import CowDailyMilk, CowMilkStats, FarmDailyMilk, FarmDailyMilkSketch, FarmerDailyMilk, MilkRecord
+from farms.tests.factories import MilkRecordFactory
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="needs concurrent transactions")
+def test_overlapping_updates_of_a_record_keep_the_rollups_in_step():
+    record = MilkRecordFactory(date=date(2026, 5, 1), liters=Decimal("10.00"))
+    first_saved, release = threading.Event(), threading.Event()
+
+    def update(liters, hold=False):
+        try:
+            with transaction.atomic():
+                instance = MilkRecord.objects.get(pk=record.pk)
+                instance.liters = Decimal(liters)
+                instance.save()
+                if hold:
+                    first_saved.set()
+                    release.wait(10)
+        finally:
+            connections.close_all()
+
+    first = threading.Thread(target=update, args=("20.00", True))
+    first.start()
+    first_saved.wait(10)
+    # The second update starts while the first is uncommitted
+    second = threading.Thread(target=update, args=("30.00",))
+    second.start()
+    second.join(0.5)
+    release.set()
+    first.join(10)
+    second.join(10)
+
+    totals = [
+        CowDailyMilk.objects.get(cow_id=record.cow_id).total_liters,
+        FarmerDailyMilk.objects.get(farmer_id=record.cow.farmer_id).total_liters,
+        FarmDailyMilk.objects.get(farm_id=record.cow.farmer.farm_id).total_liters,
+        CowMilkStats.objects.get(cow_id=record.cow_id).total_liters,
+    ]
+    assert totals == [Decimal("30.00")] * 4
+    buckets = FarmDailyMilkSketch.objects.get(farm_id=record.cow.farmer.farm_id).buckets
+    assert sum(buckets.values()) == 1
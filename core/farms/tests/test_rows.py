@@ -0,0 +1,68 @@
+"""Milk record and activity lists render the same JSON from values_list rows as through their serializers."""
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from farms.models import Activity
+from farms.rows import RowPlan, ValuesListMixin
+from farms.tests.factories import ActivityFactory, CowFactory, FarmerFactory, MilkRecordFactory
+
+pytestmark = pytest.mark.django_db
+
+# Activity times with and without microseconds, on both sides of midnight UTC
+CREATED_AT = [
+    datetime(2026, 3, 1, 23, 45, 12, 345678, tzinfo=timezone.utc),
+    datetime(2026, 3, 2, 0, 15, tzinfo=timezone.utc),
+    datetime(2026, 3, 2, 6, 30, 0, 1, tzinfo=timezone.utc),
+]
+
+
+@pytest.fixture
+def cow():
+    farmer = FarmerFactory()
+    cow = CowFactory(farmer=farmer)
+    for liters in (Decimal("12.5"), Decimal("0"), Decimal("7.25")):
+        MilkRecordFactory(cow=cow, liters=liters)
+    for created_at, actor in zip(CREATED_AT, (farmer.user, None, farmer.user)):
+        activity = ActivityFactory(farmer=farmer, actor=actor)
+        Activity.objects.filter(pk=activity.pk).update(created_at=created_at, updated_at=created_at)
+    return cow
+
+
+def render_both(api_client, monkeypatch, url):
+    """Return the response of ``url`` rendered from values_list rows, then through the serializer."""
+    plans = []
+    get_row_plan = ValuesListMixin.get_row_plan
+    monkeypatch.setattr(ValuesListMixin, "get_row_plan", lambda view: plans.append(get_row_plan(view)) or plans[-1])
+    fast = api_client.get(url)
+    monkeypatch.setattr(ValuesListMixin, "get_row_plan", lambda view: None)
+    slow = api_client.get(url)
+
+    assert isinstance(plans[0], RowPlan), "the values_list path did not serve the page"
+    assert fast.status_code == slow.status_code == 200
+    return fast, slow
+
+
+@pytest.mark.parametrize("time_zone", ["UTC", "Asia/Dhaka", "America/St_Johns"])
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/api/cows/{cow}/milk/",
+        "/api/cows/{cow}/milk/?fields=id,date,liters,cow",
+        "/api/cows/{cow}/milk/?fields=id,liters,cow.tag_id,cow.farmer.user&expand=recorded_by",
+        "/api/cows/{cow}/milk/?pagination=cursor",
+        "/api/activities/",
+        "/api/activities/?fields=id,actor,created_at",
+        "/api/activities/?fields=id,farmer.cows_count,farmer.user.email&expand=created_by",
+        "/api/activities/?pagination=cursor&page_size=2",
+        "/api/farms/{farm}/activities/",
+    ],
+)
+def test_values_list_rendering_matches_serializers(api_client, monkeypatch, settings, cow, time_zone, url):
+    settings.TIME_ZONE = time_zone
+    url = url.format(cow=cow.pk, farm=cow.farmer.farm_id)
+
+    fast, slow = render_both(api_client, monkeypatch, url)
+
+    assert fast.content == slow.content
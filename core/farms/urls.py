@@ -1,6 +1,7 @@
 from django.urls import include, path
 
 from .views import (
+    MilkRecordBulkView,
     activities_router,
     cows_router,
     farms_router,
@@ -12,6 +13,7 @@ from .views import (
 )
 
 urlpatterns = [
+    path("milk/bulk", MilkRecordBulkView.as_view(), name="milk-bulk"),
     path("", include(router.urls)),
     path("", include(farms_router.urls)),
     path("", include(cows_router.urls)),
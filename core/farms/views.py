@@ -1,24 +1,31 @@
-from django.db.models import Avg, Sum
+from django.db.models import Q, Sum
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
 from django.db import IntegrityError
 from rest_framework.exceptions import ValidationError
 from .models import Agent
 
-from .models import Activity, Cow, Farm, Farmer, MilkRecord
+from .bulk import upsert_milk_records
+from .fieldsets import SparseFieldsViewMixin
+from .models import Activity, Cow, CowMilkStats, Farm, Farmer, MilkRecord
+from .parents import NestedParentsMixin
 from .permissions import (
     ActivityPermission,
+    BulkMilkRecordPermission,
     CowPermission,
     FarmPermission,
     FarmerPermission,
     MilkRecordPermission,
     IsAdminUser,
 )
+from .rows import ValuesListMixin
 from .serializers import (
     ActivitySerializer,
+    BulkMilkRecordSerializer,
     CowSerializer,
     FarmSerializer,
     FarmerSerializer,
@@ -27,7 +34,7 @@ from .serializers import (
 )
 from . import serializers
 
-class AgentViewSet(viewsets.ModelViewSet):
+class AgentViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Agent.objects.all()
     serializer_class = AgentSerializer
     permission_classes = [IsAdminUser]
@@ -48,52 +55,72 @@ class AgentViewSet(viewsets.ModelViewSet):
             serializer.save(created_by=self.request.user)
 
 
-class CowMilkRecordViewSet(viewsets.ModelViewSet):
+# Keyset order of ?pagination=cursor pages: the default ordering, with id
+# breaking ties in the same direction so one index range serves each page
+MILK_CURSOR_ORDERING = ("-date", "-created_at", "-id")
+
+
+def milk_stats_summary(stats):
+    """Return the summary fields of a cow's CowMilkStats, or zeros when it has no records."""
+    if stats is None:
+        return {
+            "total_liters": 0.0,
+            "total_average": 0.0,
+            "record_count": 0,
+            "min_liters": None,
+            "max_liters": None,
+            "last_date": None,
+            "last_30_days_liters": 0.0,
+        }
+    return {
+        "total_liters": float(stats.total_liters),
+        "total_average": float(stats.total_liters / stats.record_count),
+        "record_count": stats.record_count,
+        "min_liters": float(stats.min_liters),
+        "max_liters": float(stats.max_liters),
+        "last_date": stats.last_date,
+        "last_30_days_liters": float(stats.recent_liters),
+    }
+
+
+class CowMilkRecordViewSet(NestedParentsMixin, ValuesListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = MilkRecord.objects.all()
     serializer_class = MilkRecordSerializer
     permission_classes = [MilkRecordPermission]
+    cursor_ordering = MILK_CURSOR_ORDERING
 
     def get_queryset(self):
-        return MilkRecord.objects.filter(cow_id=self.kwargs.get('cow_pk')).select_related('recorded_by', 'created_by')
+        return super().get_queryset().filter(cow_id=self.kwargs.get('cow_pk'))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context['cow'] = Cow.objects.get(pk=self.kwargs.get('cow_pk'))
+        context['cow'] = self.get_parents().cow
         return context
 
     def perform_create(self, serializer):
-        cow = Cow.objects.get(pk=self.kwargs.get('cow_pk'))
         serializer.save(
-            cow=cow,
+            cow=self.get_parents().cow,
             recorded_by=self.request.user,
             created_by=self.request.user
         )
 
     @action(detail=False, methods=["get"], url_path="summary")
     def summary(self, request, cow_pk=None, **kwargs):  # Add **kwargs parameter here
-            qs = self.get_queryset()
-            total_liters = qs.aggregate(total=Sum("liters")).get("total") or 0
-            total_average = qs.aggregate(average=Avg("liters")).get("average") or 0
+            stats = CowMilkStats.objects.filter(pk=cow_pk).first()
 
             # Get cow and farmer details
-            cow_name = "Unknown"
-            farmer_name = "Unknown"
-            
-            try:
-                cow = Cow.objects.select_related('farmer', 'farmer__user').get(pk=cow_pk)
-                cow_name = cow.tag_id
-                farmer_name = cow.farmer.user.username if cow.farmer else "Unknown"
-            except Cow.DoesNotExist:
-                pass
+            cow = self.get_parents().cow
+            cow_name = cow.tag_id
+            farmer_name = cow.farmer.user.username if cow.farmer else "Unknown"
 
             return Response({
-                "total_liters": float(total_liters),
-                "total_average": float(total_average),
+                **milk_stats_summary(stats),
                 "cow": cow_name,
                 "farmer": farmer_name
             })
 
 
-class FarmViewSet(viewsets.ModelViewSet):
+class FarmViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Farm.objects.all()
     serializer_class = FarmSerializer
     permission_classes = [FarmPermission]
@@ -104,8 +131,8 @@ class FarmViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
-class FarmerViewSet(viewsets.ModelViewSet):
-    queryset = Farmer.objects.select_related("user", "farm").prefetch_related("cows")
+class FarmerViewSet(NestedParentsMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Farmer.objects.all()
     serializer_class = FarmerSerializer
     permission_classes = [FarmerPermission]
     search_fields = ["user__username", "user__first_name", "user__last_name"]
@@ -126,8 +153,8 @@ class FarmerViewSet(viewsets.ModelViewSet):
     
 
 
-class CowViewSet(viewsets.ModelViewSet):
-    queryset = Cow.objects.select_related("farmer", "farmer__farm")
+class CowViewSet(NestedParentsMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Cow.objects.all()
     serializer_class = CowSerializer
     permission_classes = [CowPermission]
     search_fields = ["tag_id", "farmer__farm__name"]
@@ -153,10 +180,11 @@ class CowViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
-class MilkRecordViewSet(viewsets.ModelViewSet):
-    queryset = MilkRecord.objects.select_related("cow", "recorded_by", "cow__farmer", "cow__farmer__farm")
+class MilkRecordViewSet(ValuesListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = MilkRecord.objects.all()
     serializer_class = MilkRecordSerializer
     permission_classes = [MilkRecordPermission]
+    cursor_ordering = MILK_CURSOR_ORDERING
     filterset_fields = ["cow", "cow__farmer", "cow__farmer__farm", "date"]
     search_fields = ["cow__tag_id"]
 
@@ -176,21 +204,24 @@ class MilkRecordViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="summary")
     def summary(self, request, cow_pk=None, **kwargs):  # Add **kwargs here
-        qs = self.get_queryset()
-        total_liters = qs.aggregate(total=Sum("liters")).get("total") or 0
-        total_average = qs.aggregate(average=Avg("liters")).get("average") or 0
+        if cow_pk:
+            summary = milk_stats_summary(CowMilkStats.objects.filter(pk=cow_pk).first())
+        else:
+            totals = CowMilkStats.objects.aggregate(count=Sum("record_count"), total=Sum("total_liters"))
+            count, total = totals["count"] or 0, totals["total"] or 0
+            summary = {"total_liters": float(total), "total_average": float(total / count) if count else 0.0}
         return Response({
-            "total_liters": float(total_liters),
-            "total_average": float(total_average),
+            **summary,
             "cow_id": cow_pk,
             "farmer_id": kwargs.get('farmer_pk')
         })
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
-    queryset = Activity.objects.select_related("farmer", "actor", "farmer__farm")
+class ActivityViewSet(NestedParentsMixin, ValuesListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
     permission_classes = [ActivityPermission]
+    cursor_ordering = ("-created_at", "-id")
     filterset_fields = ["farmer__farm"]
     search_fields = ["description", "actor__username"]
 
@@ -209,6 +240,81 @@ class ActivityViewSet(viewsets.ModelViewSet):
             serializer.save(actor=self.request.user, created_by=self.request.user)
 
 
+class MilkRecordBulkView(APIView):
+    """Create or update many milk records at once.
+
+    Takes a list of ``{"cow_id" or "tag_id", "date", "liters"}`` entries; a
+    record that exists for the cow and date is updated. Entries are checked
+    one by one and the response lists the outcome of each, in order.
+    """
+
+    permission_classes = [BulkMilkRecordPermission]
+    max_entries = 5000
+
+    def post(self, request, *args, **kwargs):
+        entries = request.data
+        if not isinstance(entries, list):
+            raise ValidationError("Expected a list of milk records.")
+        if len(entries) > self.max_entries:
+            raise ValidationError(f"At most {self.max_entries} milk records can be sent at once.")
+
+        results = [None] * len(entries)
+        valid = []
+        for index, entry in enumerate(entries):
+            serializer = BulkMilkRecordSerializer(data=entry)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"index": index, "status": "error", "errors": serializer.errors}
+
+        # Look every cow up once and check the user may record for it
+        cow_ids = {attrs["cow_id"] for _, attrs in valid if "cow_id" in attrs}
+        tag_ids = {attrs["tag_id"] for _, attrs in valid if "tag_id" in attrs}
+        by_id, by_tag = {}, {}
+        cows = Cow.objects.filter(Q(pk__in=cow_ids) | Q(tag_id__in=tag_ids)).values_list("pk", "tag_id", "farmer__user_id")
+        permission = BulkMilkRecordPermission()
+        for cow_id, tag_id, farmer_user_id in cows:
+            allowed = permission.has_cow_permission(request, farmer_user_id)
+            by_id[cow_id] = by_tag[tag_id] = (cow_id, allowed)
+
+        # The last entry for a cow and date wins
+        entry_by_key = {}
+        for index, attrs in valid:
+            cow = by_id.get(attrs["cow_id"]) if "cow_id" in attrs else by_tag.get(attrs["tag_id"])
+            if cow is None:
+                results[index] = {"index": index, "status": "error", "errors": {"cow": ["Cow not found."]}}
+                continue
+            cow_id, allowed = cow
+            if not allowed:
+                results[index] = {
+                    "index": index,
+                    "status": "error",
+                    "errors": {"cow": ["You can only add milk records for your own cows."]},
+                }
+                continue
+            key = (cow_id, attrs["date"])
+            if key in entry_by_key:
+                earlier = entry_by_key[key][0]
+                results[earlier] = {
+                    "index": earlier,
+                    "status": "error",
+                    "errors": {"non_field_errors": [f"Superseded by entry {index} for the same cow and date."]},
+                }
+            entry_by_key[key] = (index, attrs["liters"])
+
+        written = upsert_milk_records({key: liters for key, (_, liters) in entry_by_key.items()}, request.user)
+        for key, (index, _) in entry_by_key.items():
+            record_id, created = written[key]
+            results[index] = {"index": index, "status": "created" if created else "updated", "id": record_id}
+
+        return Response({
+            "created": sum(result["status"] == "created" for result in results),
+            "updated": sum(result["status"] == "updated" for result in results),
+            "errors": sum(result["status"] == "error" for result in results),
+            "results": results,
+        })
+
+
 # Router setup
 router = DefaultRouter()
 router.register(r"farms", FarmViewSet, basename="farms") # -->farms
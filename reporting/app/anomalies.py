@@ -0,0 +1,152 @@
+"""Vectorised detection of sharp drops in per-cow milk yield.
+
+Every cow's daily yield over the analysed period is laid out as one row of a
+``cows x days`` matrix (NaN where nothing was recorded), so the statistics for
+all cows are computed with a handful of array operations.
+
+Run as a batch job with ``python -m app.anomalies`` from the reporting
+directory; it prints the flagged cows per farm as JSON.
+"""
+from dataclasses import dataclass
+from itertools import chain
+
+import numpy as np
+
+
+@dataclass
+class YieldDrops:
+    cow_ids: np.ndarray
+    farm_ids: np.ndarray
+    baseline: np.ndarray
+    recent: np.ndarray
+    z_scores: np.ndarray
+    drop_pct: np.ndarray
+
+
+def build_matrix(cow_ids, farm_ids, day_offsets, liters, days):
+    """Scatter each cow's ``(day, liters)`` series into a ``cows x days`` matrix.
+
+    ``cow_ids`` and ``farm_ids`` hold one entry per distinct cow;
+    ``day_offsets`` and ``liters`` one sequence per cow. Returns the cow ids
+    in ascending order, the farm of each, and the matrix.
+    """
+    cow_ids = np.asarray(cow_ids, dtype=np.int64)
+    order = np.argsort(cow_ids, kind="stable")
+    lengths = np.fromiter(map(len, day_offsets), dtype=np.int64, count=len(cow_ids))
+    total = int(lengths.sum())
+    rows = np.empty(len(cow_ids), dtype=np.int64)
+    rows[order] = np.arange(len(cow_ids))
+
+    matrix = np.full((len(cow_ids), days), np.nan)
+    matrix[
+        np.repeat(rows, lengths),
+        np.fromiter(chain.from_iterable(day_offsets), dtype=np.int64, count=total),
+    ] = np.fromiter(chain.from_iterable(liters), dtype=np.float64, count=total)
+    return cow_ids[order], np.asarray(farm_ids, dtype=np.int64)[order], matrix
+
+
+def _nan_stats(block):
+    observed = ~np.isnan(block)
+    counts = observed.sum(axis=1)
+    values = np.where(observed, block, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = values.sum(axis=1) / counts
+        variance = (values ** 2).sum(axis=1) / counts - mean ** 2
+    return mean, np.sqrt(np.clip(variance, 0.0, None)), counts
+
+
+def detect_yield_drops(
+    cow_ids,
+    farm_ids,
+    matrix,
+    window: int = 14,
+    recent: int = 3,
+    z_threshold: float = 2.5,
+    drop_threshold: float = 30.0,
+    min_observations: int = 7,
+) -> YieldDrops:
+    """Flag cows whose recent yield fell well below their own baseline.
+
+    The last ``recent`` days are compared with the ``window`` days before
+    them. A cow is flagged when its recent mean is at least ``z_threshold``
+    standard deviations below the baseline mean, or ``drop_threshold`` percent
+    below it. Cows with fewer than ``min_observations`` baseline days, or no
+    recent records, are never flagged.
+    """
+    baseline_block = matrix[:, -(window + recent):-recent]
+    recent_block = matrix[:, -recent:]
+
+    baseline, spread, baseline_counts = _nan_stats(baseline_block)
+    current, _, recent_counts = _nan_stats(recent_block)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z_scores = np.where(spread > 0, (current - baseline) / spread, 0.0)
+        drop_pct = np.where(baseline > 0, (baseline - current) / baseline * 100.0, 0.0)
+
+    flagged = (
+        (baseline_counts >= min_observations)
+        & (recent_counts > 0)
+        & ((z_scores <= -z_threshold) | (drop_pct >= drop_threshold))
+    )
+    return YieldDrops(
+        cow_ids=np.asarray(cow_ids)[flagged],
+        farm_ids=np.asarray(farm_ids)[flagged],
+        baseline=baseline[flagged],
+        recent=current[flagged],
+        z_scores=z_scores[flagged],
+        drop_pct=drop_pct[flagged],
+    )
+
+
+def group_by_farm(drops: YieldDrops, tags=None):
+    """Shape flagged cows as ``[{farm_id, cows: [...]}]``, largest drops first."""
+    order = np.lexsort((-drops.drop_pct, drops.farm_ids))
+    farms = []
+    for index in order:
+        farm_id = int(drops.farm_ids[index])
+        if not farms or farms[-1]["farm_id"] != farm_id:
+            farms.append({"farm_id": farm_id, "cows": []})
+        cow_id = int(drops.cow_ids[index])
+        farms[-1]["cows"].append({
+            "cow_id": cow_id,
+            "tag_id": (tags or {}).get(cow_id, ""),
+            "baseline_liters": round(float(drops.baseline[index]), 2),
+            "recent_liters": round(float(drops.recent[index]), 2),
+            "z_score": round(float(drops.z_scores[index]), 2),
+            "drop_pct": round(float(drops.drop_pct[index]), 1),
+        })
+    return farms
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    from datetime import date
+
+    from app.main import engine, find_yield_drops
+
+    parser = argparse.ArgumentParser(description="Flag cows with sharp drops in milk yield")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--window", type=int, default=14)
+    parser.add_argument("--recent", type=int, default=3)
+    parser.add_argument("--z-threshold", type=float, default=2.5)
+    parser.add_argument("--drop-threshold", type=float, default=30.0)
+    parser.add_argument("--farm-id", type=int)
+    args = parser.parse_args()
+
+    async def main():
+        async with engine.connect() as connection:
+            farms = await find_yield_drops(
+                connection,
+                end_date=args.end_date,
+                window=args.window,
+                recent=args.recent,
+                z_threshold=args.z_threshold,
+                drop_threshold=args.drop_threshold,
+                farm_id=args.farm_id,
+            )
+        await engine.dispose()
+        print(json.dumps(farms, indent=2))
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+
+@dataclass
+class CachedResponse:
+    version: str
+    etag: str
+    body: bytes
+
+
+class ResponseCache:
+    """LRU cache of serialized report bodies, bounded by their total size.
+
+    Entries are stored against the data version they were computed from. A
+    lookup with any other version is a miss, so stale bodies are never served
+    and are evicted by newer entries or by the size bound.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def etag(key: str, version: str) -> str:
+        # The body is a function of the request and the data version, so the
+        # tag can be derived (and compared) before anything is computed.
+        digest = hashlib.sha1(f"{key}|{version}".encode()).hexdigest()
+        return f'"{digest}"'
+
+    def get(self, key: str, version: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, version: str, body: bytes) -> CachedResponse:
+        entry = CachedResponse(version=version, etag=self.etag(key, version), body=body)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def discard_table(self, table: str):
+        """Drop every entry computed from ``table``, now out of date."""
+        with self._lock:
+            for key in [
+                key for key, entry in self._entries.items()
+                if any(part.split(":", 1)[0] == table for part in entry.version.split(","))
+            ]:
+                self.size -= len(self._entries.pop(key).body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
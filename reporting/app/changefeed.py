@@ -0,0 +1,169 @@
+"""Subscription to the change feed published by the core service.
+
+The core service appends a row to ``farms_changeevent`` in the transaction
+of every write to a versioned table; as it commits, the event is counted in
+``farms_tablechangecount`` and published with a NOTIFY carrying the count. A
+table's version is the id of its newest event, the number of its events
+among the last ``VERSION_WINDOW`` ids, and that committed count: event ids
+are drawn before commit, so a write can become visible after one with a
+higher id, and the count changes when it does however low its id is.
+ChangeFeed LISTENs on the channel and keeps the recent ids and the counts in
+memory, so cache lookups need no query while the subscription is live. After
+a reconnect it reloads them and reports every table whose count moved in the
+meantime, so no change is missed. Every replica runs its own subscription
+and sees the same versions.
+"""
+import asyncio
+import bisect
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHANGE_CHANNEL = "farmhub_changes"
+
+# Must match VERSION_WINDOW in the core service's farms.changes
+VERSION_WINDOW = 1000
+
+# Ids of each table's events among the last VERSION_WINDOW ids of its newest
+RECENT_EVENTS_SQL = """
+SELECT e.table_name, e.id
+FROM unnest($1::text[]) AS t(table_name)
+CROSS JOIN LATERAL (SELECT max(id) AS newest FROM farms_changeevent WHERE table_name = t.table_name) AS m
+JOIN farms_changeevent e ON e.table_name = t.table_name AND e.id > m.newest - $2
+"""
+
+EVENT_COUNTS_SQL = "SELECT table_name, events FROM farms_tablechangecount WHERE table_name = ANY($1::text[])"
+
+
+def table_version(newest: Optional[int], recent: int, count: int) -> str:
+    return f"{newest}.{recent}.{count}" if newest else "0"
+
+
+def combined_version(versions: Dict[str, str], tables: Iterable[str]) -> str:
+    return ",".join(f"{table}:{versions.get(table, '0')}" for table in sorted(tables))
+
+
+class ChangeFeed:
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable],
+        tables: Iterable[str],
+        heartbeat: float = 5.0,
+        on_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.connect = connect
+        self.tables = sorted(tables)
+        self.heartbeat = heartbeat
+        self.on_change = on_change
+        # Ascending ids of each table's events within VERSION_WINDOW of its newest
+        self.recent: Dict[str, List[int]] = {}
+        # Committed events of each table, as last counted by the core service
+        self.counts: Dict[str, int] = {}
+        self.last_event_id: Optional[int] = None
+        self.live = False
+        self.events = 0
+        self.reconnects = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def version(self, tables) -> Optional[str]:
+        """Return the combined version of ``tables``, or ``None`` when not live."""
+        if not self.live:
+            return None
+        versions = {
+            table: table_version(ids[-1], len(ids), self.counts.get(table, 0))
+            for table, ids in self.recent.items()
+            if ids
+        }
+        return combined_version(versions, tables)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                connection = await self.connect()
+                try:
+                    await self._subscribe(connection)
+                    delay = 1
+                    # A dropped connection only shows up when it is used
+                    while True:
+                        await asyncio.sleep(self.heartbeat)
+                        await connection.fetchval("SELECT 1")
+                finally:
+                    self.live = False
+                    connection.terminate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change feed disconnected (%s); retrying in %ss", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+            self.reconnects += 1
+
+    async def _subscribe(self, connection):
+        # Listen before reading the current state, so anything committed
+        # after the snapshot arrives as a notification.
+        reconnected = self.last_event_id is not None
+        await connection.add_listener(CHANGE_CHANNEL, self._notified)
+        rows = await connection.fetch(RECENT_EVENTS_SQL, self.tables, VERSION_WINDOW)
+        counts = await connection.fetch(EVENT_COUNTS_SQL, self.tables)
+        last_event_id = await connection.fetchval("SELECT max(id) FROM farms_changeevent")
+
+        for row in rows:
+            self._add(row["table_name"], row["id"])
+        # Counts only grow, so any that moved mean changes missed while away
+        for row in counts:
+            if self._count(row["table_name"], row["events"]) and reconnected:
+                self._changed(row["table_name"])
+        self.last_event_id = max(self.last_event_id or 0, last_event_id or 0)
+        self.live = True
+
+    def _notified(self, connection, pid, channel, payload):
+        event = json.loads(payload)
+        table = event["table"]
+        self._add(table, event["id"])
+        self._count(table, event["count"])
+        self.last_event_id = max(self.last_event_id or 0, event["id"])
+        self.events += 1
+        self._changed(table)
+
+    def _add(self, table, event_id):
+        ids = self.recent.setdefault(table, [])
+        position = bisect.bisect_left(ids, event_id)
+        if position < len(ids) and ids[position] == event_id:
+            return
+        ids.insert(position, event_id)
+        # Drop ids that fell out of the window below the newest
+        del ids[: bisect.bisect_right(ids, ids[-1] - VERSION_WINDOW)]
+
+    def _count(self, table, count) -> bool:
+        """Record ``count`` committed events of ``table``; return whether that is more than known."""
+        if count <= self.counts.get(table, 0):
+            return False
+        self.counts[table] = count
+        return True
+
+    def _changed(self, table):
+        if self.on_change is not None:
+            self.on_change(table)
+
+    def stats(self) -> dict:
+        return {
+            "live": self.live,
+            "events": self.events,
+            "reconnects": self.reconnects,
+            "last_event_id": self.last_event_id,
+        }
@@ -1,13 +1,33 @@
 
-from fastapi import FastAPI, HTTPException, Depends, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlalchemy import create_engine, text, func, Column, Integer, String, Float, ForeignKey, Date, DateTime
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from openpyxl import Workbook
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import case, cast, literal, literal_column, text, func, select, tuple_, Column, Integer, String, Float, ForeignKey, Date, DateTime, JSON, LargeBinary, ARRAY, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from typing import List, Optional
-from datetime import date, datetime, timedelta
+from sqlalchemy.orm import relationship
+from typing import Any, Dict, List, Literal, Optional, Union
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import asyncpg
+import base64
+import csv
+import httpx
+import io
+import orjson
 import os
+import re
+import tempfile
+
+from . import anomalies
+from .cache import ResponseCache
+from .changefeed import VERSION_WINDOW, ChangeFeed, combined_version, table_version
+from .singleflight import SingleFlight
+from .sketches import MergedSketch
 
 # Database Configuration
 POSTGRES_USER = os.environ.get("POSTGRES_USER", "postgres")
@@ -16,27 +36,86 @@ POSTGRES_HOST = os.environ.get("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.environ.get("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.environ.get("POSTGRES_DB", "farmhub_db")
 
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+# Connection pool configuration
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+DB_CONNECT_TIMEOUT = float(os.environ.get("DB_CONNECT_TIMEOUT", "10"))  # seconds to open a new connection
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 disables the limit
+
+# Read milk totals from the daily rollup tables maintained by the core service
+USE_ROLLUPS = os.environ.get("REPORTING_USE_ROLLUPS", "1") == "1"
+
+# Upper bound on the memory held by cached report bodies; 0 disables caching
+CACHE_MAX_BYTES = int(os.environ.get("REPORTING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Follow the core service's change notifications instead of querying table
+# versions for every cached report; heartbeat is in seconds
+USE_CHANGE_FEED = os.environ.get("REPORTING_CHANGE_FEED", "1") == "1"
+CHANGE_FEED_HEARTBEAT = float(os.environ.get("REPORTING_CHANGE_FEED_HEARTBEAT", "5"))
+
+# POST /batch: items per batch, items run at once, and per-item timeout (seconds)
+BATCH_MAX_ITEMS = int(os.environ.get("REPORTING_BATCH_MAX_ITEMS", "20"))
+BATCH_CONCURRENCY = int(os.environ.get("REPORTING_BATCH_CONCURRENCY", str(DB_POOL_SIZE)))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("REPORTING_BATCH_ITEM_TIMEOUT", "10"))
 
 # Print for debugging
 print(f"Connecting to database: {DATABASE_URL}")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={
+        "timeout": DB_CONNECT_TIMEOUT,
+        "server_settings": {
+            "application_name": "farmhub-reporting",
+            "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+        },
+    },
+)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 db_dependency = Depends(get_db)
 
 # FastAPI App
-app = FastAPI(title="FarmHub Reporting API")
+@asynccontextmanager
+async def lifespan(app):
+    if USE_CHANGE_FEED:
+        change_feed.start()
+    yield
+    await change_feed.stop()
+
+
+# Responses
+#
+# Report rows are selected as plain tuples and shaped into dicts that already
+# match the response models, so endpoints return ReportResponse directly:
+# FastAPI then skips validating every row against the response_model, which
+# is kept for the OpenAPI schema only.
+def dump_json(content) -> bytes:
+    """Serialize a response body; UTC datetimes end in Z as pydantic writes them."""
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class ReportResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+app = FastAPI(title="FarmHub Reporting API", lifespan=lifespan, default_response_class=ReportResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -49,11 +128,11 @@ app.add_middleware(
 
 # Health Check Endpoint
 @app.get("/health")
-def health_check():
+async def health_check():
     try:
         # Test database connection
-        with engine.connect() as connection:
-            result = connection.execute(text("SELECT 1")).fetchone()
+        async with engine.connect() as connection:
+            result = (await connection.execute(text("SELECT 1"))).fetchone()
             if result and result[0] == 1:
                 return {"status": "healthy", "database": "connected"}
     except Exception as e:
@@ -62,6 +141,15 @@ def health_check():
     return {"status": "unhealthy"}
 
 # Models
+class User(Base):
+    __tablename__ = "users_user"
+
+    id = Column(Integer, primary_key=True)
+    email = Column(String)
+    username = Column(String)
+    first_name = Column(String)
+    last_name = Column(String)
+
 class Farm(Base):
     __tablename__ = "farms_farm"
     
@@ -106,6 +194,44 @@ class MilkRecord(Base):
     
     cow = relationship("Cow", back_populates="milk_records")
 
+class CowDailyMilk(Base):
+    __tablename__ = "farms_cowdailymilk"
+
+    id = Column(Integer, primary_key=True)
+    cow_id = Column(Integer, ForeignKey("farms_cow.id"))
+    date = Column(Date)
+    total_liters = Column(Float)
+    record_count = Column(Integer)
+
+class FarmerDailyMilk(Base):
+    __tablename__ = "farms_farmerdailymilk"
+
+    id = Column(Integer, primary_key=True)
+    farmer_id = Column(Integer, ForeignKey("farms_farmer.id"))
+    date = Column(Date)
+    total_liters = Column(Float)
+    record_count = Column(Integer)
+
+class FarmDailyMilk(Base):
+    __tablename__ = "farms_farmdailymilk"
+
+    id = Column(Integer, primary_key=True)
+    farm_id = Column(Integer, ForeignKey("farms_farm.id"))
+    date = Column(Date)
+    total_liters = Column(Float)
+    record_count = Column(Integer)
+
+class FarmDailyMilkSketch(Base):
+    __tablename__ = "farms_farmdailymilksketch"
+
+    id = Column(Integer, primary_key=True)
+    farm_id = Column(Integer, ForeignKey("farms_farm.id"))
+    date = Column(Date)
+    cow_days = Column(Integer)
+    zero_count = Column(Integer)
+    buckets = Column(JSON)
+    cow_registers = Column(LargeBinary)
+
 class Activity(Base):
     __tablename__ = "farms_activity"
     
@@ -117,15 +243,31 @@ class Activity(Base):
     farmer = relationship("Farmer")
 
 
+class ChangeEvent(Base):
+    __tablename__ = "farms_changeevent"
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String)
+    action = Column(String)
+    object_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime)
+
+
+class TableChangeCount(Base):
+    __tablename__ = "farms_tablechangecount"
+
+    table_name = Column(String, primary_key=True)
+    events = Column(BigInteger)
+
+
 class FarmSummary(BaseModel):
     id: int
     name: str
     farmers_count: int
     cows_count: int
     total_milk: float
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 class FarmerSummary(BaseModel):
     id: int
@@ -133,9 +275,8 @@ class FarmerSummary(BaseModel):
     farm_name: str
     cows_count: int
     total_milk: float
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 class MilkProductionSummary(BaseModel):
     total_farms: int
@@ -149,168 +290,422 @@ class MilkByDateSummary(BaseModel):
     total_liters: float
     cow_count: int
 
+class MilkTimeseriesPoint(BaseModel):
+    period: date
+    total_liters: float
+    record_count: int
+    rolling_average: Optional[float] = None
+
+class HistogramBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+class YieldDistribution(BaseModel):
+    cow_days: int
+    distinct_cows: int
+    p50_liters: Optional[float] = None
+    p90_liters: Optional[float] = None
+    p99_liters: Optional[float] = None
+    histogram: List[HistogramBin]
+
+class FarmYieldDistribution(YieldDistribution):
+    farm_id: int
+
+class MilkDistribution(YieldDistribution):
+    start_date: date
+    end_date: date
+    farms: Optional[List[FarmYieldDistribution]] = None
+
+class FlaggedCow(BaseModel):
+    cow_id: int
+    tag_id: str
+    baseline_liters: float
+    recent_liters: float
+    z_score: float
+    drop_pct: float
+
+class FarmYieldAnomalies(BaseModel):
+    farm_id: int
+    cows: List[FlaggedCow]
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    id: int
+    name: str
+    total_liters: float
+    previous_total_liters: float
+    previous_rank: Optional[int] = None
+    delta_liters: float
+    delta_pct: Optional[float] = None
+
 class ActivitySummary(BaseModel):
     id: int
     farmer_name: str
     description: str
     created_at: datetime
-    
-    class Config:
-        orm_mode = True
 
+    model_config = ConfigDict(from_attributes=True)
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str
+    params: Dict[str, Union[str, int, float, bool]] = {}
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    timeout: float = Field(BATCH_ITEM_TIMEOUT, gt=0, le=60)
+
+class BatchResult(BaseModel):
+    id: Optional[str] = None
+    path: str
+    status: int
+    body: Any = None
+    error: Optional[str] = None
+    headers: Dict[str, str] = {}
+
+
+
+# Versioned response cache
+#
+# The core service appends to the farms_changeevent outbox in the same
+# transaction as every write, and a table's version is read from its newest
+# events there. A cached report is reused for as long as the versions of the
+# tables it reads are unchanged, so a repeated poll costs one indexed lookup
+# per table instead of the aggregation, and nothing at all while the change
+# feed is live.
+response_cache = ResponseCache(CACHE_MAX_BYTES)
+# Identical reports requested at the same time share one computation
+report_flights = SingleFlight()
+
+
+async def _connect_change_feed():
+    return await asyncpg.connect(
+        host=POSTGRES_HOST,
+        port=int(POSTGRES_PORT),
+        user=POSTGRES_USER,
+        password=POSTGRES_PASSWORD,
+        database=POSTGRES_DB,
+        timeout=DB_CONNECT_TIMEOUT,
+        server_settings={"application_name": "farmhub-reporting-changefeed"},
+    )
+
+
+MILK_REPORT_TABLES = ("farms_farm", "farms_farmer", "farms_cow", "farms_milkrecord")
+# Reports that also show the farmers' user emails
+FARMER_REPORT_TABLES = (*MILK_REPORT_TABLES, "users_user")
+# Every table whose version a report depends on
+VERSIONED_TABLES = FARMER_REPORT_TABLES
+
+# Evicts cached reports as soon as a table they read changes
+change_feed = ChangeFeed(
+    _connect_change_feed,
+    VERSIONED_TABLES,
+    heartbeat=CHANGE_FEED_HEARTBEAT,
+    on_change=response_cache.discard_table,
+)
+
+TABLE_VERSIONS = text(
+    """
+    SELECT t.table_name, m.newest, count(e.id) AS recent, coalesce(c.events, 0) AS count
+    FROM unnest(CAST(:tables AS text[])) AS t(table_name)
+    CROSS JOIN LATERAL (SELECT max(id) AS newest FROM farms_changeevent WHERE table_name = t.table_name) AS m
+    LEFT JOIN farms_changeevent e ON e.table_name = t.table_name AND e.id > m.newest - :window
+    LEFT JOIN farms_tablechangecount c ON c.table_name = t.table_name
+    GROUP BY t.table_name, m.newest, c.events
+    """
+)
+
+
+async def data_version(db: AsyncSession, tables) -> str:
+    version = change_feed.version(tables)
+    if version is not None:
+        return version
+    rows = (await db.execute(TABLE_VERSIONS, {"tables": list(tables), "window": VERSION_WINDOW})).all()
+    return combined_version(
+        {table: table_version(newest, recent, count) for table, newest, recent, count in rows}, tables
+    )
+
+
+def _cache_key(request: Request) -> str:
+    return f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}"
+
+
+async def cached_report(request: Request, db: AsyncSession, tables, compute, vary: str = ""):
+    """Serve a report from the cache, computing it with ``compute`` on a miss.
+
+    Responses carry an ETag; a matching If-None-Match gets a bodiless 304.
+    Concurrent misses for the same report and version run ``compute`` once.
+    ``compute`` must return the body already shaped like the endpoint's
+    response model; it is serialized as is, without validation. ``vary``
+    holds anything else the body depends on that the URL does not show,
+    such as a date defaulted to today; it is part of the cache key and so
+    of the ETag.
+    """
+    key = _cache_key(request)
+    if vary:
+        key = f"{key}#{vary}"
+    if not CACHE_MAX_BYTES:
+        return ReportResponse(await report_flights.do(key, compute))
+
+    version = await data_version(db, tables)
+    etag = response_cache.etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    async def compute_entry():
+        body = dump_json(await compute())
+        return response_cache.put(key, version, body)
+
+    entry = response_cache.get(key, version)
+    if entry is None:
+        entry = await report_flights.do(f"{key}|{version}", compute_entry)
+
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+@app.get("/metrics/reports")
+async def report_metrics():
+    """
+    Counters for the report cache, request coalescing and the change feed.
+    ``executed`` is the number of report computations run, ``coalesced`` the
+    number of requests that shared one already in flight.
+    """
+    return {
+        "cache": response_cache.stats(),
+        "single_flight": report_flights.stats(),
+        "change_feed": change_feed.stats(),
+    }
+
+
+# Aggregation engine
+#
+# Every farm level figure is computed by one grouped subquery per measure,
+# joined back onto farms_farm. A statement therefore costs the same number of
+# round trips (one) whether it covers a single farm or every farm.
+def _farm_totals_subqueries(farm_id: Optional[int] = None):
+    farmers = select(
+        Farmer.farm_id.label("farm_id"),
+        func.count(Farmer.id).label("farmers_count"),
+    ).group_by(Farmer.farm_id)
+
+    cows = select(
+        Farmer.farm_id.label("farm_id"),
+        func.count(Cow.id).label("cows_count"),
+    ).join(Cow, Cow.farmer_id == Farmer.id).group_by(Farmer.farm_id)
+
+    milk = select(
+        Farmer.farm_id.label("farm_id"),
+        func.sum(MilkRecord.liters).label("total_milk"),
+    ).join(Cow, Cow.farmer_id == Farmer.id).join(
+        MilkRecord, MilkRecord.cow_id == Cow.id
+    ).group_by(Farmer.farm_id)
 
+    if farm_id is not None:
+        farmers = farmers.where(Farmer.farm_id == farm_id)
+        cows = cows.where(Farmer.farm_id == farm_id)
+        milk = milk.where(Farmer.farm_id == farm_id)
+
+    return farmers.subquery(), cows.subquery(), milk.subquery()
+
+
+def farm_summaries_statement(farm_id: Optional[int] = None):
+    """Build one statement returning a FarmSummary row per farm."""
+    farmers, cows, milk = _farm_totals_subqueries(farm_id)
+    stmt = (
+        select(
+            Farm.id,
+            Farm.name,
+            func.coalesce(farmers.c.farmers_count, 0).label("farmers_count"),
+            func.coalesce(cows.c.cows_count, 0).label("cows_count"),
+            func.coalesce(milk.c.total_milk, 0).label("total_milk"),
+        )
+        .outerjoin(farmers, farmers.c.farm_id == Farm.id)
+        .outerjoin(cows, cows.c.farm_id == Farm.id)
+        .outerjoin(milk, milk.c.farm_id == Farm.id)
+        .order_by(Farm.id)
+    )
+    if farm_id is not None:
+        stmt = stmt.where(Farm.id == farm_id)
+    return stmt
+
+
+def milk_rollup(farm_id: Optional[int] = None, farmer_id: Optional[int] = None):
+    """Pick the narrowest daily rollup table for the filters.
+
+    Returns the rollup model and the WHERE clauses selecting its rows. Farmer
+    and farm rollups share the ``date``, ``total_liters`` and ``record_count``
+    columns, so callers can aggregate either the same way.
+    """
+    if farmer_id:
+        conditions = [FarmerDailyMilk.farmer_id == farmer_id]
+        if farm_id:
+            conditions.append(
+                FarmerDailyMilk.farmer_id.in_(select(Farmer.id).where(Farmer.farm_id == farm_id))
+            )
+        return FarmerDailyMilk, conditions
+    if farm_id:
+        return FarmDailyMilk, [FarmDailyMilk.farm_id == farm_id]
+    return FarmDailyMilk, []
+
+
+def milk_summary_statement(farm_id: Optional[int] = None, farmer_id: Optional[int] = None):
+    """Build one statement returning every MilkProductionSummary figure.
+
+    Farm and farmer totals are global; cow and milk totals honour the filters.
+    """
+    cows = select(func.count(Cow.id))
+    if farm_id or farmer_id:
+        cows = cows.join(Farmer, Cow.farmer_id == Farmer.id)
+        if farm_id:
+            cows = cows.where(Farmer.farm_id == farm_id)
+        if farmer_id:
+            cows = cows.where(Farmer.id == farmer_id)
+
+    if USE_ROLLUPS:
+        rollup, conditions = milk_rollup(farm_id, farmer_id)
+        milk = select(func.sum(rollup.total_liters)).where(*conditions)
+    else:
+        milk = select(func.sum(MilkRecord.liters))
+        if farm_id or farmer_id:
+            milk = milk.join(Cow, MilkRecord.cow_id == Cow.id).join(Farmer, Cow.farmer_id == Farmer.id)
+            if farm_id:
+                milk = milk.where(Farmer.farm_id == farm_id)
+            if farmer_id:
+                milk = milk.where(Farmer.id == farmer_id)
+
+    return select(
+        select(func.count(Farm.id)).scalar_subquery().label("total_farms"),
+        select(func.count(Farmer.id)).scalar_subquery().label("total_farmers"),
+        cows.scalar_subquery().label("total_cows"),
+        func.coalesce(milk.scalar_subquery(), 0).label("total_milk"),
+    )
+
+
+def _farm_summary_row(row):
+    return {
+        "id": row.id,
+        "name": row.name,
+        "farmers_count": row.farmers_count,
+        "cows_count": row.cows_count,
+        "total_milk": float(row.total_milk)
+    }
 
 # Farm summary endpoint
 @app.get("/farms/summary", response_model=List[FarmSummary])
-def get_farms_summary(db: Session = Depends(get_db)):
-    farms = db.query(Farm).all()
-    
-    result = []
-    for farm in farms:
-        # Count farmers
-        farmers_count = db.query(Farmer).filter(Farmer.farm_id == farm.id).count()
-        
-        # Count cows and total milk
-        cows_subquery = db.query(Cow.id).join(Farmer).filter(Farmer.farm_id == farm.id).subquery()
-        cows_count = db.query(func.count()).select_from(cows_subquery).scalar() or 0
-        
-        total_milk = db.query(func.sum(MilkRecord.liters)).join(Cow).join(Farmer).filter(
-            Farmer.farm_id == farm.id
-        ).scalar() or 0.0
-        
-        result.append({
-            "id": farm.id,
-            "name": farm.name,
-            "farmers_count": farmers_count,
-            "cows_count": cows_count,
-            "total_milk": float(total_milk)
-        })
-    
-    return result
+async def get_farms_summary(request: Request, db: AsyncSession = Depends(get_db)):
+    async def compute():
+        rows = (await db.execute(farm_summaries_statement())).all()
+        return [_farm_summary_row(row) for row in rows]
+
+    return await cached_report(request, db, MILK_REPORT_TABLES, compute)
 
 # Farm detail endpoint
 @app.get("/farms/{farm_id}/summary", response_model=FarmSummary)
-def get_farm_summary(farm_id: int, db: Session = Depends(get_db)):
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
-    if not farm:
+async def get_farm_summary(farm_id: int, db: AsyncSession = Depends(get_db)):
+    row = (await db.execute(farm_summaries_statement(farm_id))).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Farm not found")
-    
-    # Count farmers
-    farmers_count = db.query(Farmer).filter(Farmer.farm_id == farm.id).count()
-    
-    # Count cows and total milk
-    cows_subquery = db.query(Cow.id).join(Farmer).filter(Farmer.farm_id == farm.id).subquery()
-    cows_count = db.query(func.count()).select_from(cows_subquery).scalar() or 0
-    
-    total_milk = db.query(func.sum(MilkRecord.liters)).join(Cow).join(Farmer).filter(
-        Farmer.farm_id == farm.id
-    ).scalar() or 0.0
-    
+    return ReportResponse(_farm_summary_row(row))
+
+def farmer_summaries_statement(
+    farmer_id: Optional[int] = None,
+    farm_id: Optional[int] = None,
+    sort: Optional[str] = None,
+):
+    """Build one statement returning a FarmerSummary row per farmer.
+
+    Cow and milk totals are grouped per farmer in their own subqueries, so
+    joining both does not multiply cow counts by the number of milk records.
+    The user email and farm name are joined in rather than looked up per row.
+    """
+    cows = select(
+        Cow.farmer_id.label("farmer_id"),
+        func.count(Cow.id).label("cows_count"),
+    ).group_by(Cow.farmer_id)
+
+    milk = select(
+        Cow.farmer_id.label("farmer_id"),
+        func.sum(MilkRecord.liters).label("total_milk"),
+    ).join(MilkRecord, MilkRecord.cow_id == Cow.id).group_by(Cow.farmer_id)
+
+    if farmer_id is not None:
+        cows = cows.where(Cow.farmer_id == farmer_id)
+        milk = milk.where(Cow.farmer_id == farmer_id)
+    if farm_id:
+        farm_farmers = select(Farmer.id).where(Farmer.farm_id == farm_id)
+        cows = cows.where(Cow.farmer_id.in_(farm_farmers))
+        milk = milk.where(Cow.farmer_id.in_(farm_farmers))
+
+    cows = cows.subquery()
+    milk = milk.subquery()
+    cows_count = func.coalesce(cows.c.cows_count, 0)
+    total_milk = func.coalesce(milk.c.total_milk, 0)
+
+    stmt = (
+        select(
+            Farmer.id,
+            func.coalesce(User.email, "Unknown").label("user_email"),
+            func.coalesce(Farm.name, "Unknown").label("farm_name"),
+            cows_count.label("cows_count"),
+            total_milk.label("total_milk"),
+        )
+        .outerjoin(User, User.id == Farmer.user_id)
+        .outerjoin(Farm, Farm.id == Farmer.farm_id)
+        .outerjoin(cows, cows.c.farmer_id == Farmer.id)
+        .outerjoin(milk, milk.c.farmer_id == Farmer.id)
+    )
+
+    if farmer_id is not None:
+        stmt = stmt.where(Farmer.id == farmer_id)
+    if farm_id:
+        stmt = stmt.where(Farmer.farm_id == farm_id)
+
+    if sort == "total_milk":
+        stmt = stmt.order_by(total_milk.desc(), Farmer.id)
+    elif sort == "cows_count":
+        stmt = stmt.order_by(cows_count.desc(), Farmer.id)
+    else:
+        stmt = stmt.order_by(Farmer.id)
+    return stmt
+
+
+def _farmer_summary_row(row):
     return {
-        "id": farm.id,
-        "name": farm.name,
-        "farmers_count": farmers_count,
-        "cows_count": cows_count,
-        "total_milk": float(total_milk)
+        "id": row.id,
+        "user_email": row.user_email,
+        "farm_name": row.farm_name,
+        "cows_count": row.cows_count,
+        "total_milk": float(row.total_milk)
     }
 
 # Farmers summary endpoint (all farmers)
 @app.get("/farmers/summary", response_model=List[FarmerSummary])
-def get_farmers_summary(farm_id: Optional[int] = None, db: Session = Depends(get_db)):
-    query = db.query(
-        Farmer.id,
-        func.count(Cow.id).label("cows_count"),
-        func.coalesce(func.sum(MilkRecord.liters), 0).label("total_milk")
-    ).join(Farm).outerjoin(Cow, Farmer.id == Cow.farmer_id).outerjoin(
-        MilkRecord, Cow.id == MilkRecord.cow_id
-    )
-    
-    # Only filter by farm_id, removed farmer_id parameter
-    if farm_id:
-        query = query.filter(Farmer.farm_id == farm_id)
-    
-    query = query.group_by(Farmer.id)
-    
-    farmer_summaries = query.all()
-    
-    result = []
-    for summary in farmer_summaries:
-        # Get user email from users_user table (instead of auth_user)
-        user_email_query = text(
-            "SELECT email FROM users_user WHERE id = (SELECT user_id FROM farms_farmer WHERE id = :farmer_id)"
-        )
-        
-        # Try with users_user first, fall back to other possible table names
-        try:
-            user_email_result = db.execute(user_email_query, {"farmer_id": summary.id}).first()
-            user_email = user_email_result[0] if user_email_result else "Unknown"
-        except Exception:
-            # Fallback - just get the user_id
-            user_id_query = text("SELECT user_id FROM farms_farmer WHERE id = :farmer_id")
-            user_id_result = db.execute(user_id_query, {"farmer_id": summary.id}).first()
-            user_email = f"User #{user_id_result[0]}" if user_id_result else "Unknown"
-        
-        # Get farm name
-        farm_name_query = text(
-            "SELECT name FROM farms_farm WHERE id = (SELECT farm_id FROM farms_farmer WHERE id = :farmer_id)"
-        )
-        farm_name_result = db.execute(farm_name_query, {"farmer_id": summary.id}).first()
-        farm_name = farm_name_result[0] if farm_name_result else "Unknown"
-        
-        result.append({
-            "id": summary.id,
-            "user_email": user_email,
-            "farm_name": farm_name,
-            "cows_count": summary.cows_count,
-            "total_milk": float(summary.total_milk)
-        })
-    
-    return result
+async def get_farmers_summary(
+    farm_id: Optional[int] = None,
+    sort: Optional[Literal["total_milk", "cows_count"]] = Query(
+        None, description="Order by this total, highest first (default: farmer ID)"
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of farmers to return"),
+    offset: int = Query(0, ge=0, description="Number of farmers to skip"),
+    db: AsyncSession = Depends(get_db)
+):
+    stmt = farmer_summaries_statement(farm_id=farm_id, sort=sort).offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    rows = (await db.execute(stmt)).all()
+    return ReportResponse([_farmer_summary_row(row) for row in rows])
 
 # New endpoint for specific farmer summary
 @app.get("/farmers/{farmer_id}/summary", response_model=FarmerSummary)
-def get_farmer_summary(farmer_id: int, db: Session = Depends(get_db)):
-    # Check if farmer exists
-    farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
-    if not farmer:
+async def get_farmer_summary(farmer_id: int, db: AsyncSession = Depends(get_db)):
+    row = (await db.execute(farmer_summaries_statement(farmer_id=farmer_id))).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Farmer not found")
-    
-    # Get cows count and milk total - FIX THE QUERY
-    summary = db.query(
-        func.count(Cow.id).label("cows_count"),
-        func.coalesce(func.sum(MilkRecord.liters), 0).label("total_milk")
-    ).select_from(Farmer).filter(Farmer.id == farmer_id) \
-     .outerjoin(Cow, Cow.farmer_id == Farmer.id) \
-     .outerjoin(MilkRecord, MilkRecord.cow_id == Cow.id) \
-     .first()
-    
-    # Get user email safely
-    try:
-        user_email_query = text(
-            "SELECT email FROM users_user WHERE id = (SELECT user_id FROM farms_farmer WHERE id = :farmer_id)"
-        )
-        user_email_result = db.execute(user_email_query, {"farmer_id": farmer_id}).first()
-        user_email = user_email_result[0] if user_email_result else "Unknown"
-    except Exception:
-        # Fallback - just get the user_id
-        user_id_query = text("SELECT user_id FROM farms_farmer WHERE id = :farmer_id")
-        user_id_result = db.execute(user_id_query, {"farmer_id": farmer_id}).first()
-        user_email = f"User #{user_id_result[0]}" if user_id_result else "Unknown"
-    
-    # Get farm name
-    farm_name_query = text(
-        "SELECT name FROM farms_farm WHERE id = (SELECT farm_id FROM farms_farmer WHERE id = :farmer_id)"
-    )
-    farm_name_result = db.execute(farm_name_query, {"farmer_id": farmer_id}).first()
-    farm_name = farm_name_result[0] if farm_name_result else "Unknown"
-    
-    return {
-        "id": farmer_id,
-        "user_email": user_email,
-        "farm_name": farm_name,
-        "cows_count": summary.cows_count or 0,
-        "total_milk": float(summary.total_milk or 0)
-    }
+    return ReportResponse(_farmer_summary_row(row))
 
 from fastapi import Query
 from datetime import datetime
@@ -354,62 +749,78 @@ def parse_date(
 
 # Milk production summary endpoint
 @app.get("/milk/summary", response_model=MilkProductionSummary)
-def get_milk_summary(
+async def get_milk_summary(
+    request: Request,
     farm_id: Optional[int] = None, 
     farmer_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get overall milk production summary without date filtering.
     Optionally filter by farm or farmer.
     """
-    # Create a base query for getting all milk records
-    base_query = db.query(MilkRecord)
-    
-    # Add join and filter conditions carefully to avoid duplicate joins
+    async def compute():
+        summary = (await db.execute(milk_summary_statement(farm_id, farmer_id))).one()
+        total_milk = float(summary.total_milk or 0)
+        total_cows = summary.total_cows or 0
+
+        # Calculate average per cow
+        average_per_cow = total_milk / total_cows if total_cows > 0 else 0.0
+
+        return {
+            "total_farms": summary.total_farms or 0,
+            "total_farmers": summary.total_farmers or 0,
+            "total_cows": total_cows,
+            "total_milk": total_milk,
+            "average_per_cow": float(average_per_cow)
+        }
+
+    return await cached_report(request, db, MILK_REPORT_TABLES, compute)
+
+def milk_by_date_statement(
+    start_date: date,
+    end_date: date,
+    farm_id: Optional[int] = None,
+    farmer_id: Optional[int] = None,
+):
+    """Build the per-day milk totals for an inclusive date range."""
+    if USE_ROLLUPS:
+        # One record per cow per day, so the record count is the cow count
+        rollup, conditions = milk_rollup(farm_id, farmer_id)
+        return (
+            select(
+                rollup.date,
+                func.sum(rollup.total_liters).label("total_liters"),
+                func.sum(rollup.record_count).label("cow_count"),
+            )
+            .where(*conditions, rollup.date >= start_date, rollup.date <= end_date)
+            .group_by(rollup.date)
+            .order_by(rollup.date)
+        )
+
+    stmt = select(
+        MilkRecord.date,
+        func.sum(MilkRecord.liters).label("total_liters"),
+        func.count(func.distinct(MilkRecord.cow_id)).label("cow_count")
+    )
+
     if farm_id or farmer_id:
-        base_query = base_query.join(Cow, MilkRecord.cow_id == Cow.id)
-        
+        stmt = stmt.join(Cow, MilkRecord.cow_id == Cow.id).join(Farmer, Cow.farmer_id == Farmer.id)
         if farm_id:
-            base_query = base_query.join(Farmer, Cow.farmer_id == Farmer.id)
-            base_query = base_query.filter(Farmer.farm_id == farm_id)
-        
+            stmt = stmt.where(Farmer.farm_id == farm_id)
         if farmer_id:
-            # No need to join Farmer again if we already did for farm_id
-            if not farm_id:
-                base_query = base_query.join(Farmer, Cow.farmer_id == Farmer.id)
-            base_query = base_query.filter(Farmer.id == farmer_id)
-    
-    # Get total milk using the filtered query (no date filters)
-    total_milk = base_query.with_entities(func.sum(MilkRecord.liters)).scalar() or 0.0
-    
-    # Count farms, farmers, and cows
-    total_farms = db.query(func.count(Farm.id)).scalar()
-    total_farmers = db.query(func.count(Farmer.id)).scalar()
-    
-    # Apply filters for cow count
-    cow_query = db.query(Cow)
-    if farm_id:
-        cow_query = cow_query.join(Farmer).filter(Farmer.farm_id == farm_id)
-    if farmer_id:
-        cow_query = cow_query.filter(Cow.farmer_id == farmer_id)
-    
-    total_cows = cow_query.count()
-    
-    # Calculate average per cow
-    average_per_cow = total_milk / total_cows if total_cows > 0 else 0.0
-    
-    return {
-        "total_farms": total_farms,
-        "total_farmers": total_farmers,
-        "total_cows": total_cows,
-        "total_milk": float(total_milk),
-        "average_per_cow": float(average_per_cow)
-    }
+            stmt = stmt.where(Farmer.id == farmer_id)
+
+    return (
+        stmt.where(MilkRecord.date >= start_date, MilkRecord.date <= end_date)
+        .group_by(MilkRecord.date)
+        .order_by(MilkRecord.date)
+    )
 
 # Milk production by date range
 @app.get("/milk/by-date", response_model=List[MilkByDateSummary])
-def get_milk_by_date(
+async def get_milk_by_date(
+    request: Request,
     farm_id: Optional[int] = Query(None, description="Filter by farm ID"),
     farmer_id: Optional[int] = Query(None, description="Filter by farmer ID"),
     start_date: str = Query(
@@ -422,7 +833,7 @@ def get_milk_by_date(
         description="End date in YYYY-MM-DD format",
         example="2025-08-31"
     ),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get milk production data broken down by date within a specified date range.
@@ -439,91 +850,780 @@ def get_milk_by_date(
             detail="Both start_date and end_date are required"
         )
 
-    # Rest of your existing query logic
-    query = db.query(
-        MilkRecord.date,
-        func.sum(MilkRecord.liters).label("total_liters"),
-        func.count(func.distinct(MilkRecord.cow_id)).label("cow_count")
+    async def compute():
+        stmt = milk_by_date_statement(parsed_start_date, parsed_end_date, farm_id, farmer_id)
+        results = (await db.execute(stmt)).all()
+
+        return [
+            {
+                "date": record.date,
+                "total_liters": float(record.total_liters),
+                "cow_count": record.cow_count
+            }
+            for record in results
+        ]
+
+    return await cached_report(request, db, MILK_REPORT_TABLES, compute)
+
+# Milk time series
+def milk_timeseries_statement(
+    start_date: date,
+    end_date: date,
+    granularity: str,
+    rolling: Optional[int] = None,
+    farm_id: Optional[int] = None,
+    farmer_id: Optional[int] = None,
+):
+    """Build a gap-filled milk time series in one pass.
+
+    Daily totals are bucketed with date_trunc and right-joined onto a
+    generate_series of every bucket in the range, so empty periods come back
+    as zero rows. The optional rolling average is a window over the buckets;
+    the series starts ``rolling - 1`` buckets early so the first requested
+    period already averages over a full window.
+    """
+    # granularity is one of a fixed set of keywords, never user text
+    unit = literal_column(f"'{granularity}'")
+    step = literal_column(f"interval '1 {granularity}'")
+    lead_in = literal_column(f"interval '{(rolling or 1) - 1} {granularity}'")
+
+    first_bucket = func.date_trunc(unit, literal(datetime.combine(start_date, datetime.min.time()), DateTime))
+    series_start = first_bucket - lead_in
+    series_end = func.date_trunc(unit, literal(datetime.combine(end_date, datetime.min.time()), DateTime))
+
+    if USE_ROLLUPS:
+        rollup, conditions = milk_rollup(farm_id, farmer_id)
+        daily = select(
+            rollup.date.label("day"),
+            rollup.total_liters.label("liters"),
+            rollup.record_count.label("records"),
+        ).where(*conditions)
+    else:
+        daily = select(
+            MilkRecord.date.label("day"),
+            MilkRecord.liters.label("liters"),
+            literal_column("1").label("records"),
+        )
+        if farm_id or farmer_id:
+            daily = daily.join(Cow, MilkRecord.cow_id == Cow.id).join(Farmer, Cow.farmer_id == Farmer.id)
+            if farm_id:
+                daily = daily.where(Farmer.farm_id == farm_id)
+            if farmer_id:
+                daily = daily.where(Farmer.id == farmer_id)
+    day_column = daily.selected_columns.day
+    daily = daily.where(day_column >= cast(series_start, Date), day_column <= end_date).subquery()
+
+    bucketed = select(
+        func.date_trunc(unit, cast(daily.c.day, DateTime)).label("period"),
+        daily.c.liters,
+        daily.c.records,
+    ).subquery()
+    totals = (
+        select(
+            bucketed.c.period,
+            func.sum(bucketed.c.liters).label("total_liters"),
+            func.sum(bucketed.c.records).label("record_count"),
+        )
+        .group_by(bucketed.c.period)
+        .subquery()
     )
-    
-    # Apply filters carefully to avoid duplicate joins
-    if farm_id or farmer_id:
-        query = query.join(Cow, MilkRecord.cow_id == Cow.id)
-        
-        if farm_id:
-            query = query.join(Farmer, Cow.farmer_id == Farmer.id)
-            query = query.filter(Farmer.farm_id == farm_id)
-        
-        if farmer_id:
-            # If we already joined Farmer for farm_id, don't join again
-            if not farm_id:
-                query = query.join(Farmer, Cow.farmer_id == Farmer.id)
-            query = query.filter(Farmer.id == farmer_id)
-    
-    # Apply date range (required for this endpoint)
-    query = query.filter(MilkRecord.date >= start_date)
-    query = query.filter(MilkRecord.date <= end_date)
-    
-    # Group and order
-    query = query.group_by(MilkRecord.date).order_by(MilkRecord.date)
-    
-    results = query.all()
-    
-    # If no results are found, return an empty list
-    if not results:
-        return []
-    
-    return [
-        {
-            "date": record.date,
-            "total_liters": float(record.total_liters),
-            "cow_count": record.cow_count
-        }
-        for record in results
+
+    series = select(
+        func.generate_series(series_start, series_end, step).label("period")
+    ).subquery()
+    total_liters = func.coalesce(totals.c.total_liters, 0)
+    columns = [
+        cast(series.c.period, Date).label("period"),
+        total_liters.label("total_liters"),
+        func.coalesce(totals.c.record_count, 0).label("record_count"),
     ]
+    if rolling:
+        columns.append(
+            func.avg(total_liters)
+            .over(order_by=series.c.period, rows=(-(rolling - 1), 0))
+            .label("rolling_average")
+        )
+    windowed = (
+        select(*columns)
+        .select_from(series)
+        .outerjoin(totals, totals.c.period == series.c.period)
+        .subquery()
+    )
+    return (
+        select(windowed)
+        .where(windowed.c.period >= cast(first_bucket, Date))
+        .order_by(windowed.c.period)
+    )
+
+
+@app.get("/milk/timeseries", response_model=List[MilkTimeseriesPoint])
+async def get_milk_timeseries(
+    request: Request,
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format", example="2025-01-01"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format", example="2025-12-31"),
+    granularity: Literal["day", "week", "month", "year"] = Query("day", description="Bucket size"),
+    rolling: Optional[int] = Query(
+        None, ge=2, le=366,
+        description="Add a trailing average over this many buckets (e.g. 7 or 30 with daily buckets)"
+    ),
+    farm_id: Optional[int] = Query(None, description="Filter by farm ID"),
+    farmer_id: Optional[int] = Query(None, description="Filter by farmer ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get milk production per day, week, month or year within a date range.
+    Periods without records are returned with zero totals.
+    """
+    parsed_start_date = parse_date(start_date)
+    parsed_end_date = parse_date(end_date)
+    if parsed_start_date > parsed_end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    async def compute():
+        stmt = milk_timeseries_statement(
+            parsed_start_date, parsed_end_date, granularity, rolling, farm_id, farmer_id
+        )
+        rows = (await db.execute(stmt)).all()
+        return [
+            {
+                "period": row.period,
+                "total_liters": float(row.total_liters),
+                "record_count": int(row.record_count),
+                "rolling_average": float(row.rolling_average) if rolling else None,
+            }
+            for row in rows
+        ]
+
+    return await cached_report(request, db, MILK_REPORT_TABLES, compute)
+
+
+# Yield distribution
+def _distribution_fields(sketch: MergedSketch, bin_width: float):
+    p50, p90, p99 = sketch.quantiles((0.5, 0.9, 0.99))
+    return {
+        "cow_days": sketch.cow_days,
+        "distinct_cows": sketch.distinct_cows(),
+        "p50_liters": p50,
+        "p90_liters": p90,
+        "p99_liters": p99,
+        "histogram": sketch.histogram(bin_width),
+    }
+
+
+def milk_distribution_statement(start_date: date, end_date: date, farm_id: Optional[int] = None):
+    stmt = (
+        select(
+            FarmDailyMilkSketch.farm_id,
+            FarmDailyMilkSketch.cow_days,
+            FarmDailyMilkSketch.zero_count,
+            FarmDailyMilkSketch.buckets,
+            FarmDailyMilkSketch.cow_registers,
+        )
+        .where(FarmDailyMilkSketch.date.between(start_date, end_date))
+        .execution_options(yield_per=1000)
+    )
+    if farm_id:
+        stmt = stmt.where(FarmDailyMilkSketch.farm_id == farm_id)
+    return stmt
+
+
+@app.get("/milk/distribution", response_model=MilkDistribution)
+async def get_milk_distribution(
+    request: Request,
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format", example="2025-08-01"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format", example="2025-08-31"),
+    farm_id: Optional[int] = Query(None, description="Filter by farm ID"),
+    by_farm: bool = Query(False, description="Also return the distribution of each farm"),
+    bin_width: float = Query(2.0, ge=0.1, le=100, description="Histogram bin width in liters"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get percentiles, a histogram and the approximate number of distinct cows
+    for liters per cow per day within a date range. The histogram lists its
+    non-empty bins in order.
+
+    Answered by merging the per-farm daily sketches kept by the core service;
+    percentiles are within 1% of the exact values.
+    """
+    parsed_start_date = parse_date(start_date)
+    parsed_end_date = parse_date(end_date)
+    if parsed_start_date > parsed_end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    async def compute():
+        stmt = milk_distribution_statement(parsed_start_date, parsed_end_date, farm_id)
+        merged = MergedSketch()
+        farms = {}
+        async for row in await db.stream(stmt):
+            merged.merge(row.cow_days, row.zero_count, row.buckets, row.cow_registers)
+            if by_farm:
+                farm_sketch = farms.setdefault(row.farm_id, MergedSketch())
+                farm_sketch.merge(row.cow_days, row.zero_count, row.buckets, row.cow_registers)
+
+        result = {
+            "start_date": parsed_start_date,
+            "end_date": parsed_end_date,
+            **_distribution_fields(merged, bin_width),
+            "farms": None,
+        }
+        if by_farm:
+            result["farms"] = [
+                {"farm_id": farm, **_distribution_fields(farms[farm], bin_width)}
+                for farm in sorted(farms)
+            ]
+        return result
+
+    return await cached_report(request, db, MILK_REPORT_TABLES, compute)
+
+
+# Yield anomalies
+def yield_series_statement(start_date: date, end_date: date, farm_id: Optional[int] = None):
+    """Build one row per cow with its day offsets from ``start_date`` and float8 liters as arrays.
+
+    One row per cow crosses the wire rather than one per cow-day, and
+    grouping by cow alone reads the (cow, date) index in order without a
+    sort; the farms are joined to the grouped rows.
+    """
+    if USE_ROLLUPS:
+        source, liters = CowDailyMilk, CowDailyMilk.total_liters
+    else:
+        source, liters = MilkRecord, MilkRecord.liters
+
+    series = (
+        select(
+            source.cow_id,
+            func.array_agg(cast(source.date - literal(start_date, Date), Integer), type_=ARRAY(Integer)).label("days"),
+            func.array_agg(cast(liters, Float), type_=ARRAY(Float)).label("liters"),
+        )
+        .where(source.date >= start_date, source.date <= end_date)
+        .group_by(source.cow_id)
+    )
+    if farm_id:
+        series = series.where(source.cow_id.in_(
+            select(Cow.id).join(Farmer, Farmer.id == Cow.farmer_id).where(Farmer.farm_id == farm_id)
+        ))
+    series = series.subquery()
+    stmt = (
+        select(series.c.cow_id, Farmer.farm_id, series.c.days, series.c.liters)
+        .join(Cow, Cow.id == series.c.cow_id)
+        .join(Farmer, Farmer.id == Cow.farmer_id)
+    )
+    if farm_id:
+        stmt = stmt.where(Farmer.farm_id == farm_id)
+    return stmt
+
+
+async def find_yield_drops(
+    db,
+    end_date: date,
+    window: int = 14,
+    recent: int = 3,
+    z_threshold: float = 2.5,
+    drop_threshold: float = 30.0,
+    farm_id: Optional[int] = None,
+):
+    """Load every cow's daily yield for the period and flag sharp drops.
+
+    ``db`` may be a session or a connection.
+    """
+    days = window + recent
+    start_date = end_date - timedelta(days=days - 1)
+    stmt = yield_series_statement(start_date, end_date, farm_id)
+
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return []
+    cow_ids, farm_ids, day_offsets, values = zip(*rows)
+    cows, farms, matrix = anomalies.build_matrix(cow_ids, farm_ids, day_offsets, values, days)
+    drops = anomalies.detect_yield_drops(
+        cows, farms, matrix,
+        window=window,
+        recent=recent,
+        z_threshold=z_threshold,
+        drop_threshold=drop_threshold,
+        min_observations=max(2, window // 2),
+    )
+
+    tags = {}
+    if len(drops.cow_ids):
+        tag_rows = await db.execute(select(Cow.id, Cow.tag_id).where(Cow.id.in_(drops.cow_ids.tolist())))
+        tags = dict(tag_rows.all())
+    return anomalies.group_by_farm(drops, tags)
+
+
+@app.get("/milk/anomalies", response_model=List[FarmYieldAnomalies])
+async def get_milk_anomalies(
+    request: Request,
+    end_date: Optional[str] = Query(None, description="Last day analysed, YYYY-MM-DD (default: today)"),
+    window: int = Query(14, ge=3, le=365, description="Days in each cow's baseline"),
+    recent: int = Query(3, ge=1, le=30, description="Days compared against the baseline"),
+    z_threshold: float = Query(2.5, gt=0, description="Flag drops this many standard deviations below baseline"),
+    drop_threshold: float = Query(30.0, gt=0, le=100, description="Flag drops of at least this percentage"),
+    farm_id: Optional[int] = Query(None, description="Filter by farm ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get cows whose recent milk yield dropped sharply against their own
+    baseline, grouped per farm with the largest drops first.
+    """
+    parsed_end_date = parse_date(end_date) or date.today()
+
+    async def compute():
+        return await find_yield_drops(
+            db, parsed_end_date, window, recent, z_threshold, drop_threshold, farm_id
+        )
+
+    return await cached_report(request, db, MILK_REPORT_TABLES, compute, vary=parsed_end_date.isoformat())
+
+
+# Leaderboards
+def _leaderboard_source(entity: str, farm_id: Optional[int]):
+    """Return the daily source, its owner key, liters and date columns for an entity."""
+    if USE_ROLLUPS:
+        rollup, owner = {
+            "cows": (CowDailyMilk, "cow_id"),
+            "farmers": (FarmerDailyMilk, "farmer_id"),
+            "farms": (FarmDailyMilk, "farm_id"),
+        }[entity]
+        key = getattr(rollup, owner)
+        stmt = select().select_from(rollup)
+        liters, day = rollup.total_liters, rollup.date
+        if farm_id:
+            if entity == "cows":
+                stmt = stmt.join(Cow, Cow.id == key).join(Farmer, Farmer.id == Cow.farmer_id)
+                stmt = stmt.where(Farmer.farm_id == farm_id)
+            elif entity == "farmers":
+                stmt = stmt.join(Farmer, Farmer.id == key).where(Farmer.farm_id == farm_id)
+            else:
+                stmt = stmt.where(key == farm_id)
+        return stmt, key, liters, day
+
+    stmt = select().select_from(MilkRecord)
+    if entity == "cows" and not farm_id:
+        key = MilkRecord.cow_id
+    else:
+        stmt = stmt.join(Cow, Cow.id == MilkRecord.cow_id).join(Farmer, Farmer.id == Cow.farmer_id)
+        key = {"cows": MilkRecord.cow_id, "farmers": Cow.farmer_id, "farms": Farmer.farm_id}[entity]
+        if farm_id:
+            stmt = stmt.where(Farmer.farm_id == farm_id)
+    return stmt, key, MilkRecord.liters, MilkRecord.date
+
+
+def leaderboard_statement(
+    entity: str,
+    end_date: date,
+    window: int,
+    limit: int,
+    farm_id: Optional[int] = None,
+):
+    """Build the top-``limit`` entities by liters over the last ``window`` days.
+
+    The current and previous windows are summed in one grouped scan with
+    FILTER clauses; both rankings are window functions over that result, so
+    each entry carries its previous rank without another query.
+    """
+    current_start = end_date - timedelta(days=window - 1)
+    previous_start = current_start - timedelta(days=window)
+    stmt, key, liters, day = _leaderboard_source(entity, farm_id)
+
+    totals = (
+        stmt.add_columns(
+            key.label("id"),
+            func.coalesce(func.sum(liters).filter(day >= current_start), 0).label("total"),
+            func.coalesce(func.sum(liters).filter(day < current_start), 0).label("previous_total"),
+        )
+        .where(day >= previous_start, day <= end_date)
+        .group_by(key)
+        .subquery()
+    )
+    ranked = select(
+        totals.c.id,
+        totals.c.total,
+        totals.c.previous_total,
+        func.rank().over(order_by=totals.c.total.desc()).label("rank"),
+        case(
+            (totals.c.previous_total > 0, func.rank().over(order_by=totals.c.previous_total.desc())),
+            else_=None,
+        ).label("previous_rank"),
+    ).subquery()
+    # Names are looked up for the top entries only, after the limit
+    top = (
+        select(ranked)
+        .where(ranked.c.total > 0)
+        .order_by(ranked.c.rank, ranked.c.id)
+        .limit(limit)
+        .subquery()
+    )
+
+    if entity == "cows":
+        name, owner = Cow.tag_id, Cow
+    elif entity == "farmers":
+        name, owner = func.coalesce(User.email, "Unknown"), Farmer
+    else:
+        name, owner = Farm.name, Farm
+
+    stmt = (
+        select(top, name.label("name"))
+        .join(owner, owner.id == top.c.id)
+        .order_by(top.c.rank, top.c.id)
+    )
+    if entity == "farmers":
+        stmt = stmt.outerjoin(User, User.id == Farmer.user_id)
+    return stmt
+
+
+@app.get("/leaderboards/{entity}", response_model=List[LeaderboardEntry])
+async def get_leaderboard(
+    request: Request,
+    entity: Literal["cows", "farmers", "farms"],
+    window: int = Query(30, ge=1, le=366, description="Days in the ranking window"),
+    limit: int = Query(20, ge=1, le=100, description="Number of entries to return"),
+    end_date: Optional[str] = Query(None, description="Last day of the window, YYYY-MM-DD (default: today)"),
+    farm_id: Optional[int] = Query(None, description="Only rank cows, farmers or farms of this farm"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the top cows, farmers or farms by milk produced over a window, with
+    each entry's change from the window before it.
+    """
+    parsed_end_date = parse_date(end_date) or date.today()
+
+    async def compute():
+        stmt = leaderboard_statement(entity, parsed_end_date, window, limit, farm_id)
+        rows = (await db.execute(stmt)).all()
+        result = []
+        for row in rows:
+            total = float(row.total)
+            previous = float(row.previous_total)
+            result.append({
+                "rank": row.rank,
+                "id": row.id,
+                "name": row.name,
+                "total_liters": total,
+                "previous_total_liters": previous,
+                "previous_rank": row.previous_rank,
+                "delta_liters": total - previous,
+                "delta_pct": round((total - previous) / previous * 100, 2) if previous else None,
+            })
+        return result
+
+    tables = FARMER_REPORT_TABLES if entity == "farmers" else MILK_REPORT_TABLES
+    return await cached_report(request, db, tables, compute, vary=parsed_end_date.isoformat())
+
+
+# Recent activities
+ACTIVITY_PAGE_SIZE = 50
+ACTIVITY_MAX_PAGE_SIZE = 500
+ACTIVITY_STREAM_BATCH_SIZE = 1000
+
+
+def encode_activity_cursor(created_at: datetime, activity_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{activity_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_activity_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, activity_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(activity_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def recent_activities_statement(
+    farm_id: Optional[int] = None,
+    farmer_id: Optional[int] = None,
+    after: Optional[tuple] = None,
+):
+    """Build the activity listing, newest first, keyed on (created_at, id).
+
+    ``after`` is a decoded cursor; only rows strictly older than it are
+    returned, so each page is an index range scan instead of an OFFSET.
+    """
+    stmt = (
+        select(
+            Activity.id,
+            func.coalesce(User.first_name + " " + User.last_name, "Unknown").label("farmer_name"),
+            Activity.description,
+            Activity.created_at,
+        )
+        .join(Farmer, Farmer.id == Activity.farmer_id)
+        .outerjoin(User, User.id == Farmer.user_id)
+        .order_by(Activity.created_at.desc(), Activity.id.desc())
+    )
+    if farm_id:
+        stmt = stmt.where(Farmer.farm_id == farm_id)
+    if farmer_id:
+        stmt = stmt.where(Activity.farmer_id == farmer_id)
+    if after:
+        stmt = stmt.where(tuple_(Activity.created_at, Activity.id) < tuple_(*after))
+    return stmt
+
+
+def _activity_row(row):
+    return {
+        "id": row.id,
+        "farmer_name": row.farmer_name,
+        "description": row.description,
+        "created_at": row.created_at
+    }
+
+
+async def _stream_activities(stmt):
+    # A dedicated connection with a server-side cursor: the request session is
+    # released before the body is sent, and rows are fetched in batches.
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            stmt.execution_options(yield_per=ACTIVITY_STREAM_BATCH_SIZE)
+        )
+        async for row in result:
+            yield dump_json(_activity_row(row)) + b"\n"
+
 
 # Recent activities endpoint
 @app.get("/activities/recent", response_model=List[ActivitySummary])
-def get_recent_activities(
+async def get_recent_activities(
     farm_id: Optional[int] = Query(None, description="Filter by farm ID"),
     farmer_id: Optional[int] = Query(None, description="Filter by farmer ID"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    limit: int = Query(ACTIVITY_PAGE_SIZE, ge=1, le=ACTIVITY_MAX_PAGE_SIZE, description="Page size"),
+    format: Literal["json", "ndjson"] = Query(
+        "json", description="ndjson streams every matching activity instead of one page"
+    ),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get recent activities optionally filtered by farm or farmer.
-    Returns activities ordered by creation date (newest first).
+    Returns activities ordered by creation date (newest first), one page at a
+    time. When more activities exist, the X-Next-Cursor response header holds
+    the cursor for the next page.
     """
-    query = db.query(Activity).order_by(Activity.created_at.desc())
-    
+    after = decode_activity_cursor(cursor) if cursor else None
+    stmt = recent_activities_statement(farm_id, farmer_id, after)
+
+    if format == "ndjson":
+        return StreamingResponse(_stream_activities(stmt), media_type="application/x-ndjson")
+
+    # Fetch one extra row to learn whether another page follows
+    headers = {}
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_activity_cursor(last.created_at, last.id)
+
+    return ReportResponse([_activity_row(row) for row in rows], headers=headers)
+
+
+# Bulk export of milk records
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = ["id", "date", "cow_id", "tag_id", "farmer_id", "farm_id", "liters", "created_at"]
+XLSX_MAX_ROWS_PER_SHEET = 1048575  # Excel's row limit, less the header row
+
+
+def milk_export_statement(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    farm_id: Optional[int] = None,
+    farmer_id: Optional[int] = None,
+):
+    stmt = (
+        select(
+            MilkRecord.id,
+            MilkRecord.date,
+            MilkRecord.cow_id,
+            Cow.tag_id,
+            Cow.farmer_id,
+            Farmer.farm_id,
+            MilkRecord.liters,
+            MilkRecord.created_at,
+        )
+        .join(Cow, MilkRecord.cow_id == Cow.id)
+        .join(Farmer, Cow.farmer_id == Farmer.id)
+        .order_by(MilkRecord.date, MilkRecord.id)
+    )
     if farm_id:
-        query = query.join(Farmer).filter(Farmer.farm_id == farm_id)
+        stmt = stmt.where(Farmer.farm_id == farm_id)
     if farmer_id:
-        query = query.filter(Activity.farmer_id == farmer_id)
-    
-    activities = query.all()
-    
-    result = []
-    for activity in activities:
-        # Get farmer name from users_user table through farms_farmer
-        farmer_name_query = text("""
-            SELECT u.first_name || ' ' || u.last_name as full_name
-            FROM users_user u
-            JOIN farms_farmer ff ON u.id = ff.user_id
-            WHERE ff.id = :farmer_id
-        """)
-        
-        try:
-            farmer_name_result = db.execute(farmer_name_query, {"farmer_id": activity.farmer_id}).first()
-            farmer_name = farmer_name_result[0] if farmer_name_result else "Unknown"
-        except Exception:
-            # Fallback to just showing the farmer ID if query fails
-            farmer_name = f"Farmer #{activity.farmer_id}"
-        
-        result.append({
-            "id": activity.id,
-            "farmer_name": farmer_name,
-            "description": activity.description,
-            "created_at": activity.created_at
-        })
-    
-    return result
\ No newline at end of file
+        stmt = stmt.where(Farmer.id == farmer_id)
+    if start_date:
+        stmt = stmt.where(MilkRecord.date >= start_date)
+    if end_date:
+        stmt = stmt.where(MilkRecord.date <= end_date)
+    return stmt
+
+
+async def _export_batches(stmt):
+    # Server-side cursor on a dedicated connection; only one batch of rows is
+    # held in memory at a time.
+    async with engine.connect() as connection:
+        result = await connection.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield rows
+
+
+def _export_values(row):
+    return [
+        row.id,
+        row.date.isoformat(),
+        row.cow_id,
+        row.tag_id,
+        row.farmer_id,
+        row.farm_id,
+        float(row.liters),
+        row.created_at.isoformat() if row.created_at else None,
+    ]
+
+
+async def _export_csv(stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    async for rows in _export_batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_export_values(row) for row in rows)
+        yield buffer.getvalue()
+
+
+async def _export_ndjson(stmt):
+    async for rows in _export_batches(stmt):
+        yield b"".join(dump_json(dict(zip(EXPORT_COLUMNS, _export_values(row)))) + b"\n" for row in rows)
+
+
+def _xlsx_values(row):
+    # Excel cannot store timezone-aware datetimes
+    created_at = row.created_at
+    if created_at is not None and created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return [row.id, row.date, row.cow_id, row.tag_id, row.farmer_id, row.farm_id, float(row.liters), created_at]
+
+
+class _XlsxExport:
+    """Write-only workbook that starts a new sheet whenever one fills up."""
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+
+    def append(self, rows):
+        for row in rows:
+            if self.sheet is None or self.sheet_rows >= XLSX_MAX_ROWS_PER_SHEET:
+                self.sheet = self.workbook.create_sheet(f"milk_{len(self.workbook.worksheets) + 1}")
+                self.sheet.append(EXPORT_COLUMNS)
+                self.sheet_rows = 0
+            self.sheet.append(_xlsx_values(row))
+            self.sheet_rows += 1
+
+    def save(self, fileobj):
+        if self.sheet is None:
+            # An empty export still gets a sheet with the header row
+            self.sheet = self.workbook.create_sheet("milk_1")
+            self.sheet.append(EXPORT_COLUMNS)
+        self.workbook.save(fileobj)
+
+
+async def _export_xlsx(stmt):
+    # Write-only worksheets spool rows to disk as they are appended, and the
+    # finished file is streamed back in chunks, so memory stays flat.
+    export = _XlsxExport()
+    async for rows in _export_batches(stmt):
+        await run_in_threadpool(export.append, rows)
+
+    with tempfile.TemporaryFile() as fileobj:
+        await run_in_threadpool(export.save, fileobj)
+        fileobj.seek(0)
+        while chunk := await run_in_threadpool(fileobj.read, 1024 * 1024):
+            yield chunk
+
+
+EXPORT_FORMATS = {
+    "csv": (_export_csv, "text/csv"),
+    "ndjson": (_export_ndjson, "application/x-ndjson"),
+    "xlsx": (_export_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+@app.get("/export/milk")
+async def export_milk_records(
+    format: Literal["csv", "ndjson", "xlsx"] = Query("csv", description="Output format"),
+    farm_id: Optional[int] = Query(None, description="Filter by farm ID"),
+    farmer_id: Optional[int] = Query(None, description="Filter by farmer ID"),
+    start_date: Optional[str] = Query(None, description="Start date in YYYY-MM-DD format", example="2025-08-01"),
+    end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DD format", example="2025-08-31"),
+):
+    """
+    Stream raw milk records, oldest first, as CSV, NDJSON or XLSX.
+    Takes the same filters as /milk/by-date; the date range is optional here.
+    """
+    stmt = milk_export_statement(parse_date(start_date), parse_date(end_date), farm_id, farmer_id)
+    generate, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        generate(stmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="milk-records.{format}"'},
+    )
+
+
+# Batch reports
+#
+# Items are dispatched to the report endpoints in-process, so each one goes
+# through the same validation, caching and session handling as a direct call.
+BATCH_PATHS = re.compile(
+    r"^/(?:farms/summary|farms/\d+/summary|farmers/summary|farmers/\d+/summary"
+    r"|milk/(?:summary|by-date|timeseries|distribution|anomalies)"
+    r"|leaderboards/\w+|activities/recent)$"
+)
+_batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+
+async def _run_batch_item(client: httpx.AsyncClient, item: BatchItem, timeout: float):
+    result = {"id": item.id, "path": item.path, "status": None, "body": None, "error": None, "headers": {}}
+    if not BATCH_PATHS.match(item.path):
+        return {**result, "status": 400, "error": "Path is not a batchable report"}
+    # Streamed formats would be read whole into memory before being refused
+    if item.params.get("format", "json") != "json":
+        return {**result, "status": 400, "error": "Batch items return JSON reports only"}
+
+    async def fetch():
+        async with _batch_slots:
+            return await client.get(item.path, params=item.params)
+
+    try:
+        response = await asyncio.wait_for(fetch(), timeout)
+    except asyncio.TimeoutError:
+        return {**result, "status": 504, "error": f"Timed out after {timeout:g}s"}
+    except Exception as e:
+        return {**result, "status": 500, "error": str(e) or type(e).__name__}
+
+    result["status"] = response.status_code
+    result["headers"] = {
+        name: value for name, value in response.headers.items() if name.startswith("x-")
+    }
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        return {**result, "status": 400, "error": "Report did not return JSON"}
+    result["body"] = orjson.loads(response.content)
+    if response.status_code >= 400:
+        detail = result["body"].get("detail") if isinstance(result["body"], dict) else None
+        result["error"] = detail if isinstance(detail, str) else f"Request failed with status {response.status_code}"
+    return result
+
+
+@app.post("/batch", response_model=List[BatchResult])
+async def run_batch(batch: BatchRequest):
+    """
+    Run several report requests concurrently and return all results at once.
+
+    Each item names a GET report path and its query parameters. Items fail
+    independently: a bad path, an error response or a timeout is reported in
+    that item's status and error, and the other items still complete.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://reporting") as client:
+        results = await asyncio.gather(
+            *(_run_batch_item(client, item, batch.timeout) for item in batch.requests)
+        )
+    return ReportResponse(results)
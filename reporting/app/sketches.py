@@ -0,0 +1,88 @@
+"""Merging of the per-farm daily yield sketches kept by the core service.
+
+Each ``farms_farmdailymilksketch`` row summarises the cow daily yields of one
+farm and day as logarithmic bucket counts plus HyperLogLog registers of the
+cow ids (see ``farms/sketches.py`` in the core service for the encoding).
+Merging rows adds bucket counts and takes the register maximum, so the cost
+of a report depends on the number of farm-days, not on the number of
+records. The constants must match the core service.
+"""
+import math
+from collections import Counter
+
+import numpy as np
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+HLL_REGISTERS = 1 << 10
+
+
+class MergedSketch:
+    def __init__(self):
+        self.cow_days = 0
+        self.zero_count = 0
+        self.buckets = Counter()
+        self.registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+
+    def merge(self, cow_days, zero_count, buckets, registers):
+        self.cow_days += cow_days
+        self.zero_count += zero_count
+        for index, count in buckets.items():
+            self.buckets[int(index)] += count
+        np.maximum(self.registers, np.frombuffer(registers, dtype=np.uint8), out=self.registers)
+
+    def _sorted_buckets(self):
+        indexes = np.fromiter(sorted(self.buckets), dtype=np.int64, count=len(self.buckets))
+        counts = np.array([self.buckets[index] for index in indexes], dtype=np.int64)
+        # Midpoint of (GAMMA ** (i - 1), GAMMA ** i], within RELATIVE_ACCURACY of any value in it
+        values = 2 * np.power(GAMMA, indexes.astype(np.float64)) / (GAMMA + 1)
+        return values, counts
+
+    def quantiles(self, qs):
+        """Return the yield at each quantile in ``qs``, or ``None`` when empty."""
+        if not self.cow_days:
+            return [None for _ in qs]
+        values, counts = self._sorted_buckets()
+        cumulative = self.zero_count + np.cumsum(counts)
+        result = []
+        for q in qs:
+            rank = q * (self.cow_days - 1)
+            if rank < self.zero_count or not len(values):
+                result.append(0.0)
+                continue
+            position = min(int(np.searchsorted(cumulative, rank, side="right")), len(values) - 1)
+            result.append(round(float(values[position]), 2))
+        return result
+
+    def histogram(self, bin_width):
+        """Count cow-days in ``[k * bin_width, (k + 1) * bin_width)`` bins.
+
+        Only non-empty bins are returned, so one outlying yield adds one bin
+        rather than every empty bin below it.
+        """
+        if not self.cow_days:
+            return []
+        values, counts = self._sorted_buckets()
+        bins = np.append(np.floor(values / bin_width).astype(np.int64), 0)
+        counts = np.append(counts, self.zero_count)
+        indexes, positions = np.unique(bins, return_inverse=True)
+        totals = np.bincount(positions, weights=counts)
+        return [
+            {
+                "lower": round(int(index) * bin_width, 2),
+                "upper": round((int(index) + 1) * bin_width, 2),
+                "count": int(count),
+            }
+            for index, count in zip(indexes, totals)
+            if count
+        ]
+
+    def distinct_cows(self):
+        """HyperLogLog estimate of the distinct cows seen, at most the cow-days."""
+        m = HLL_REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return min(int(round(estimate)), self.cow_days)
@@ -0,0 +1,71 @@
+"""Wall time of the yield anomaly report at the size of the seeded database.
+
+Times ``GET /milk/anomalies`` end to end, in-process and with the response
+cache off, for each ``--window``: the per-cow series query, building the
+matrix, detection and rendering. The series query alone is timed too, so
+the split between the database and Python is visible.
+
+Run from the reporting directory against a seeded database::
+
+    python -m benchmarks.anomalies --end-date 2026-06-30 --window 14 87
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date, timedelta
+
+import httpx
+from sqlalchemy import func, select
+
+from app import main
+
+
+async def best_of(repeat, run):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+async def benchmark(args):
+    main.CACHE_MAX_BYTES = 0
+    async with main.engine.connect() as connection:
+        cows = await connection.scalar(select(func.count()).select_from(main.Cow))
+    if not cows:
+        sys.exit("The database has no cows; seed it first")
+    print(f"{cows} cows, recent {args.recent} days, best of {args.repeat}\n")
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://reporting", timeout=None) as client:
+        for window in args.window:
+            days = window + args.recent
+            stmt = main.yield_series_statement(args.end_date - timedelta(days=days - 1), args.end_date)
+
+            async def load():
+                async with main.engine.connect() as connection:
+                    await connection.execute(stmt)
+
+            async def endpoint():
+                response = await client.get(
+                    "/milk/anomalies",
+                    params={"end_date": args.end_date.isoformat(), "window": window, "recent": args.recent},
+                )
+                response.raise_for_status()
+
+            print(
+                f"  {days:>3} days   series query {await best_of(args.repeat, load):6.2f} s"
+                f"   endpoint {await best_of(args.repeat, endpoint):6.2f} s"
+            )
+    await main.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the yield anomaly report end to end")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(), help="Last day analysed")
+    parser.add_argument("--window", type=int, nargs="+", default=[14], help="Baseline days; one run per value")
+    parser.add_argument("--recent", type=int, default=3, help="Days compared against the baseline")
+    parser.add_argument("--repeat", type=int, default=3, help="Report the best of this many runs")
+    asyncio.run(benchmark(parser.parse_args()))
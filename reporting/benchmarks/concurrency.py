@@ -0,0 +1,204 @@
+"""Throughput of the reporting service under many concurrent dashboard clients.
+
+Starts the service under uvicorn twice: once as it is (``async def``
+endpoints on the asyncpg engine), and once as ``sync_app`` below, which
+serves the same statements the way the service used to, from ``def``
+endpoints on a psycopg2 engine in Starlette's threadpool. Both use the same
+pool settings and run with the response cache off, so every request reaches
+the database. ``--clients`` dashboard clients then poll a farm's summary and
+milk totals for ``--duration`` seconds against each.
+
+Run from the reporting directory against a seeded database::
+
+    python -m benchmarks.concurrency --clients 200 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import main
+
+sync_engine = create_engine(
+    main.DATABASE_URL.replace("+asyncpg", "+psycopg2"),
+    pool_size=main.DB_POOL_SIZE,
+    max_overflow=main.DB_MAX_OVERFLOW,
+    pool_timeout=main.DB_POOL_TIMEOUT,
+    pool_recycle=main.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+SyncSession = sessionmaker(sync_engine, autoflush=False)
+sync_app = FastAPI(title="FarmHub Reporting API (sync)")
+
+
+def get_sync_db():
+    with SyncSession() as db:
+        yield db
+
+
+@sync_app.get("/health")
+def sync_health():
+    return {"status": "healthy"}
+
+
+@sync_app.get("/farms/{farm_id}/summary")
+def sync_farm_summary(farm_id: int, db: Session = Depends(get_sync_db)):
+    row = db.execute(main.farm_summaries_statement(farm_id)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    return main._farm_summary_row(row)
+
+
+@sync_app.get("/farmers/summary")
+def sync_farmers_summary(farm_id: Optional[int] = None, db: Session = Depends(get_sync_db)):
+    rows = db.execute(main.farmer_summaries_statement(farm_id=farm_id)).all()
+    return [main._farmer_summary_row(row) for row in rows]
+
+
+@sync_app.get("/milk/summary")
+def sync_milk_summary(farm_id: Optional[int] = None, db: Session = Depends(get_sync_db)):
+    summary = db.execute(main.milk_summary_statement(farm_id)).one()
+    total_milk = float(summary.total_milk or 0)
+    total_cows = summary.total_cows or 0
+    return {
+        "total_farms": summary.total_farms or 0,
+        "total_farmers": summary.total_farmers or 0,
+        "total_cows": total_cows,
+        "total_milk": total_milk,
+        "average_per_cow": total_milk / total_cows if total_cows else 0.0,
+    }
+
+
+DASHBOARD = ("/farms/{farm_id}/summary", "/milk/summary?farm_id={farm_id}")
+
+
+async def _wait_until_up(url: str, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while True:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"{url} did not start")
+            await asyncio.sleep(0.2)
+
+
+class _Connection:
+    """A bare keep-alive HTTP/1.1 connection.
+
+    httpx spends several times the server's CPU per request, which on a
+    small machine would make the load generator the bottleneck.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def get(self, path: str) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = re.search(rb"(?i)\r\ncontent-length: *(\d+)", head)
+        await self.reader.readexactly(int(length.group(1)) if length else 0)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def _client(port: int, farm_ids, number: int, stop: float, latencies: list, errors: list):
+    connection = _Connection("127.0.0.1", port)
+    n = number
+    try:
+        while time.perf_counter() < stop:
+            path = DASHBOARD[n % len(DASHBOARD)].format(farm_id=farm_ids[n % len(farm_ids)])
+            n += 1
+            started = time.perf_counter()
+            try:
+                status = await connection.get(path)
+            except (OSError, asyncio.IncompleteReadError) as exc:
+                errors.append(type(exc).__name__)
+                connection.close()
+                continue
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(status)
+    finally:
+        connection.close()
+
+
+async def run_load(port: int, farm_ids, clients: int, duration: float, warmup: float):
+    stop = time.perf_counter() + warmup
+    await asyncio.gather(*(_client(port, farm_ids, n, stop, [], []) for n in range(clients)))
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(port, farm_ids, n, started + duration, latencies, errors) for n in range(clients)))
+    # Requests in flight at the deadline still finish and count
+    return latencies, errors, time.perf_counter() - started
+
+
+def report(name: str, latencies, errors, elapsed: float):
+    if not latencies:
+        print(f"{name:>5}: no successful requests, {len(errors)} errors")
+        return
+    cuts = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:>5}: {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {cuts[49] * 1000:7.1f} ms  p95 {cuts[94] * 1000:7.1f} ms  p99 {cuts[98] * 1000:7.1f} ms  "
+        f"max {max(latencies) * 1000:7.1f} ms  errors {len(errors)}"
+    )
+
+
+async def benchmark(args):
+    env = {**os.environ, "REPORTING_CACHE_MAX_BYTES": "0", "REPORTING_CHANGE_FEED": "0"}
+    async with main.engine.connect() as connection:
+        farm_ids = (await connection.scalars(select(main.Farm.id).order_by(main.Farm.id))).all()
+    await main.engine.dispose()
+    if not farm_ids:
+        sys.exit("The database has no farms; seed it first")
+
+    print(
+        f"{len(farm_ids)} farms, {args.clients} clients, {args.duration:g}s per run, "
+        f"pool {main.DB_POOL_SIZE}+{main.DB_MAX_OVERFLOW}"
+    )
+    for name, target, port in (("async", "app.main:app", args.port), ("sync", "benchmarks.concurrency:sync_app", args.port + 1)):
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            await _wait_until_up(url)
+            latencies, errors, elapsed = await run_load(port, farm_ids, args.clients, args.duration, args.warmup)
+        finally:
+            server.terminate()
+            server.wait()
+        report(name, latencies, errors, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the async and sync reporting service under concurrent load")
+    parser.add_argument("--clients", type=int, default=200, help="Concurrent dashboard clients")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of measured load per run")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of unmeasured load before each run")
+    parser.add_argument("--port", type=int, default=9100, help="Port for the async run; the sync run uses the next one")
+    asyncio.run(benchmark(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""Per-row cost of serializing report responses, before and after orjson.
+
+Builds ``--rows`` activity and farmer summary rows the way their endpoints
+do, then times the three ways a body has been produced:
+
+- ``response_model``: FastAPI validates the rows against the endpoint's
+  response model and renders them with ``JSONResponse`` (``json.dumps``),
+  as every endpoint did before.
+- ``cache path``: the rows validated through a ``TypeAdapter`` and dumped
+  by pydantic, as cached reports were stored before.
+- ``ReportResponse``: the rows dumped by orjson as they are, as now.
+
+Each body is checked to decode to the same JSON as the first. No database
+is needed; run from the reporting directory::
+
+    python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+
+from app import main
+
+ActivityRow = namedtuple("ActivityRow", "id farmer_name description created_at")
+FarmerSummaryRow = namedtuple("FarmerSummaryRow", "id user_email farm_name cows_count total_milk")
+
+
+def activity_rows(count):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        main._activity_row(ActivityRow(n, f"farmer{n % 97}@example.com", "Milking", start + timedelta(seconds=n, microseconds=n)))
+        for n in range(count)
+    ]
+
+
+def farmer_summary_rows(count):
+    return [
+        main._farmer_summary_row(
+            FarmerSummaryRow(n, f"farmer{n}@example.com", f"Farm {n % 50}", n % 9, Decimal(n % 700) / 4)
+        )
+        for n in range(count)
+    ]
+
+
+def response_model_body(model, rows):
+    field = create_model_field(name="Response", type_=List[model], mode="serialization")
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def cache_path_body(model, rows):
+    adapter = TypeAdapter(List[model])
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def report_response_body(model, rows):
+    return main.ReportResponse(rows).body
+
+
+METHODS = {
+    "response_model": response_model_body,
+    "cache path": cache_path_body,
+    "ReportResponse": report_response_body,
+}
+
+
+def benchmark(args):
+    reports = {
+        "activities": (main.ActivitySummary, activity_rows(args.rows)),
+        "farmer summaries": (main.FarmerSummary, farmer_summary_rows(args.rows)),
+    }
+    print(f"Per-row cost, {args.rows} rows, best of {args.repeat}\n")
+    for name, (model, rows) in reports.items():
+        expected = None
+        for method, body in METHODS.items():
+            decoded = json.loads(body(model, rows))
+            if expected is None:
+                expected = decoded
+            elif decoded != expected:
+                raise SystemExit(f"{name}: the {method} body differs from the response_model body")
+            best = min(timeit.repeat(lambda: body(model, rows), number=1, repeat=args.repeat))
+            print(f"  {name:<18}{method:<16}{best / args.rows * 1e6:8.2f} us/row")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the per-row cost of serializing report responses")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=5, help="Report the best of this many runs")
+    benchmark(parser.parse_args())
@@ -0,0 +1,55 @@
+"""Fixtures for the reporting tests.
+
+Tests run against a scratch ``test_<POSTGRES_DB>`` database on the server in
+``POSTGRES_*``, created from the models in ``app.main`` and dropped at the
+end. Every test is skipped when that server cannot be reached.
+"""
+import asyncio
+import os
+
+import asyncpg
+import httpx
+import pytest
+from sqlalchemy import text
+
+os.environ["POSTGRES_DB"] = f"test_{os.environ.get('POSTGRES_DB', 'farmhub_db')}"
+os.environ["REPORTING_CHANGE_FEED"] = "0"
+
+from app import main  # noqa: E402  (reads the settings above)
+from tests.data import execute_on_server  # noqa: E402
+
+
+async def _create_tables():
+    async with main.engine.begin() as connection:
+        await connection.run_sync(main.Base.metadata.create_all)
+    await main.engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def reporting_database():
+    name = main.POSTGRES_DB
+    try:
+        asyncio.run(execute_on_server(f'DROP DATABASE IF EXISTS "{name}"', f'CREATE DATABASE "{name}"'))
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as exc:
+        pytest.skip(f"PostgreSQL is not available: {exc}")
+    asyncio.run(_create_tables())
+    yield name
+    asyncio.run(execute_on_server(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+@pytest.fixture(autouse=True)
+async def db(reporting_database):
+    """Empty the tables after each test and close the pool of its event loop."""
+    yield main.engine
+    tables = ", ".join(table.name for table in main.Base.metadata.sorted_tables)
+    async with main.engine.begin() as connection:
+        await connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    await main.engine.dispose()
+    main.response_cache.clear()
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://reporting") as client:
+        yield client
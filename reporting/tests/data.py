@@ -0,0 +1,145 @@
+"""Seed data for the reporting tests.
+
+The core service owns these tables; the helpers here write the columns the
+reporting models read, plus the daily rollups the core service keeps.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import asyncpg
+from sqlalchemy import insert, text
+
+from app import main
+
+START_DATE = date(2025, 1, 1)
+
+ROLLUPS = (
+    ("farms_cowdailymilk", "cow_id", "m.cow_id", ""),
+    ("farms_farmerdailymilk", "farmer_id", "c.farmer_id", "JOIN farms_cow c ON c.id = m.cow_id"),
+    (
+        "farms_farmdailymilk",
+        "farm_id",
+        "f.farm_id",
+        "JOIN farms_cow c ON c.id = m.cow_id JOIN farms_farmer f ON f.id = c.farmer_id",
+    ),
+)
+
+
+async def execute_on_server(*statements, database="postgres"):
+    """Run ``statements`` on the server's ``postgres`` database, e.g. to create or drop a database."""
+    connection = await asyncpg.connect(
+        host=main.POSTGRES_HOST,
+        port=int(main.POSTGRES_PORT),
+        user=main.POSTGRES_USER,
+        password=main.POSTGRES_PASSWORD,
+        database=database,
+        timeout=main.DB_CONNECT_TIMEOUT,
+    )
+    try:
+        for statement in statements:
+            await connection.execute(statement)
+    finally:
+        await connection.close()
+
+
+def liters_for(cow_id: int, day: int) -> float:
+    """The liters seeded for a cow on the ``day``-th day after START_DATE."""
+    return 10 + cow_id % 7 + day % 5 * 0.5
+
+
+async def add_farms(farms: int, farmers_per_farm: int = 2, cows_per_farmer: int = 2, days: int = 3) -> list:
+    """Add ``farms`` farms with their farmers, cows and daily milk records.
+
+    Returns the new farm ids.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with main.engine.begin() as connection:
+        farm_ids = (
+            await connection.scalars(
+                insert(main.Farm).returning(main.Farm.id),
+                [{"name": f"Farm {n}", "location": f"Location {n}", "created_at": now} for n in range(farms)],
+            )
+        ).all()
+        users = [
+            {
+                "email": f"farmer{farm_id}-{n}@example.com",
+                "username": f"farmer{farm_id}-{n}",
+                "first_name": "Farmer",
+                "last_name": f"{farm_id}-{n}",
+            }
+            for farm_id in farm_ids
+            for n in range(farmers_per_farm)
+        ]
+        user_ids = (await connection.scalars(insert(main.User).returning(main.User.id), users)).all()
+        farmer_ids = (
+            await connection.scalars(
+                insert(main.Farmer).returning(main.Farmer.id),
+                [
+                    {"farm_id": farm_ids[n // farmers_per_farm], "user_id": user_id, "created_at": now}
+                    for n, user_id in enumerate(user_ids)
+                ],
+            )
+        ).all()
+        cow_ids = (
+            await connection.scalars(
+                insert(main.Cow).returning(main.Cow.id),
+                [
+                    {"tag_id": f"COW-{farmer_id}-{n}", "farmer_id": farmer_id, "created_at": now}
+                    for farmer_id in farmer_ids
+                    for n in range(cows_per_farmer)
+                ],
+            )
+        ).all()
+        if cow_ids and days:
+            await connection.execute(
+                insert(main.MilkRecord),
+                [
+                    {
+                        "cow_id": cow_id,
+                        "date": START_DATE + timedelta(days=day),
+                        "liters": liters_for(cow_id, day),
+                        "created_at": now,
+                    }
+                    for cow_id in cow_ids
+                    for day in range(days)
+                ],
+            )
+        await _rebuild_rollups(connection)
+    return farm_ids
+
+
+async def add_events(*events):
+    """Add change events, each given as ``(table_name, id)``, and count them as the core service does."""
+    async with main.engine.begin() as connection:
+        await connection.execute(
+            insert(main.ChangeEvent),
+            [{"id": event_id, "table_name": table, "action": "update"} for table, event_id in events],
+        )
+        for table, _ in events:
+            await connection.execute(
+                text(
+                    "INSERT INTO farms_tablechangecount AS c (table_name, events) VALUES (:table, 1) "
+                    "ON CONFLICT (table_name) DO UPDATE SET events = c.events + 1"
+                ),
+                {"table": table},
+            )
+
+
+async def event_count(table: str) -> int:
+    """The committed event count of ``table``, as a NOTIFY from the core service would carry it."""
+    async with main.engine.connect() as connection:
+        count = await connection.scalar(
+            text("SELECT events FROM farms_tablechangecount WHERE table_name = :table"), {"table": table}
+        )
+    return count or 0
+
+
+async def _rebuild_rollups(connection):
+    for table, owner, source, joins in ROLLUPS:
+        await connection.execute(text(f"DELETE FROM {table}"))
+        await connection.execute(
+            text(
+                f"INSERT INTO {table} ({owner}, date, total_liters, record_count) "
+                f"SELECT {source}, m.date, sum(m.liters), count(*) FROM farms_milkrecord m {joins} "
+                f"GROUP BY {source}, m.date"
+            )
+        )
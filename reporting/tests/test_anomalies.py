@@ -0,0 +1,13 @@
+import numpy as np
+
+from app import anomalies
+
+
+def test_build_matrix_scatters_each_cows_series_in_cow_order():
+    cows, farms, matrix = anomalies.build_matrix(
+        [7, 3], [2, 1], [[0, 2], [1]], [[10.0, 12.5], [4.0]], days=3
+    )
+
+    assert cows.tolist() == [3, 7]
+    assert farms.tolist() == [1, 2]
+    np.testing.assert_array_equal(matrix, [[np.nan, 4.0, np.nan], [10.0, np.nan, 12.5]])
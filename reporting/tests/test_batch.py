@@ -0,0 +1,27 @@
+from app import main
+
+
+async def test_batch_refuses_streamed_formats_before_running_them(client, monkeypatch):
+    streamed = []
+
+    async def stream_activities(stmt):
+        streamed.append(stmt)
+        yield b""
+
+    monkeypatch.setattr(main, "_stream_activities", stream_activities)
+
+    response = await client.post(
+        "/batch",
+        json={
+            "requests": [
+                {"id": "stream", "path": "/activities/recent", "params": {"format": "ndjson"}},
+                {"id": "page", "path": "/activities/recent", "params": {"format": "json"}},
+            ]
+        },
+    )
+
+    assert response.status_code == 200, response.text
+    stream, page = response.json()
+    assert (stream["status"], stream["error"]) == (400, "Batch items return JSON reports only")
+    assert page["status"] == 200
+    assert streamed == []
@@ -0,0 +1,64 @@
+from datetime import date
+
+import pytest
+
+from app import main
+from tests.data import add_events, add_farms
+
+
+class FrozenDate(date):
+    frozen = date(2025, 1, 3)
+
+    @classmethod
+    def today(cls):
+        return cls.frozen
+
+
+@pytest.fixture
+def today(monkeypatch):
+    monkeypatch.setattr(main, "date", FrozenDate)
+    monkeypatch.setattr(FrozenDate, "frozen", FrozenDate.frozen)
+    return FrozenDate
+
+
+async def test_unchanged_report_is_not_modified(client):
+    await add_farms(1)
+
+    first = await client.get("/farms/summary")
+    again = await client.get("/farms/summary", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+
+
+async def test_anomalies_default_end_date_moves_with_today(client, today):
+    await add_farms(1)
+
+    first = await client.get("/milk/anomalies")
+    today.frozen = date(2025, 1, 4)
+    next_day = await client.get("/milk/anomalies", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert next_day.status_code == 200
+    assert next_day.headers["ETag"] != first.headers["ETag"]
+
+
+async def test_leaderboard_default_end_date_moves_with_today(client, today):
+    await add_farms(1)
+
+    first = await client.get("/leaderboards/cows")
+    today.frozen = date(2025, 1, 4)
+    next_day = await client.get("/leaderboards/cows", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert next_day.status_code == 200
+    assert next_day.headers["ETag"] != first.headers["ETag"]
+
+
+async def test_farmers_leaderboard_changes_with_user_emails(client, today):
+    await add_farms(1)
+    first = await client.get("/leaderboards/farmers")
+    cows = await client.get("/leaderboards/cows")
+
+    await add_events(("users_user", 1))
+
+    assert (await client.get("/leaderboards/farmers")).headers["ETag"] != first.headers["ETag"]
+    assert (await client.get("/leaderboards/cows")).headers["ETag"] == cows.headers["ETag"]
@@ -0,0 +1,97 @@
+import json
+
+from app import main
+from app.changefeed import CHANGE_CHANNEL, VERSION_WINDOW, ChangeFeed
+from tests.data import add_events, event_count
+
+TABLES = ("farms_cow", "farms_milkrecord")
+
+
+async def stored_version(tables=TABLES):
+    async with main.SessionLocal() as db:
+        return await main.data_version(db, tables)
+
+
+async def subscribed_feed():
+    feed = ChangeFeed(main._connect_change_feed, TABLES)
+    connection = await main._connect_change_feed()
+    try:
+        await feed._subscribe(connection)
+    finally:
+        await connection.close()
+    return feed
+
+
+async def notify(feed, table, event_id):
+    payload = {"id": event_id, "table": table, "action": "update", "object_id": None, "count": await event_count(table)}
+    feed._notified(None, 0, CHANGE_CHANNEL, json.dumps(payload))
+
+
+async def test_tables_without_events_are_at_version_zero():
+    assert await stored_version() == "farms_cow:0,farms_milkrecord:0"
+
+
+async def test_version_follows_the_newest_events_of_each_table():
+    await add_events(("farms_cow", 1), ("farms_milkrecord", 2), ("farms_milkrecord", 3))
+
+    assert await stored_version() == "farms_cow:1.1.1,farms_milkrecord:3.2.2"
+
+
+async def test_late_commit_below_the_newest_id_changes_the_version():
+    await add_events(("farms_milkrecord", 5), ("farms_milkrecord", 7))
+    before = await stored_version()
+
+    # The transaction that drew id 6 commits after the one that drew 7
+    await add_events(("farms_milkrecord", 6))
+
+    assert await stored_version() != before
+
+
+async def test_late_commit_far_below_the_newest_id_changes_the_version():
+    await add_events(("farms_milkrecord", 5), ("farms_milkrecord", 7 + VERSION_WINDOW))
+    feed = await subscribed_feed()
+    before = await stored_version()
+
+    # Id 6 is out of the window of the newest id by the time it commits
+    await add_events(("farms_milkrecord", 6))
+    await notify(feed, "farms_milkrecord", 6)
+
+    assert await stored_version() != before
+    assert feed.version(TABLES) == await stored_version()
+
+
+async def test_live_versions_match_the_stored_ones():
+    await add_events(("farms_cow", 1), ("farms_cow", 2), ("farms_milkrecord", 3))
+    feed = await subscribed_feed()
+    assert feed.version(TABLES) == await stored_version()
+
+    for table, event_id in (("farms_milkrecord", 5), ("farms_milkrecord", 4), ("farms_cow", 5 + VERSION_WINDOW)):
+        await add_events((table, event_id))
+        await notify(feed, table, event_id)
+        assert feed.version(TABLES) == await stored_version()
+
+    # Only the newest cow event is within the window
+    assert feed.version(["farms_cow"]) == f"farms_cow:{5 + VERSION_WINDOW}.1.3"
+
+
+async def test_feed_is_not_live_until_subscribed():
+    feed = ChangeFeed(main._connect_change_feed, TABLES)
+
+    assert feed.version(TABLES) is None
+
+
+async def test_resubscribing_reports_tables_changed_while_away():
+    await add_events(("farms_cow", 1), ("farms_milkrecord", 5 + VERSION_WINDOW))
+    changed = []
+    feed = ChangeFeed(main._connect_change_feed, TABLES, on_change=changed.append)
+    connection = await main._connect_change_feed()
+    try:
+        await feed._subscribe(connection)
+        # Committed while the feed was disconnected, far below the newest id
+        await add_events(("farms_milkrecord", 4))
+        await feed._subscribe(connection)
+    finally:
+        await connection.close()
+
+    assert changed == ["farms_milkrecord"]
+    assert feed.version(TABLES) == await stored_version()
@@ -0,0 +1,187 @@
+"""The reports scoped to a farm or farmer must read large tables through an index.
+
+The core service's migrations own the schema and its indexes, so these
+statements are EXPLAINed against a scratch database built by running them,
+seeded well past ``MIN_ROWS`` and ANALYZEd. Each report's statement is built
+as its endpoint builds it, for one farm and a month of data. Unscoped
+reports (e.g. every farm's totals) read whole tables by design and are not
+checked. Skipped when the core service's requirements are not installed.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import main
+from tests.data import execute_on_server
+
+CORE_DIR = Path(__file__).resolve().parents[2] / "core"
+
+# Tables estimated below this many rows may be scanned
+MIN_ROWS = 5000
+
+FARMS = 500
+FARMERS_PER_FARM = 15
+COWS_PER_FARMER = 4
+DAYS = 10
+
+SEED_SQL = f"""
+INSERT INTO users_user (password, is_superuser, username, first_name, last_name, email,
+                        is_staff, is_active, date_joined, is_agent, is_farmer)
+SELECT '!', n = 0, 'user' || n, 'User', n::text, 'user' || n || '@example.com', n = 0, true, now(), false, n > 0
+FROM generate_series(0, {FARMS * FARMERS_PER_FARM}) n;
+
+INSERT INTO farms_farm (name, location, created_by_id, created_at, updated_at)
+SELECT 'Farm ' || n, 'Region ' || n % 7, (SELECT min(id) FROM users_user), now(), now()
+FROM generate_series(1, {FARMS}) n;
+
+INSERT INTO farms_farmer (farm_id, user_id, created_by_id, created_at, updated_at)
+SELECT farm.id, farmer_user.id, farm.created_by_id, now(), now()
+FROM (SELECT id, row_number() OVER (ORDER BY id) - 1 AS n FROM users_user WHERE is_farmer) farmer_user
+JOIN (SELECT id, created_by_id, row_number() OVER (ORDER BY id) - 1 AS n FROM farms_farm) farm
+  ON farm.n = farmer_user.n % {FARMS};
+
+INSERT INTO farms_cow (tag_id, farmer_id, created_by_id, created_at, updated_at)
+SELECT 'COW-' || farmer.id || '-' || n, farmer.id, farmer.created_by_id, now(), now()
+FROM farms_farmer farmer, generate_series(1, {COWS_PER_FARMER}) n;
+
+INSERT INTO farms_milkrecord (cow_id, date, liters, recorded_by_id, created_by_id, created_at, updated_at)
+SELECT cow.id, current_date - d, 8 + cow.id % 9 + d % 4 * 0.5, cow.created_by_id, cow.created_by_id, now(), now()
+FROM farms_cow cow, generate_series(0, {DAYS - 1}) d;
+
+INSERT INTO farms_cowdailymilk (cow_id, date, total_liters, record_count)
+SELECT cow_id, date, sum(liters), count(*) FROM farms_milkrecord GROUP BY cow_id, date;
+
+INSERT INTO farms_farmerdailymilk (farmer_id, date, total_liters, record_count)
+SELECT cow.farmer_id, milk.date, sum(milk.total_liters), sum(milk.record_count)
+FROM farms_cowdailymilk milk JOIN farms_cow cow ON cow.id = milk.cow_id
+GROUP BY cow.farmer_id, milk.date;
+
+INSERT INTO farms_farmdailymilk (farm_id, date, total_liters, record_count)
+SELECT farmer.farm_id, milk.date, sum(milk.total_liters), sum(milk.record_count)
+FROM farms_farmerdailymilk milk JOIN farms_farmer farmer ON farmer.id = milk.farmer_id
+GROUP BY farmer.farm_id, milk.date;
+
+INSERT INTO farms_farmdailymilksketch (farm_id, date, cow_days, zero_count, buckets, cow_registers)
+SELECT farm_id, date, record_count, 0, '{{}}', '\\x' FROM farms_farmdailymilk;
+
+INSERT INTO farms_activity (farmer_id, description, actor_id, created_by_id, created_at, updated_at)
+SELECT farmer.id, 'Milking', NULL, farmer.created_by_id, now() - d * interval '1 hour', now()
+FROM farms_farmer farmer, generate_series(1, 2) d;
+
+ANALYZE;
+"""
+
+
+def seq_scans(plan, limited=False):
+    """Yield the relation of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan that reads its whole table.
+
+    A Seq Scan feeding a Limit directly, or through the outer side of nested
+    loops, stops once the page is full and is not reported.
+    """
+    node = plan.get("Node Type")
+    if node == "Seq Scan" and not limited:
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        outer = node == "Nested Loop" and child.get("Parent Relationship") == "Outer"
+        yield from seq_scans(child, node == "Limit" or (limited and outer))
+
+
+async def large_seq_scans(connection, stmt):
+    """Return ``(table, estimated rows)`` for each large table ``stmt`` scans sequentially."""
+    # Bound rather than inlined, so parameters keep the types the endpoint sends
+    compiled = stmt.compile(dialect=connection.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    found = []
+    for table in sorted(set(seq_scans(plan[0]["Plan"]))):
+        rows = (
+            await connection.execute(text("SELECT reltuples FROM pg_class WHERE relname = :table"), {"table": table})
+        ).scalar()
+        if rows > MIN_ROWS:
+            found.append((table, int(rows)))
+    return found
+
+
+async def _seed(name):
+    await execute_on_server(f'DROP DATABASE IF EXISTS "{name}"', f'CREATE DATABASE "{name}"')
+    migrate = subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--verbosity", "0"],
+        cwd=CORE_DIR,
+        env={**os.environ, "POSTGRES_DB": name},
+        capture_output=True,
+        text=True,
+    )
+    if migrate.returncode:
+        pytest.fail(f"Migrating {name} failed:\n{migrate.stderr}")
+    await execute_on_server(SEED_SQL, database=name)
+
+
+@pytest.fixture(scope="module")
+def plans_database(reporting_database):
+    """A scratch database with the core service's schema, seeded and ANALYZEd."""
+    if importlib.util.find_spec("django") is None:
+        pytest.skip("the core service's requirements are not installed")
+    name = f"{reporting_database}_plans"
+    asyncio.run(_seed(name))
+    yield name
+    asyncio.run(execute_on_server(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+@pytest.fixture
+async def plans(plans_database):
+    engine = create_async_engine(main.engine.url.set(database=plans_database))
+    async with engine.connect() as connection:
+        yield connection
+    await engine.dispose()
+
+
+def report_statements(farm_id, farmer_id, end):
+    start = end - timedelta(days=30)
+    cursor = (datetime.combine(end, datetime.min.time()), 2 ** 62)
+    return {
+        "/farms/{id}/summary": main.farm_summaries_statement(farm_id),
+        "/farmers/summary?farm_id": main.farmer_summaries_statement(farm_id=farm_id).limit(100),
+        "/farmers/{id}/summary": main.farmer_summaries_statement(farmer_id=farmer_id),
+        "/milk/by-date": main.milk_by_date_statement(start, end, farm_id),
+        "/milk/timeseries": main.milk_timeseries_statement(start, end, "day", 7, farm_id),
+        "/milk/distribution": main.milk_distribution_statement(start, end, farm_id),
+        "/milk/anomalies": main.yield_series_statement(start, end, farm_id),
+        "/leaderboards/cows": main.leaderboard_statement("cows", end, 30, 20, farm_id),
+        "/leaderboards/farmers": main.leaderboard_statement("farmers", end, 30, 20, farm_id),
+        "/activities/recent": main.recent_activities_statement(farm_id, None, cursor).limit(51),
+        "/export/milk": main.milk_export_statement(start, end, farm_id),
+    }
+
+
+async def test_seeded_tables_are_large(plans):
+    small = await plans.execute(
+        text(
+            "SELECT relname FROM pg_class WHERE relname IN "
+            "('farms_farmer', 'farms_cow', 'farms_milkrecord', 'farms_cowdailymilk', 'farms_activity') "
+            "AND reltuples <= :min_rows"
+        ),
+        {"min_rows": MIN_ROWS},
+    )
+    assert small.all() == []
+
+
+@pytest.mark.parametrize("report", list(report_statements(1, 1, date.today())))
+async def test_report_reads_large_tables_through_indexes(plans, report):
+    farm_id = (await plans.execute(text("SELECT max(id) FROM farms_farm"))).scalar()
+    farmer_id = (await plans.execute(text("SELECT max(id) FROM farms_farmer WHERE farm_id = :id"), {"id": farm_id})).scalar()
+
+    stmt = report_statements(farm_id, farmer_id, date.today())[report]
+
+    assert await large_seq_scans(plans, stmt) == []
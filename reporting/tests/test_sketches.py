@@ -0,0 +1,20 @@
+import math
+
+from app.sketches import GAMMA, HLL_REGISTERS, MergedSketch
+
+
+def bucket(liters):
+    return math.ceil(math.log(liters, GAMMA))
+
+
+def test_histogram_lists_only_non_empty_bins():
+    sketch = MergedSketch()
+    buckets = {str(bucket(10)): 3, str(bucket(999999.99)): 1}
+    sketch.merge(5, 1, buckets, bytes(HLL_REGISTERS))
+
+    histogram = sketch.histogram(0.1)
+
+    assert [bin["count"] for bin in histogram] == [1, 3, 1]
+    assert histogram[0] == {"lower": 0.0, "upper": 0.1, "count": 1}
+    assert all(earlier["upper"] <= later["lower"] for earlier, later in zip(histogram, histogram[1:]))
+    assert 999999.99 * 0.99 <= histogram[-1]["lower"] <= 999999.99 * 1.01
@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import main
+from tests.data import add_farms, liters_for
+
+pytestmark = pytest.mark.usefixtures("no_cache")
+
+
+@pytest.fixture
+def no_cache(monkeypatch):
+    # Every request computes its report, so each one runs its statements
+    monkeypatch.setattr(main, "CACHE_MAX_BYTES", 0)
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(main.engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(main.engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def get(client, url):
+    with count_statements() as statements:
+        response = await client.get(url)
+    assert response.status_code == 200, response.text
+    return response.json(), len(statements)
+
+
+async def test_farms_summary_statements_do_not_grow_with_farms(client):
+    await add_farms(5)
+    await client.get("/health")
+
+    body, few = await get(client, "/farms/summary")
+    assert len(body) == 5
+
+    await add_farms(5)
+    body, many = await get(client, "/farms/summary")
+    assert len(body) == 10
+
+    assert few == many == 1
+
+
+async def test_farms_summary_totals(client):
+    farm_ids = await add_farms(2, farmers_per_farm=2, cows_per_farmer=3, days=4)
+
+    body, _ = await get(client, "/farms/summary")
+
+    assert [farm["id"] for farm in body] == farm_ids
+    # Cows are numbered 1-6 on the first farm and 7-12 on the second
+    for farm, cows in zip(body, (range(1, 7), range(7, 13))):
+        assert farm["farmers_count"] == 2
+        assert farm["cows_count"] == 3 * 2
+        assert farm["total_milk"] == pytest.approx(sum(liters_for(cow, day) for cow in cows for day in range(4)))
+
+
+async def test_farm_summary_is_one_statement(client):
+    [farm_id, _] = await add_farms(2)
+    await client.get("/health")
+
+    body, statements = await get(client, f"/farms/{farm_id}/summary")
+
+    assert body["id"] == farm_id
+    assert (body["farmers_count"], body["cows_count"]) == (2, 4)
+    assert statements == 1
+
+
+async def test_milk_summary_is_one_statement(client):
+    await add_farms(3, farmers_per_farm=1, cows_per_farmer=2, days=2)
+    await client.get("/health")
+
+    body, statements = await get(client, "/milk/summary")
+
+    assert (body["total_farms"], body["total_farmers"], body["total_cows"]) == (3, 3, 6)
+    assert body["total_milk"] == pytest.approx(sum(liters_for(cow, day) for cow in range(1, 7) for day in range(2)))
+    assert statements == 1